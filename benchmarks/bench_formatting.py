@@ -0,0 +1,72 @@
+"""Compares the scalar and batch unit formatting on a million synthetic units
+
+Run from the repository root:
+    python -m benchmarks.bench_formatting
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.formatting import clean_unit_information, format_units
+
+BEDS = ["Studio", "1 bed", "2 beds", "3 beds", "1"]
+BATHS = ["1 bath", "1.5 baths", "2 baths", "1", "2.5 baths"]
+DATES = ["Now", "Available Soon", "Apr. 16", "Dec 3", "Not Available", "Jan 15"]
+
+
+def build_units(count: int = 1_000_000, seed: int = 0):
+    """Raw unit values as scraped, with rents and areas spread like a large city's"""
+    rng = np.random.default_rng(seed)
+    rents = rng.integers(800, 5000, count)
+    rents = np.array([f"${rent:,}" for rent in rents], dtype=object)
+    # Some listings give a range or no price at all
+    ranges = rng.random(count) < 0.2
+    rents[ranges] = [
+        f"{rent}–${rent[1:].replace(',', '')}5" for rent in rents[ranges]
+    ]
+    rents[rng.random(count) < 0.05] = "Call for Rent"
+    areas = np.array(
+        [f"{area:,} sq ft" for area in rng.integers(300, 2000, count)], dtype=object
+    )
+    areas[rng.random(count) < 0.05] = ""
+
+    def pick(values):
+        return np.array(values, dtype=object)[rng.integers(0, len(values), count)]
+
+    return pd.DataFrame(
+        {
+            "rent": rents,
+            "beds": pick(BEDS),
+            "baths": pick(BATHS),
+            "sqft": areas,
+            "date_available": pick(DATES),
+        }
+    )
+
+
+class ScalarFormatter:
+    @clean_unit_information
+    def format(self, unit):
+        return dict(unit)
+
+
+if __name__ == "__main__":
+    units = build_units()
+    print(f"Units: {len(units):,}")
+
+    records = units.to_dict("records")
+    start = time.perf_counter()
+    formatter = ScalarFormatter()
+    expected = [formatter.format(unit) for unit in records]
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = format_units(units)
+    batch_time = time.perf_counter() - start
+
+    print(f"scalar: {scalar_time:.2f} s")
+    print(f"batch:  {batch_time:.2f} s")
+    print(f"Speedup: {scalar_time / batch_time:.1f}x")
+    print(f"Identical output: {result.to_dict('records') == expected}")
@@ -0,0 +1,106 @@
+"""Measures loading a month of daily snapshots from the pickle backups
+and from the partitioned Parquet export
+
+Run from the repository root:
+    python -m benchmarks.bench_parquet_export
+"""
+
+from datetime import date, timedelta
+import os
+import pickle
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.bench_records import build_city, keep_store
+from src.parquet_store import ParquetSink, read_snapshots
+from src.property_parser import DEFAULT_AMENITY_MATCHER
+
+
+def directory_size(path: str):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def load_pickles(directory: str):
+    """Unpickles every snapshot and stacks their units, like the notebooks"""
+    frames = []
+    for filename in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, filename), "rb") as file:
+            _, units = pickle.load(file)
+        frames.append(units.to_frame())
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == "__main__":
+    days = 30
+    city = build_city(properties=5_000)
+    properties, units = keep_store(city)
+    first_day = date(2025, 12, 1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        pickle_dir = os.path.join(directory, "raw")
+        parquet_dir = os.path.join(directory, "parquet")
+        os.makedirs(pickle_dir)
+
+        start = time.perf_counter()
+        for day in range(days):
+            filename = f"New York_{first_day + timedelta(day)}.pkl"
+            with open(os.path.join(pickle_dir, filename), "wb") as file:
+                pickle.dump([properties, units], file)
+        pickle_write = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for day in range(days):
+            sink = ParquetSink(
+                parquet_dir,
+                "New York",
+                first_day + timedelta(day),
+                amenity_columns=DEFAULT_AMENITY_MATCHER.columns,
+            )
+            with sink:
+                for property_data, property_units in city:
+                    sink.write_properties([property_data])
+                    sink.write_units(
+                        [
+                            (
+                                property_data["property_name"],
+                                property_units["zipcode"],
+                                property_units["units"],
+                            )
+                        ]
+                    )
+        parquet_write = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pickled = load_pickles(pickle_dir)
+        pickle_read = time.perf_counter() - start
+
+        start = time.perf_counter()
+        exported = read_snapshots(parquet_dir)
+        parquet_read = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rents = read_snapshots(
+            parquet_dir,
+            columns=["rent", "beds", "date_scraped"],
+            start_date=first_day + timedelta(days - 7),
+        )
+        parquet_week = time.perf_counter() - start
+
+        print(f"{days} snapshots of {len(pickled) // days:,} units")
+        print(f"pickle:  {directory_size(pickle_dir) / 2**20:.0f} MiB on disk")
+        print(f"parquet: {directory_size(parquet_dir) / 2**20:.0f} MiB on disk")
+        print(
+            f"pickle written in {pickle_write:.2f} s, parquet in {parquet_write:.2f} s"
+        )
+        print(f"month from pickles: {pickle_read:.2f} s, {len(pickled):,} rows")
+        print(f"month from parquet: {parquet_read:.2f} s, {len(exported):,} rows")
+        print(
+            f"last week's rent and beds from parquet: {parquet_week:.2f} s,"
+            f" {len(rents):,} rows"
+        )
@@ -0,0 +1,48 @@
+"""Compares the BeautifulSoup and lxml parser backends on a large property page
+
+Run from the repository root:
+    python -m benchmarks.bench_parsers
+"""
+
+import os
+import re
+import time
+
+from src.page_parser import PageParser
+from src.lxml_parser import LxmlPageParser
+
+PAGE = os.path.join("src", "test_pages", "unit_container_layout.html")
+
+
+def build_large_page(repeat: int = 150):
+    """Grows the saved page to the size of a large listing, repeating its units
+    and amenities"""
+    with open(PAGE, "r", encoding="utf-8") as file:
+        html = file.read()
+
+    units = re.search(r"<ul>\s*<li class=\"unitContainer.*?</ul>", html, re.S).group(0)
+    amenities = re.search(r"<section id=\"amenitiesSection\">.*?</section>", html, re.S)
+    filler = "<div><p><span>Nearby</span> <a href='#'>School</a></p></div>" * 40
+    html = html.replace(units, units * repeat)
+    html = html.replace(amenities.group(0), (filler + amenities.group(0)) * 10)
+    return html.encode("utf-8")
+
+
+def time_parser(page_parser, content: bytes, runs: int):
+    start = time.perf_counter()
+    for _ in range(runs):
+        result = page_parser.parse_html(content, "url")
+    return (time.perf_counter() - start) / runs, result
+
+
+if __name__ == "__main__":
+    content = build_large_page()
+    print(f"Page size: {len(content) / 1024:.0f} KiB")
+
+    bs4_time, bs4_result = time_parser(PageParser("Seattle"), content, runs=5)
+    lxml_time, lxml_result = time_parser(LxmlPageParser("Seattle"), content, runs=5)
+
+    print(f"bs4:  {bs4_time * 1000:.1f} ms per page")
+    print(f"lxml: {lxml_time * 1000:.1f} ms per page")
+    print(f"Speedup: {bs4_time / lxml_time:.1f}x")
+    print(f"Identical output: {bs4_result == lxml_result}")
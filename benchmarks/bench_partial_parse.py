@@ -0,0 +1,92 @@
+"""Compares full and partial BeautifulSoup parsing of property and search pages
+
+Run from the repository root:
+    python -m benchmarks.bench_partial_parse
+"""
+
+import time
+import tracemalloc
+
+from benchmarks.bench_parsers import build_large_page
+from src.page_parser import PageParser
+from src.scraper import build_soup
+from src.search_planner import read_listing_urls, read_page_count
+from src.strainers import SEARCH_PAGE_STRAINER
+
+# Navigation and footer links repeated around the content of every page
+CHROME = "<div class='nav'><ul>" + "<li><a href='#'>Link</a></li>" * 200 + "</ul></div>"
+
+
+def build_property_page():
+    """The large property page, with the navigation, reviews and footer of a listing"""
+    reviews = (
+        "<div class='review'><p>Great <b>location</b></p><span>5 stars</span></div>"
+    )
+    content = build_large_page().decode("utf-8")
+    content = content.replace("<body>", f"<body>{CHROME}", 1)
+    return content.replace("</body>", f"{reviews * 300}{CHROME}</body>").encode("utf-8")
+
+
+def build_search_page(listings: int = 40):
+    """A search page with the navigation, scripts and footer around its listing cards"""
+    script = "<script>var data = {'a': 1};</script>" * 20
+    card = (
+        "<li class='mortar-wrapper'><article><a class='property-link' "
+        "href='https://www.apartments.com/listing-{}/'>Listing</a>"
+        "<div class='price'>$1,500</div><img src='photo.jpg'></article></li>"
+    )
+    cards = "".join(card.format(i) for i in range(listings))
+    html = (
+        "<html><head><meta charset='utf-8'><title>1,200 Apartments for Rent</title>"
+        f"{script}</head><body>{CHROME}<ul>{cards}</ul>"
+        "<span class='pageRange'>Page 1 of 28</span>"
+        f"{CHROME}</body></html>"
+    )
+    return html.encode("utf-8")
+
+
+def measure(parse, content: bytes, runs: int):
+    """Returns the CPU time and peak traced memory per page, and the last result"""
+    start = time.process_time()
+    for _ in range(runs):
+        result = parse(content)
+    cpu_time = (time.process_time() - start) / runs
+
+    tracemalloc.start()
+    parse(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu_time, peak, result
+
+
+def report(name: str, full, partial):
+    print(f"{name}:")
+    print(f"  full:    {full[0] * 1000:.1f} ms, {full[1] / 2**20:.1f} MiB peak")
+    print(f"  partial: {partial[0] * 1000:.1f} ms, {partial[1] / 2**20:.1f} MiB peak")
+    print(
+        f"  saved:   {(1 - partial[0] / full[0]) * 100:.0f}% CPU, "
+        f"{(1 - partial[1] / full[1]) * 100:.0f}% memory"
+    )
+    print(f"  identical output: {full[2] == partial[2]}")
+
+
+def search_results(soup):
+    return read_listing_urls(soup), read_page_count(soup)
+
+
+if __name__ == "__main__":
+    content = build_property_page()
+    print(f"Property page size: {len(content) / 1024:.0f} KiB")
+    full = measure(lambda c: PageParser("Seattle").parse_html(c, "url"), content, 5)
+    partial = measure(
+        lambda c: PageParser("Seattle", partial=True).parse_html(c, "url"), content, 5
+    )
+    report("Property page", full, partial)
+
+    content = build_search_page()
+    print(f"Search page size: {len(content) / 1024:.0f} KiB")
+    full = measure(lambda c: search_results(build_soup(c, 200)), content, 20)
+    partial = measure(
+        lambda c: search_results(build_soup(c, 200, SEARCH_PAGE_STRAINER)), content, 20
+    )
+    report("Search page", full, partial)
@@ -0,0 +1,64 @@
+"""Compares the row by row inserts and the COPY bulk load of dbPostgres
+
+Needs a local Postgres with an empty apartments_bench database, e.g.
+    createdb -U postgres apartments_bench
+
+Run from the repository root:
+    python -m benchmarks.bench_postgres_load
+"""
+
+import time
+
+from benchmarks.bench_records import build_city
+from src.db_postgres import dbPostgres
+from src.property_parser import DEFAULT_AMENITY_MATCHER
+from src.records import PropertyRecord
+from src.unit_store import UnitStore
+
+
+def connect():
+    return dbPostgres(
+        dbname="apartments_bench", user="postgres", password="postgres", port=5432
+    )
+
+
+def clear(database):
+    cur = database.conn.cursor()
+    cur.execute("TRUNCATE units, properties RESTART IDENTITY CASCADE")
+    database.conn.commit()
+    cur.close()
+
+
+def insert_rows(database, properties, units):
+    """The row by row path, one insert per property and one per property's units"""
+    database.insert_properties(properties)
+    database.insert_unit_store(units)
+
+
+def bulk_load(database, properties, units):
+    database.bulk_load(properties, units)
+
+
+if __name__ == "__main__":
+    city = build_city(properties=2_000)
+    columns = DEFAULT_AMENITY_MATCHER.columns
+    properties = [PropertyRecord.from_dict(data, columns) for data, _ in city]
+    units = UnitStore()
+    for property_data, property_units in city:
+        units.add_property(
+            property_data["property_name"],
+            property_units["zipcode"],
+            property_units["units"],
+        )
+    rows = len(properties) + len(units)
+    print(f"Properties: {len(properties):,}, units: {len(units):,}")
+
+    database = connect()
+    for name, load in (("row inserts", insert_rows), ("COPY bulk load", bulk_load)):
+        clear(database)
+        start = time.perf_counter()
+        load(database, properties, units)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {elapsed:.2f} s, {rows / elapsed:,.0f} rows/s")
+    clear(database)
+    database.close_connection()
@@ -0,0 +1,117 @@
+"""Measures the memory held by a large city's parsed properties and units,
+as dicts, as compact records and in a columnar unit store
+
+Run from the repository root:
+    python -m benchmarks.bench_records
+"""
+
+import gc
+import tracemalloc
+
+import numpy as np
+
+from src.property_parser import DEFAULT_AMENITY_MATCHER
+from src.records import PropertyRecord, UnitRecord
+from src.unit_store import UnitStore
+
+
+def build_city(properties: int = 20_000, units_per_property: int = 25, seed: int = 0):
+    """Parsed property and unit dicts, with values spread like a large city's"""
+    rng = np.random.default_rng(seed)
+    columns = DEFAULT_AMENITY_MATCHER.columns
+    city = []
+    for index in range(properties):
+        property_data = {"property_name": f"Property {index}"}
+        property_data |= {column: bool(rng.random() < 0.5) for column in columns}
+        property_data |= {
+            "latitude": f"{40 + rng.random():.6f}",
+            "longitude": f"{-74 + rng.random():.6f}",
+            "neighborhood": f"Neighborhood {index % 300}",
+            "zipcode": f"{10000 + index % 500}",
+            "description": f"Property {index} is a great place to live.",
+            "unique_features": "Bike Storage, Lounge",
+            "year_built": f"{1900 + index % 120}",
+            "property_url": f"https://www.apartments.com/property-{index}/",
+            "city_name": "New York",
+        }
+        units = [
+            {
+                "unit_label": f"{unit // 4 + 1}{unit % 4 + 1:02d}",
+                "rent": int(rng.integers(1500, 6000)),
+                "beds": f"{rng.integers(0, 4)}",
+                "baths": f"{rng.integers(1, 3)}",
+                "sqft": int(rng.integers(400, 1500)),
+                "date_available": (
+                    f"2025-{rng.integers(1, 13):02d}-{rng.integers(1, 29):02d}"
+                ),
+                "date_scraped": "-".join(("2025", "12", "20")),
+            }
+            for unit in range(units_per_property)
+        ]
+        city.append(
+            (property_data, {"units": units, "zipcode": property_data["zipcode"]})
+        )
+    return city
+
+
+def measure(build):
+    """Returns the memory held by what build returns, in MiB"""
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return current / 2**20
+
+
+def keep_dicts(city):
+    properties, units = [], {}
+    for property_data, property_units in city:
+        properties.append(dict(property_data))
+        units[property_data["property_name"]] = {
+            "units": [dict(unit) for unit in property_units["units"]],
+            "zipcode": property_units["zipcode"],
+        }
+    return properties, units
+
+
+def keep_records(city):
+    properties, units = [], {}
+    columns = DEFAULT_AMENITY_MATCHER.columns
+    for property_data, property_units in city:
+        properties.append(PropertyRecord.from_dict(property_data, columns))
+        units[property_data["property_name"]] = {
+            "units": [UnitRecord.from_dict(unit) for unit in property_units["units"]],
+            "zipcode": property_units["zipcode"],
+        }
+    return properties, units
+
+
+def keep_store(city):
+    properties, units = [], UnitStore()
+    columns = DEFAULT_AMENITY_MATCHER.columns
+    for property_data, property_units in city:
+        properties.append(PropertyRecord.from_dict(property_data, columns))
+        units.add_property(
+            property_data["property_name"],
+            property_units["zipcode"],
+            property_units["units"],
+        )
+    return properties, units
+
+
+if __name__ == "__main__":
+    # Each measurement copies the parsed values, like the records kept during a run
+    city = build_city()
+    unit_count = sum(len(units["units"]) for _, units in city)
+    print(f"Properties: {len(city):,}, units: {unit_count:,}")
+
+    dict_memory = measure(lambda: keep_dicts(city))
+    record_memory = measure(lambda: keep_records(city))
+    store_memory = measure(lambda: keep_store(city))
+    print(f"dicts:      {dict_memory:.0f} MiB")
+    print(f"records:    {record_memory:.0f} MiB")
+    print(f"unit store: {store_memory:.0f} MiB")
+    print(f"Saved by records: {(1 - record_memory / dict_memory) * 100:.0f}%")
+    print(f"Saved by the unit store: {(1 - store_memory / dict_memory) * 100:.0f}%")
@@ -0,0 +1,63 @@
+"""Compares the row by row SQLite functions and the batched dbSQLite loads
+
+Run from the repository root:
+    python -m benchmarks.bench_sqlite_load
+"""
+
+import os
+import tempfile
+import time
+
+from benchmarks.bench_records import build_city
+from src.db_sqlite import (
+    create_connection,
+    create_tables,
+    dbSQLite,
+    get_property_id,
+    insert_data,
+)
+from src.property_parser import DEFAULT_AMENITY_MATCHER
+from src.records import PropertyRecord
+from src.unit_store import UnitStore
+
+
+def insert_rows(path, properties, units):
+    """The free functions, one insert and commit per property and per unit"""
+    conn = create_connection(path)
+    create_tables(conn)
+    for property_data in properties:
+        insert_data(conn, property_data, "properties")
+    for property_name, zipcode, property_units in units.property_units():
+        property_id = get_property_id(conn, property_name, zipcode)
+        for unit in property_units:
+            insert_data(conn, {**unit, "property_id": property_id}, "units")
+    conn.close()
+
+
+def bulk_load(path, properties, units):
+    database = dbSQLite(path)
+    database.bulk_load(properties, units)
+    database.close_connection()
+
+
+if __name__ == "__main__":
+    city = build_city(properties=1_000)
+    columns = DEFAULT_AMENITY_MATCHER.columns
+    properties = [PropertyRecord.from_dict(data, columns) for data, _ in city]
+    units = UnitStore()
+    for property_data, property_units in city:
+        units.add_property(
+            property_data["property_name"],
+            property_units["zipcode"],
+            property_units["units"],
+        )
+    rows = len(properties) + len(units)
+    print(f"Properties: {len(properties):,}, units: {len(units):,}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, load in (("row functions", insert_rows), ("dbSQLite", bulk_load)):
+            path = os.path.join(directory, f"{name}.db")
+            start = time.perf_counter()
+            load(path, properties, units)
+            elapsed = time.perf_counter() - start
+            print(f"{name}: {elapsed:.2f} s, {rows / elapsed:,.0f} rows/s")
@@ -0,0 +1,172 @@
+"""Compares unit queries on the old single-heap units table and on the
+partitioned, indexed units table with its latest_units view
+
+The view is only as fresh as its last refresh, so the concurrent refresh
+that follows a day's scrape is timed as well. It is paid once per run,
+while the query saving is had by every query of the latest rents.
+
+Needs a local Postgres with two empty databases, e.g.
+    createdb -U postgres apartments_bench_old
+    createdb -U postgres apartments_bench
+
+Run from the repository root:
+    python -m benchmarks.bench_units_schema
+"""
+
+from datetime import date, timedelta
+import time
+
+import psycopg2
+
+from src.db_postgres import create_month_partitions, dbPostgres
+
+CONNECT = {
+    "user": "postgres",
+    "password": "postgres",
+    "port": 5432,
+    "host": "localhost",
+}
+
+PROPERTIES = 5_000
+UNITS_PER_PROPERTY = 25
+DAYS = 60
+
+# The units table before it was partitioned
+OLD_UNITS_TABLE = """CREATE TABLE IF NOT EXISTS units (
+                    unit_id SERIAL PRIMARY KEY,
+                    unit_label text,
+                    rent int,
+                    beds int,
+                    baths real,
+                    sqft real,
+                    date_available date,
+                    date_scraped date,
+                    property_id int NOT NULL,
+                    FOREIGN KEY(property_id) REFERENCES properties(property_id),
+                    UNIQUE(property_id, unit_label, beds, baths, sqft, date_scraped)
+                    ); """
+
+# One observation of every unit per day from day start to day days - 1,
+# with rents drifting a little
+# The modulo operator is written %% as the queries have parameters
+FILL_PROPERTIES = """INSERT INTO properties (property_name, city_name, neighborhood,
+                                        zipcode)
+                    SELECT 'Property ' || i, 'New York', 'Neighborhood ' || i %% 300,
+                           10000 + i %% 500
+                    FROM generate_series(1, %(properties)s) i"""
+FILL_UNITS = """INSERT INTO units (property_id, unit_label, rent, beds, baths, sqft,
+                                   date_available, date_scraped)
+                SELECT p, u::text, 1500 + (p * 37 + u * 101) %% 4000 + d,
+                       u %% 4, 1 + u %% 2, 400 + u * 40, %(first)s::date + d,
+                       %(first)s::date + d
+                FROM generate_series(1, %(properties)s) p,
+                     generate_series(1, %(units)s) u,
+                     generate_series(%(start)s, %(days)s - 1) d"""
+
+LATEST_BY_NEIGHBORHOOD_OLD = """SELECT neighborhood, avg(rent)
+                    FROM (SELECT DISTINCT ON
+                                    (property_id, unit_label, beds, baths, sqft)
+                                property_id, rent
+                          FROM units
+                          ORDER BY property_id, unit_label, beds, baths, sqft,
+                                   date_scraped DESC) latest
+                    JOIN properties USING (property_id)
+                    GROUP BY neighborhood"""
+LATEST_BY_NEIGHBORHOOD_NEW = """SELECT neighborhood, avg(rent)
+                    FROM latest_units
+                    JOIN properties USING (property_id)
+                    GROUP BY neighborhood"""
+RENT_HISTORY = """SELECT date_scraped, avg(rent)
+                    FROM units
+                    WHERE property_id = 1234
+                    GROUP BY date_scraped
+                    ORDER BY date_scraped"""
+LAST_WEEK_TWO_BEDS = """SELECT count(*), avg(rent)
+                    FROM units
+                    WHERE beds = 2 AND rent < 3000 AND date_scraped >= %(last_week)s"""
+
+
+def timed(cur, query: str, parameters: dict = None, repeat: int = 5):
+    """Returns the best time of a query, in ms"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cur.execute(query, parameters)
+        cur.fetchall()
+        best = min(best, time.perf_counter() - start)
+    return 1000 * best
+
+
+def fill(conn, parameters: dict):
+    """Stores the properties and every day of units but the last"""
+    cur = conn.cursor()
+    cur.execute("TRUNCATE units, properties RESTART IDENTITY CASCADE")
+    cur.execute(FILL_PROPERTIES, parameters)
+    cur.execute(FILL_UNITS, parameters | {"start": 0, "days": DAYS - 1})
+    conn.commit()
+    return cur
+
+
+def scrape_last_day(conn, parameters: dict):
+    """Stores the units of the last day, as a run would"""
+    cur = conn.cursor()
+    cur.execute(FILL_UNITS, parameters | {"start": DAYS - 1})
+    conn.commit()
+    cur.execute("ANALYZE")
+    conn.commit()
+
+
+if __name__ == "__main__":
+    first = date.today() - timedelta(days=DAYS - 1)
+    parameters = {
+        "properties": PROPERTIES,
+        "units": UNITS_PER_PROPERTY,
+        "days": DAYS,
+        "first": first,
+        "last_week": date.today() - timedelta(days=7),
+    }
+    print(f"Units: {PROPERTIES * UNITS_PER_PROPERTY * DAYS:,}")
+
+    old = psycopg2.connect(dbname="apartments_bench_old", **CONNECT)
+    old.cursor().execute("""CREATE TABLE IF NOT EXISTS properties (
+            property_id SERIAL PRIMARY KEY,
+            property_name text NOT NULL,
+            city_name text NOT NULL,
+            neighborhood text,
+            zipcode text NOT NULL,
+            UNIQUE(property_name, zipcode))""")
+    old.cursor().execute(OLD_UNITS_TABLE)
+    old_cur = fill(old, parameters)
+    scrape_last_day(old, parameters)
+
+    database = dbPostgres(dbname="apartments_bench", **CONNECT)
+    create_month_partitions(database.conn.cursor(), first, date.today())
+    new_cur = fill(database.conn, parameters)
+    database.refresh_latest_units()
+    scrape_last_day(database.conn, parameters)
+    # A refresh after a day's scrape, as pyApartments runs at the end of a run
+    start = time.perf_counter()
+    database.refresh_latest_units()
+    refresh_time = 1000 * (time.perf_counter() - start)
+    print(f"refresh latest_units concurrently after a day: {refresh_time:.1f} ms")
+
+    for name, old_query, new_query in (
+        (
+            "latest rent by neighborhood",
+            LATEST_BY_NEIGHBORHOOD_OLD,
+            LATEST_BY_NEIGHBORHOOD_NEW,
+        ),
+        ("rent history of a property", RENT_HISTORY, RENT_HISTORY),
+        ("last week's 2 bed rents", LAST_WEEK_TWO_BEDS, LAST_WEEK_TWO_BEDS),
+    ):
+        old_time = timed(old_cur, old_query, parameters)
+        new_time = timed(new_cur, new_query, parameters)
+        print(f"{name}: {old_time:.1f} ms -> {new_time:.1f} ms")
+        if new_query == LATEST_BY_NEIGHBORHOOD_NEW and old_time > new_time:
+            print(
+                f"    the refresh pays for itself after "
+                f"{refresh_time / (old_time - new_time):.1f} queries"
+            )
+
+    old.close()
+    database.close_connection()
@@ -2,9 +2,26 @@
 from sys import argv
 import time
 from src.items import ApartmentsPipeline
+from src.change_capture import ChangeCaptureSink
+from src.db_pool import ConnectionPool
 from src.db_postgres import dbPostgres
+from src.fetcher import AsyncFetcher
+from src.formatting import DateNormalizer
+from src.parquet_store import ParquetSink
+from src.response_cache import ResponseCache
+from src.sinks import BackgroundWriter, FanOutSink, FileSink, PostgresSink, SQLiteSink
+from src.streaming import StreamingPipeline
 
 if __name__ == "__main__":
+    # Changes are captured in a database, files only take whole snapshots
+    if "--changes" in argv and {"--files", "--parquet"} & set(argv):
+        raise SystemExit("--changes needs a database, it can't be used with files")
+    # Parquet parts are only published on close, a crashed --parquet run has none
+    if {"--parquet", "--resume"} <= set(argv):
+        raise SystemExit(
+            "A --parquet run can't be resumed, run it again without --resume"
+        )
+
     # Collect the information to set up the scraping pipeline
     city_names = input("Enter the city name:  ").split(",")
     state_abbv = input("Enter the state abbreviation:  ")
@@ -13,32 +30,81 @@ if __name__ == "__main__":
     # Record the start time of the program
     start_time = time.time()
 
+    # A single fetcher keeps the pooled connections open across all cities.
+    # With --replay, pages are parsed from the response cache only.
+    # Otherwise responses are only served from the cache on the day they were
+    # fetched, so a daily run never stores yesterday's rents as today's.
+    cache = ResponseCache(ttl=12 * 3600, max_bytes=2 * 2**30)
+    fetcher = AsyncFetcher(cache=cache, replay="--replay" in argv)
+    # Every city of the run is dated the same, even past midnight
+    dates = DateNormalizer()
+    # Properties are stored to Postgres, unless --sqlite, --files or --parquet is given.
+    # Every city borrows its connection from one pool, and the schema is set up once.
+    pool = None
+    if not {"--sqlite", "--files", "--parquet"} & set(argv):
+        pool = ConnectionPool(
+            min_size=1,
+            max_size=4,
+            dbname="apartments",
+            user="postgres",
+            password="postgres",
+            port=5432,
+            host="localhost",
+        )
+
     # Scrape all of the cities
     for city in city_names:
         # Run the scraping pipeline
         print(f"Starting {city}")
-        pipeline = ApartmentsPipeline(city, state_abbv, end_price=end_price)
-        pipeline.run()
-        print(f"Done with {city}")
-        properties = pipeline.properties
-        all_units = pipeline.units
-
-        # Establish a connection to the database
-        database = dbPostgres(
-            dbname="apartments", user="postgres", password="postgres", port=5432
+        pipeline = ApartmentsPipeline(
+            city, state_abbv, end_price=end_price, fetcher=fetcher, dates=dates
         )
 
-        # Save all of the properties
-        database.insert_properties(properties)
+        if "--sqlite" in argv:
+            sink = SQLiteSink("./data/apartments.db")
+        elif "--files" in argv:
+            sink = FileSink("./data/raw", prefix=f"{city}_{dates.today_string}_")
+        elif "--parquet" in argv:
+            # Only readable once the city is done, which replaces the day's snapshot
+            sink = ParquetSink("./data/parquet", city, dates.today)
+        else:
+            sink = PostgresSink(pool=pool)
+        # With --changes, only what changed since the last run is written
+        if "--changes" in argv:
+            sink = ChangeCaptureSink(sink, city, today=dates.today)
 
-        # Save all of the units
-        for prop_name, values in all_units.items():
-            zipcode = values["zipcode"]
-            units = values["units"]
-            database.insert_units(units, prop_name, zipcode)
+        # The city's snapshot is also exported to Parquet as a backup, unless it is
+        # the sink. A resumed run only has the pages left, so it isn't exported.
+        writer_sink = sink
+        if not isinstance(sink, ParquetSink):
+            if "--resume" in argv:
+                print("Resuming, so the Parquet export of the city is skipped")
+            else:
+                writer_sink = FanOutSink(sink, pipeline.export)
+
+        # Properties are written in batches on a background thread, while fetching
+        # goes on
+        with BackgroundWriter(writer_sink) as writer:
+            StreamingPipeline(pipeline, writer).run(resume="--resume" in argv)
+            if isinstance(sink, ChangeCaptureSink) and pipeline.search_complete:
+                # Units of the properties no longer in the search results are delisted.
+                # Not after failed search pages, or on a resume, which doesn't search.
+                sink.listed_urls = set(pipeline.property_urls)
+        if isinstance(sink, ChangeCaptureSink):
+            print(f"Changes: {sink.stats()}")
+        print(f"Done with {city}")
 
-        # Close the connection
+    fetcher.close()
+    cache.close()
+    if pool is not None:
+        # The latest rent of every unit is read from a view refreshed once per run.
+        # --changes runs write unit_events instead of units, so the view isn't theirs.
+        database = dbPostgres(pool=pool)
+        if "--changes" not in argv:
+            database.refresh_latest_units()
         database.close_connection()
+        print(f"Database pool: {pool.stats()}")
+        pool.close()
 
     # Report the total time used
     print("Time used: {}".format(time.time() - start_time))
@@ -0,0 +1,276 @@
+from collections import Counter
+from datetime import date
+import hashlib
+from typing import NamedTuple, Optional
+
+from .records import UNIT_ROW_COLUMNS, PropertyRecord, UnitRecord, as_row
+from .sinks import DatabaseSink, StorageSink
+
+
+def fingerprint(values: tuple):
+    """Returns a signed 64 bit hash of values, stable across runs and processes"""
+    digest = hashlib.blake2b(repr(values).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def property_fingerprint(record: PropertyRecord):
+    """Hashes every stored value of a property"""
+    return fingerprint(tuple(as_row(record).values()))
+
+
+def unit_key(unit: UnitRecord):
+    """Identifies a unit within its property, like the units table's unique key"""
+    return (unit.unit_label, unit.beds, unit.baths, unit.sqft)
+
+
+def unit_fingerprint(unit: UnitRecord):
+    """Hashes the values of a unit that change from one snapshot to the next
+
+    "Available Now" is dated the day of the scrape, so a unit available on
+    or before that day is hashed as available now, rather than changing
+    with every run.
+    """
+    date_available = unit.date_available
+    if (
+        date_available is not None
+        and unit.date_scraped is not None
+        and date_available <= unit.date_scraped
+    ):
+        date_available = None
+    return fingerprint((unit.rent, date_available))
+
+
+class UnitEvent(NamedTuple):
+    """A unit listed for the first time ("insert"), with a new rent or
+    availability ("change"), or no longer listed ("delist")"""
+
+    event_type: str
+    property_name: str
+    zipcode: str
+    unit: UnitRecord
+    fingerprint: Optional[int]
+
+    def values(self):
+        """Returns the unit's UNIT_ROW_COLUMNS and fingerprint, as database values"""
+        row = self.unit.as_dict()
+        return tuple(row[column] for column in UNIT_ROW_COLUMNS) + (self.fingerprint,)
+
+
+class ChangeDetector:
+    """Compares freshly parsed properties and units with the last stored snapshot
+
+    What is compared only becomes the detector's snapshot once commit() is
+    called, after it is written, so a failed write is compared again when
+    it is retried. discard() drops it instead.
+
+    Methods:
+        property_changed: Whether a property is new or changed, and its fingerprint
+        unit_events: The events of a property's parsed units
+        commit: Take what was compared since the last commit as stored
+        discard: Forget what was compared since the last commit
+        delistings: The events of the properties no longer listed
+    """
+
+    def __init__(self, properties: dict, units: dict, today: date = None):
+        """
+        Args:
+            properties (dict): {(property_name, zipcode): (property_url, fingerprint)}
+                                    of the stored properties
+            units (dict): {(property_name, zipcode, unit_key): fingerprint} of the
+                                    stored units that are still listed
+            today (date, optional): Date of the run, given to the delisting events.
+                                    Defaults to today.
+        """
+        self.properties = properties
+        self.units = {}
+        for (property_name, zipcode, key), unit_hash in units.items():
+            self.units.setdefault((property_name, zipcode), {})[key] = unit_hash
+        self.today = today or date.today()
+        self.seen_properties = set()
+        self.counts = Counter()
+        # Compared since the last commit, not written yet
+        self.pending_properties = {}
+        self.pending_units = {}
+        self.pending_counts = Counter()
+
+    def property_changed(self, record: PropertyRecord):
+        """Returns (changed, fingerprint), changed being True for new properties too"""
+        property_hash = property_fingerprint(record)
+        key = (record.property_name, record.zipcode)
+        self.seen_properties.add(key)
+        previous = self.pending_properties.get(key, self.properties.get(key))
+        self.pending_properties[key] = (record.property_url, property_hash)
+        if previous is not None and previous[1] == property_hash:
+            self.pending_counts["unchanged properties"] += 1
+            return False, property_hash
+        if previous is None:
+            self.pending_counts["new properties"] += 1
+        else:
+            self.pending_counts["changed properties"] += 1
+        return True, property_hash
+
+    def commit(self):
+        """Takes the properties and units compared since the last commit as stored"""
+        self.properties.update(self.pending_properties)
+        self.units.update(self.pending_units)
+        self.counts.update(self.pending_counts)
+        self.discard()
+
+    def discard(self):
+        """Forgets the properties and units compared since the last commit"""
+        self.pending_properties = {}
+        self.pending_units = {}
+        self.pending_counts = Counter()
+
+    def delisted(self, property_name: str, zipcode: str, key: tuple):
+        unit_label, beds, baths, sqft = key
+        unit = UnitRecord(
+            unit_label, None, beds, baths, sqft, None, self.today.toordinal()
+        )
+        return UnitEvent("delist", property_name, zipcode, unit, None)
+
+    def unit_events(self, property_name: str, zipcode: str, units: list):
+        """Returns the events of a property's units, as UnitRecords or formatted dicts
+
+        Stored units missing from the property's units are delisted.
+        """
+        key = (property_name, zipcode)
+        stored = self.pending_units.get(key, self.units.get(key, {}))
+        current = {}
+        events = []
+        for unit in units:
+            if isinstance(unit, dict):
+                unit = UnitRecord.from_dict(unit)
+            key = unit_key(unit)
+            unit_hash = unit_fingerprint(unit)
+            if current.get(key) == unit_hash:
+                continue
+            current[key] = unit_hash
+            previous = stored.get(key)
+            if previous == unit_hash:
+                self.pending_counts["unchanged"] += 1
+                continue
+            event_type = "insert" if previous is None else "change"
+            self.pending_counts[event_type] += 1
+            events.append(
+                UnitEvent(event_type, property_name, zipcode, unit, unit_hash)
+            )
+
+        for key in stored:
+            if key not in current:
+                self.pending_counts["delist"] += 1
+                events.append(self.delisted(property_name, zipcode, key))
+        self.pending_units[(property_name, zipcode)] = current
+        return events
+
+    def delistings(self, listed_urls: set):
+        """Returns the delisting events of the units of every stored property
+        that wasn't seen in this run and isn't listed anymore"""
+        events = []
+        for (property_name, zipcode), (url, _) in self.properties.items():
+            if (property_name, zipcode) in self.seen_properties or url in listed_urls:
+                continue
+            for key in self.units.pop((property_name, zipcode), {}):
+                self.counts["delist"] += 1
+                events.append(self.delisted(property_name, zipcode, key))
+        return events
+
+
+class ChangeCaptureSink(StorageSink):
+    """Writes only what changed since the last snapshot of a city to a database sink
+
+    Properties are fingerprinted and only new or changed ones are written,
+    along with their fingerprint. Units are fingerprinted by their rent and
+    availability, and stored as insert, change and delist events in the
+    unit_events table instead of a full copy of every unit in units.
+
+    Units missing from a property's page are delisted as soon as the
+    property is written. Properties that weren't seen are only delisted on
+    close, if listed_urls is set to the URLs of the run's search results.
+    It should only be set if the search was complete. Even then, nothing is
+    delisted if it holds fewer than min_listed_share of the stored
+    properties, as a search that broke is likelier than a city emptying.
+
+    The units table isn't written, so its latest_units view doesn't follow
+    a city stored in this mode. Its unit_events are the unit history.
+
+    Methods:
+        stats: Counts of new, changed and unchanged properties, and of unit events
+    """
+
+    def __init__(
+        self,
+        sink: DatabaseSink,
+        city_name: str,
+        today: date = None,
+        min_listed_share: float = 0.5,
+    ):
+        """
+        Args:
+            sink (DatabaseSink): Postgres or SQLite sink the changes are written to
+            city_name (str): City of the run, its properties are the snapshot
+            today (date, optional): Date of the run. Defaults to today.
+            min_listed_share (float, optional): Least share of the stored properties
+                                    that listed_urls must hold to delist the others.
+        """
+        self.sink = sink
+        self.city_name = city_name
+        self.today = today
+        self.min_listed_share = min_listed_share
+        self.detector = None
+        self.listed_urls = None
+        self.stored_properties = 0
+
+    def open(self):
+        self.sink.open()
+        properties, units = self.sink.database.load_snapshot(self.city_name)
+        self.stored_properties = len(properties)
+        self.detector = ChangeDetector(properties, units, self.today)
+        return self
+
+    def write_properties(self, properties: list):
+        rows = []
+        for record in properties:
+            if isinstance(record, dict):
+                record = PropertyRecord.from_dict(record)
+            changed, property_hash = self.detector.property_changed(record)
+            if changed:
+                rows.append(as_row(record) | {"fingerprint": property_hash})
+        self.write_changes(self.sink.database.copy_properties, rows)
+
+    def write_units(self, property_units: list):
+        events = []
+        for property_name, zipcode, units in property_units:
+            events += self.detector.unit_events(property_name, zipcode, units)
+        self.write_changes(self.sink.database.write_unit_events, events)
+
+    def write_changes(self, write, changes: list):
+        """Writes the changes, then commits the detector's comparison, or discards
+        it if the write fails so that a retry compares the same values again"""
+        try:
+            if changes:
+                write(changes)
+        except Exception:
+            self.detector.discard()
+            raise
+        self.detector.commit()
+
+    def flush(self):
+        self.sink.flush()
+
+    def close(self):
+        if self.detector is not None and self.listed_urls is not None:
+            listed_urls = set(self.listed_urls)
+            if len(listed_urls) < self.min_listed_share * self.stored_properties:
+                print(
+                    f"Only {len(listed_urls)} of the {self.stored_properties} stored"
+                    f" properties of {self.city_name} are listed, none are delisted"
+                )
+            else:
+                events = self.detector.delistings(listed_urls)
+                if events:
+                    self.sink.database.write_unit_events(events)
+        self.sink.close()
+
+    def stats(self):
+        return dict(self.detector.counts) if self.detector is not None else {}
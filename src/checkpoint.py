@@ -0,0 +1,159 @@
+import json
+import os
+
+
+class Checkpoint:
+    """Durable, incremental record of a city's scraping progress
+
+    The checkpoint for a city lives in its own directory:
+        frontier.json: Every property URL found during enumeration
+        fetched.txt: Property URLs that have been fetched and parsed, one per line
+        records.jsonl: Parsed property and unit records, one property per line
+
+    Lines are appended as the run progresses and fsynced every few records,
+    so a crash loses at most the last few pages. A partially written last
+    line is ignored on load.
+
+    Methods:
+        load: Read back the frontier, fetched URLs and parsed records
+        save_frontier: Store the enumerated property URLs
+        record: Append a parsed property and mark its URL as fetched
+        mark_fetched: Mark a URL as fetched without a record
+        clear: Remove the checkpoint after a successful run
+    """
+
+    def __init__(
+        self,
+        city_name: str,
+        directory: str = "./data/checkpoints",
+        sync_every: int = 20,
+    ):
+        """Constructs the checkpoint for a city
+
+        Args:
+            city_name (str): City the checkpoint belongs to.
+            directory (str, optional): Directory holding the checkpoints of every city.
+            sync_every (int, optional): Number of records between each fsync.
+        """
+        self.path = os.path.join(directory, city_name.lower().replace(" ", "-"))
+        self.sync_every = sync_every
+        self.frontier = None
+        self.fetched = set()
+        self.records = []
+
+        self._fetched_file = None
+        self._records_file = None
+        self._unsynced = 0
+
+    def _file(self, name: str):
+        return os.path.join(self.path, name)
+
+    @staticmethod
+    def _read_lines(filename: str):
+        """Yields the complete lines of a file, skipping a truncated last line"""
+        if not os.path.exists(filename):
+            return
+        with open(filename, "r", encoding="utf-8") as file:
+            for line in file:
+                if line.endswith("\n"):
+                    yield line.rstrip("\n")
+
+    def exists(self):
+        return os.path.exists(self._file("frontier.json"))
+
+    def load(self, load_records: bool = True):
+        """Loads the saved progress. Returns False if there is nothing to resume.
+
+        Args:
+            load_records (bool, optional): Also read the parsed records back into
+                                    memory. Not needed when they were already stored.
+        """
+        if not self.exists():
+            return False
+
+        with open(self._file("frontier.json"), "r", encoding="utf-8") as file:
+            self.frontier = json.load(file)
+
+        self.records = []
+        self.fetched = set(self._read_lines(self._file("fetched.txt")))
+        for line in self._read_lines(self._file("records.jsonl")):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            # A record is only written for a fetched page
+            self.fetched.add(record["property"]["property_url"])
+            if load_records:
+                self.records.append(record)
+        return True
+
+    def save_frontier(self, property_urls: list):
+        """Atomically stores the enumerated property URLs, starting a new checkpoint"""
+        self.clear()
+        os.makedirs(self.path, exist_ok=True)
+
+        tmp_filename = self._file("frontier.json.tmp")
+        with open(tmp_filename, "w", encoding="utf-8") as file:
+            json.dump(property_urls, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_filename, self._file("frontier.json"))
+        self.frontier = list(property_urls)
+
+    def _append(self, name: str):
+        """Opens a file for appending, cutting off a line truncated by a crash"""
+        filename = self._file(name)
+        if os.path.exists(filename) and os.path.getsize(filename) > 0:
+            with open(filename, "rb+") as file:
+                content = file.read()
+                if not content.endswith(b"\n"):
+                    file.truncate(content.rfind(b"\n") + 1)
+        return open(filename, "a", encoding="utf-8")
+
+    def _open(self):
+        if self._records_file is None:
+            os.makedirs(self.path, exist_ok=True)
+            self._records_file = self._append("records.jsonl")
+            self._fetched_file = self._append("fetched.txt")
+
+    def _sync(self, force: bool = False):
+        self._unsynced += 1
+        if force or self._unsynced >= self.sync_every:
+            for file in [self._records_file, self._fetched_file]:
+                file.flush()
+                os.fsync(file.fileno())
+            self._unsynced = 0
+
+    def record(self, url: str, property_data: dict, units: dict):
+        """Appends a parsed property with its units and marks the URL as fetched"""
+        self._open()
+        record = {"property": property_data, "units": units}
+        self._records_file.write(json.dumps(record) + "\n")
+        self._fetched_file.write(url + "\n")
+        self.fetched.add(url)
+        self._sync()
+
+    def mark_fetched(self, url: str):
+        """Marks a URL as fetched so it is not requested again on resume"""
+        self._open()
+        self._fetched_file.write(url + "\n")
+        self.fetched.add(url)
+        self._sync()
+
+    def close(self):
+        if self._records_file is not None:
+            self._sync(force=True)
+            self._records_file.close()
+            self._fetched_file.close()
+            self._records_file = None
+            self._fetched_file = None
+
+    def clear(self):
+        """Deletes the checkpoint files"""
+        self.close()
+        for name in ["frontier.json", "fetched.txt", "records.jsonl"]:
+            if os.path.exists(self._file(name)):
+                os.remove(self._file(name))
+        self.frontier = None
+        self.fetched = set()
+        self.records = []
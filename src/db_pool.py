@@ -0,0 +1,138 @@
+from contextlib import contextmanager
+import threading
+import time
+
+from psycopg2 import pool
+from psycopg2.pool import PoolError
+
+
+class ConnectionPool:
+    """A pool of Postgres connections shared by every writer of a process
+
+    Writers wait for a free connection when all max_size of them are in use,
+    instead of failing like a bare psycopg2 pool. The time spent waiting and
+    the share of the pool kept busy are recorded, to size it for a run.
+
+    The pool also holds what only has to be done once per process: the
+    schema setup, and the property_id cache of the dbPostgres borrowing
+    its connections.
+
+    Methods:
+        getconn: Borrow a connection, waiting for one if they are all in use
+        putconn: Give a borrowed connection back
+        connection: Borrow a connection for the duration of a with block
+        setup_once: Run the schema setup, the first time only
+        stats: Wait times and utilization
+        close: Close every connection
+    """
+
+    def __init__(self, min_size: int = 1, max_size: int = 4, **connect_kwargs):
+        """Opens min_size connections
+
+        Args:
+            min_size (int, optional): Number of connections kept open.
+            max_size (int, optional): Max number of connections in use at once.
+            connect_kwargs: Arguments of psycopg2.connect, e.g. dbname and user.
+        """
+        self.min_size = min_size
+        self.max_size = max_size
+        self._pool = pool.ThreadedConnectionPool(min_size, max_size, **connect_kwargs)
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._setup_lock = threading.Lock()
+        self.is_setup = False
+        self.property_ids = {}
+
+        self.started = time.perf_counter()
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.busy_time = 0.0
+        self._borrowed = {}
+
+    def getconn(self, timeout: float = None):
+        """Borrows a connection, waiting for one to be given back if they are all in use
+
+        Args:
+            timeout (float, optional): Max seconds to wait. Waits as long as it takes
+                                    if None.
+        """
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolError(f"No connection free after {timeout} s")
+        try:
+            conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+        now = time.perf_counter()
+        waited = now - start
+        with self._lock:
+            self.checkouts += 1
+            # Waits under a millisecond are only the cost of the checkout
+            if waited >= 0.001:
+                self.waits += 1
+            self.wait_time += waited
+            self.max_wait = max(self.max_wait, waited)
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            self._borrowed[id(conn)] = now
+        return conn
+
+    def putconn(self, conn, close: bool = False):
+        """Gives a borrowed connection back, closing it if close is True"""
+        with self._lock:
+            self.in_use -= 1
+            self.busy_time += time.perf_counter() - self._borrowed.pop(id(conn))
+        try:
+            self._pool.putconn(conn, close=close)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def setup_once(self, setup):
+        """Calls setup() the first time any writer asks, later calls return at once
+
+        Writers asking while the setup runs wait for it to finish.
+        """
+        with self._setup_lock:
+            if not self.is_setup:
+                setup()
+                self.is_setup = True
+
+    def stats(self):
+        """Returns the checkouts, the waits for a free connection and the utilization
+
+        The utilization is the share of the max_size connections' time spent
+        borrowed since the pool was opened.
+        """
+        now = time.perf_counter()
+        with self._lock:
+            busy_time = self.busy_time + sum(
+                now - since for since in self._borrowed.values()
+            )
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "mean_wait_ms": 1000 * self.wait_time / max(self.checkouts, 1),
+                "max_wait_ms": 1000 * self.max_wait,
+                "utilization": busy_time / (self.max_size * (now - self.started)),
+            }
+
+    def close(self):
+        self._pool.closeall()
@@ -1,23 +1,249 @@
+from datetime import date, timedelta
+import io
+import math
+
 import psycopg2
-from psycopg2 import extras
+from psycopg2 import extras, sql
 from psycopg2.errors import UniqueViolation
 
+from .db_pool import ConnectionPool
+from .records import UNIT_ROW_COLUMNS, as_row, batched
+
+# Characters escaped in the text format of COPY
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def copy_value(value):
+    """Writes a value in the text format of COPY, None and NaN as NULL"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def copy_buffer(rows):
+    """Returns a file of rows in the text format of COPY"""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(copy_value(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+def units_table_query(name: str = "units"):
+    """Returns the DDL of a units table, range partitioned by date_scraped
+
+    Unique keys of a partitioned table include the partition key, so the
+    primary key is (unit_id, date_scraped).
+    """
+    return sql.SQL(
+        """CREATE TABLE IF NOT EXISTS {name} (
+            unit_id SERIAL,
+            unit_label text,
+            rent int,
+            beds int,
+            baths real,
+            sqft real,
+            date_available date,
+            date_scraped date NOT NULL,
+            property_id int NOT NULL,
+            PRIMARY KEY(unit_id, date_scraped),
+            FOREIGN KEY(property_id) REFERENCES properties(property_id),
+            UNIQUE(property_id, unit_label, beds, baths, sqft, date_scraped)
+            ) PARTITION BY RANGE (date_scraped); """
+    ).format(name=sql.Identifier(name))
+
+
+def month_start(day: date):
+    return day.replace(day=1)
+
+
+def next_month(day: date):
+    return (month_start(day).replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def create_month_partitions(cur, first: date, last: date, table: str = "units"):
+    """Creates the monthly partitions of a units table from first's month to last's
+
+    Partitions are named units_YYYY_MM. Dates outside of them go to the
+    default partition, units_default, so the rows it already holds for a
+    new month are moved out while that month's partition is created.
+    """
+    cur.execute("SELECT to_regclass('units_default')")
+    has_default = cur.fetchone()[0] is not None
+    month = month_start(first)
+    while month <= last:
+        partition = f"units_{month:%Y_%m}"
+        cur.execute("SELECT to_regclass(%s)", (partition,))
+        if cur.fetchone()[0] is None:
+            bounds = (month, next_month(month))
+            # A partition can't be created while the default one has rows in its range
+            if has_default:
+                cur.execute(
+                    """CREATE TEMP TABLE units_moved (LIKE units_default)
+                        ON COMMIT DROP"""
+                )
+                cur.execute(
+                    """WITH moved AS (
+                            DELETE FROM units_default
+                            WHERE date_scraped >= %s AND date_scraped < %s
+                            RETURNING *)
+                        INSERT INTO units_moved SELECT * FROM moved""",
+                    bounds,
+                )
+            cur.execute(
+                sql.SQL(
+                    """CREATE TABLE {partition}
+                        PARTITION OF {table}
+                        FOR VALUES FROM (%s) TO (%s)"""
+                ).format(
+                    partition=sql.Identifier(partition),
+                    table=sql.Identifier(table),
+                ),
+                bounds,
+            )
+            if has_default:
+                cur.execute(
+                    sql.SQL("INSERT INTO {table} SELECT * FROM units_moved").format(
+                        table=sql.Identifier(table)
+                    )
+                )
+                cur.execute("DROP TABLE units_moved")
+        month = next_month(month)
+
+
+def partition_units(cur):
+    """Moves the rows of an unpartitioned units table into a partitioned one
+
+    The partitioned table is built next to the old one, with a partition for
+    each month of the stored snapshots, then takes its name. Units with no
+    date_scraped are kept in the default partition, with a date of -infinity.
+    """
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('units')")
+    row = cur.fetchone()
+    if row is None or row[0] == "p":
+        return
+
+    cur.execute("DROP MATERIALIZED VIEW IF EXISTS latest_units")
+    cur.execute(units_table_query("units_partitioned"))
+    cur.execute("CREATE TABLE units_default PARTITION OF units_partitioned DEFAULT")
+    cur.execute(
+        """SELECT min(date_scraped), max(date_scraped)
+            FROM units
+            WHERE date_scraped > '-infinity'"""
+    )
+    first, last = cur.fetchone()
+    if first is not None:
+        create_month_partitions(cur, first, last, table="units_partitioned")
+
+    columns = sql.SQL(", ").join(
+        map(sql.Identifier, ("unit_id", "property_id") + UNIT_ROW_COLUMNS[:-1])
+    )
+    cur.execute(
+        sql.SQL(
+            """INSERT INTO units_partitioned ({columns}, date_scraped)
+                SELECT {columns}, COALESCE(date_scraped, '-infinity')
+                FROM units"""
+        ).format(columns=columns)
+    )
+    cur.execute(
+        """SELECT setval(
+            pg_get_serial_sequence('units_partitioned', 'unit_id'),
+            COALESCE((SELECT max(unit_id) FROM units_partitioned), 0) + 1,
+            false)"""
+    )
+    cur.execute("DROP TABLE units")
+    cur.execute("ALTER TABLE units_partitioned RENAME TO units")
+    cur.execute(
+        "ALTER SEQUENCE units_partitioned_unit_id_seq RENAME TO units_unit_id_seq"
+    )
+
+
+# Inserts, changes and delistings of units, written by the change capture mode
+UNIT_EVENTS_TABLE = """CREATE TABLE IF NOT EXISTS unit_events (
+                    event_id BIGSERIAL PRIMARY KEY,
+                    property_id int NOT NULL REFERENCES properties(property_id),
+                    event_type text NOT NULL
+                        CHECK (event_type IN ('insert', 'change', 'delist')),
+                    unit_label text,
+                    rent int,
+                    beds int,
+                    baths real,
+                    sqft real,
+                    date_available date,
+                    date_scraped date NOT NULL,
+                    fingerprint bigint
+                    ); """
+
+
+# Schema changes applied to existing databases, in order
+# Each one is (version, statements), and is recorded in schema_migrations once applied.
+# The statements are a list of SQL, or a function given the cursor.
+MIGRATIONS = [
+    (1, ["ALTER TABLE properties ADD COLUMN IF NOT EXISTS business_center boolean"]),
+    (2, partition_units),
+    # latest_units was keyed on (property_id, unit_label), create_partitions_and_views
+    # builds it again on the units unique key
+    (3, ["DROP MATERIALIZED VIEW IF EXISTS latest_units"]),
+    (
+        4,
+        [
+            "ALTER TABLE properties ADD COLUMN IF NOT EXISTS fingerprint bigint",
+            UNIT_EVENTS_TABLE,
+            """CREATE INDEX IF NOT EXISTS unit_events_unit_idx ON unit_events
+                (property_id, unit_label, beds, baths, sqft, event_id)""",
+        ],
+    ),
+]
+
 
 class dbPostgres:
     def __init__(
-        self, dbname: str, user: str, password: str, port: int, host: str = "localhost"
+        self,
+        dbname: str = None,
+        user: str = None,
+        password: str = None,
+        port: int = None,
+        host: str = "localhost",
+        pool: ConnectionPool = None,
     ):
+        """Connects to the database, creating and migrating its tables if needed
+
+        Args:
+            pool (ConnectionPool, optional): Pool to borrow the connection from, instead
+                                    of connecting with the other arguments. The schema
+                                    setup and the property_id cache are then shared by
+                                    every dbPostgres of the pool.
+        """
         self.dbname = dbname
         self.user = user
         self.password = password
         self.port = port
         self.host = host
+        self.pool = pool
 
-        # Create a connection to the database
-        self.conn = self.create_connection()
+        if pool is None:
+            # Create a connection to the database
+            self.conn = self.create_connection()
 
-        # Create tables if they don't exist
+            # property_id of each (property_name, zipcode), cached for the run
+            self.property_ids = {}
+            self.setup_schema()
+        else:
+            self.conn = pool.getconn()
+            self.property_ids = pool.property_ids
+            pool.setup_once(self.setup_schema)
+
+    def setup_schema(self):
+        """Creates the tables if they don't exist, migrates them and preloads the ids"""
         self.create_tables()
+        self.migrate()
+        self.create_partitions_and_views()
+        self.load_property_ids()
 
     def create_connection(self):
         try:
@@ -41,6 +267,7 @@ class dbPostgres:
                             property_name text NOT NULL,
                             city_name text NOT NULL,
                             fitness_center boolean,
+                            business_center boolean,
                             air_conditioning boolean,
                             in_unit_washer_dryer boolean,
                             dishwasher boolean,
@@ -65,19 +292,7 @@ class dbPostgres:
                             CONSTRAINT name_zipcode_uc UNIQUE(property_name, zipcode)
                             ); """
 
-        query_apartments = """CREATE TABLE IF NOT EXISTS units (
-                            unit_id SERIAL PRIMARY KEY,
-                            unit_label text,
-                            rent int,
-                            beds int,
-                            baths real,
-                            sqft real,
-                            date_available date,
-                            date_scraped date,
-                            property_id int NOT NULL,
-                            FOREIGN KEY(property_id) REFERENCES properties(property_id),
-                            UNIQUE(property_id, unit_label, beds, baths, sqft, date_scraped)
-                            ); """
+        query_apartments = units_table_query()
 
         try:
             cur = self.conn.cursor()
@@ -89,22 +304,207 @@ class dbPostgres:
             print(e)
             self.conn.rollback()
 
+    def create_partitions_and_views(self, months_ahead: int = 1):
+        """Creates the units partitions of this month and the next ones, the
+        units indexes and the latest_units view, if they don't exist
+
+        Runs after the migrations, so they are built on the partitioned table.
+        Writers of other processes wait on the migrations lock meanwhile. The
+        transaction is rolled back and the error raised if it fails.
+
+        Args:
+            months_ahead (int, optional): Number of months after this one given
+                                    a partition
+        """
+        today = date.today()
+        last = today
+        for _ in range(months_ahead):
+            last = next_month(last)
+
+        cur = self.conn.cursor()
+        try:
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('schema_migrations'))")
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS units_default PARTITION OF units DEFAULT"
+            )
+            create_month_partitions(cur, today, last)
+            # Rent history of a property, and rents by bedroom count
+            cur.execute(
+                """CREATE INDEX IF NOT EXISTS units_property_date_idx
+                    ON units (property_id, date_scraped)"""
+            )
+            cur.execute(
+                "CREATE INDEX IF NOT EXISTS units_beds_rent_idx ON units (beds, rent)"
+            )
+            # The last observation of each unit, keyed like the units unique key so
+            # units without a label aren't merged. The unique index lets it refresh
+            # concurrently.
+            cur.execute(
+                """CREATE MATERIALIZED VIEW IF NOT EXISTS latest_units AS
+                    SELECT DISTINCT ON (property_id, unit_label, beds, baths, sqft)
+                        unit_id, property_id, unit_label, rent, beds, baths, sqft,
+                        date_available, date_scraped
+                    FROM units
+                    ORDER BY property_id, unit_label, beds, baths, sqft,
+                        date_scraped DESC, unit_id DESC"""
+            )
+            cur.execute(
+                """CREATE UNIQUE INDEX IF NOT EXISTS latest_units_key
+                    ON latest_units (unit_id, date_scraped)"""
+            )
+            cur.execute(
+                """CREATE INDEX IF NOT EXISTS latest_units_property_idx
+                    ON latest_units (property_id)"""
+            )
+            cur.execute(
+                """CREATE INDEX IF NOT EXISTS latest_units_beds_rent_idx
+                    ON latest_units (beds, rent)"""
+            )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def refresh_latest_units(self):
+        """Refreshes latest_units without blocking the queries reading it"""
+        cur = self.conn.cursor()
+        try:
+            cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY latest_units")
+            self.conn.commit()
+        except Exception as e:
+            print(f"Error: {e} refreshing latest_units")
+            self.conn.rollback()
+        finally:
+            cur.close()
+
+    def migrate(self):
+        """Applies the MIGRATIONS not applied yet, each in its own transaction
+
+        Writers of other processes wait on a lock while the migrations run. A
+        failing migration is rolled back and its error raised, the ones before
+        it staying applied.
+        """
+        cur = self.conn.cursor()
+        try:
+            cur.execute(
+                """CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version int PRIMARY KEY,
+                    applied_at timestamptz NOT NULL DEFAULT now()
+                    )"""
+            )
+            self.conn.commit()
+            for version, statements in MIGRATIONS:
+                cur.execute(
+                    "SELECT pg_advisory_xact_lock(hashtext('schema_migrations'))"
+                )
+                cur.execute(
+                    "SELECT 1 FROM schema_migrations WHERE version = %s", (version,)
+                )
+                if cur.fetchone() is None:
+                    if callable(statements):
+                        statements(cur)
+                    else:
+                        for statement in statements:
+                            cur.execute(statement)
+                    cur.execute(
+                        "INSERT INTO schema_migrations (version) VALUES (%s)",
+                        (version,),
+                    )
+                self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def load_property_ids(self):
+        """Caches the property_id of every stored property, with a single query"""
+        cur = self.conn.cursor()
+        try:
+            cur.execute("SELECT property_name, zipcode, property_id FROM properties")
+            for property_name, zipcode, property_id in cur:
+                self.property_ids[(property_name, zipcode)] = property_id
+            self.conn.commit()
+        except Exception as e:
+            print(e)
+            self.conn.rollback()
+        finally:
+            cur.close()
+
+    def get_property_id(self, property_name: str, zipcode: str):
+        """Returns the property_id of a property, None if it isn't stored
+
+        Ids are read from the run's cache, and only looked up for properties
+        stored by another process since it was loaded.
+        """
+        key = (property_name, zipcode)
+        if key not in self.property_ids:
+            cur = self.conn.cursor()
+            cur.execute(
+                """SELECT property_id
+                    FROM properties
+                    WHERE property_name = %s
+                    AND zipcode = %s""",
+                key,
+            )
+            row = cur.fetchone()
+            cur.close()
+            if row is None:
+                return None
+            self.property_ids[key] = row[0]
+        return self.property_ids[key]
+
+    @staticmethod
+    def upsert_properties_query(columns: list, source: sql.Composable):
+        """Returns the upsert of properties, returning the id of each stored property
+
+        Every column of a stored property is updated to the new values.
+
+        Args:
+            columns (list): Property columns of the rows
+            source (Composable): VALUES or SELECT giving the rows
+        """
+        updated = [c for c in columns if c not in ("property_name", "zipcode")]
+        return sql.SQL(
+            """INSERT INTO properties ({columns})
+                {source}
+                ON CONFLICT ON CONSTRAINT name_zipcode_uc
+                DO
+                    UPDATE SET {updates}
+                RETURNING property_name, zipcode, property_id"""
+        ).format(
+            columns=sql.SQL(", ").join(map(sql.Identifier, columns)),
+            source=source,
+            updates=sql.SQL(", ").join(
+                sql.SQL("{column}=EXCLUDED.{column}").format(
+                    column=sql.Identifier(column)
+                )
+                for column in updated
+            ),
+        )
+
     def insert_properties(self, data: list):
+        """Inserts parsed property dicts or PropertyRecords, and caches their ids"""
         cur = self.conn.cursor()
+        data = [as_row(property_data) for property_data in data]
 
-        columns = data[0].keys()
-        value_placeholders = ["%(" + item + ")s" for item in columns]
-        query = f"""INSERT INTO properties ({(', '.join(columns))}) 
-                    VALUES ({(', '.join(value_placeholders))})
-                    ON CONFLICT ON CONSTRAINT name_zipcode_uc
-                    DO
-                        UPDATE SET business_center=EXCLUDED.business_center"""
+        columns = list(data[0].keys())
+        query = self.upsert_properties_query(
+            columns,
+            sql.SQL("VALUES ({})").format(
+                sql.SQL(", ").join(map(sql.Placeholder, columns))
+            ),
+        )
 
         for i in range(len(data)):
             prop_name = data[i]["property_name"]
             try:
                 cur.execute(query, data[i])
+                property_name, zipcode, property_id = cur.fetchone()
                 self.conn.commit()
+                self.property_ids[(property_name, zipcode)] = property_id
             except UniqueViolation as uc:
                 print(f"{prop_name} {uc}")
                 self.conn.rollback()
@@ -113,44 +513,266 @@ class dbPostgres:
                 self.conn.rollback()
         cur.close()
 
-    @staticmethod
-    def get_property_id_query(property_name: str, zipcode: str):
-        """Returns the query to get the property_id for the specified property"""
-        query = f"""SELECT property_id
-                    FROM properties
-                    WHERE property_name = '{property_name}'
-                    AND zipcode = '{zipcode}'
-                    """
-        return query
+    def insert_units(self, data: list, property_name: str, zipcode: str):
+        """Inserts the units of a property, given as parsed dicts or UnitRecords
 
-    def insert_units(self, data: dict, property_name: str, zipcode: str):
-        cur = self.conn.cursor()
+        The property's id is resolved once, and the units are sent in a single
+        statement. Units already stored are skipped.
+        """
+        property_id = self.get_property_id(property_name, zipcode)
+        if property_id is None:
+            print(f"Error: no property_id for property: {property_name}")
+            return
+        data = [
+            [property_id] + [unit[column] for column in UNIT_ROW_COLUMNS]
+            for unit in map(as_row, data)
+        ]
+        query = sql.SQL(
+            """INSERT INTO units (property_id, {columns})
+                VALUES %s
+                ON CONFLICT DO NOTHING"""
+        ).format(columns=sql.SQL(", ").join(map(sql.Identifier, UNIT_ROW_COLUMNS)))
 
+        cur = self.conn.cursor()
         try:
-            columns = [
-                "unit_label",
-                "rent",
-                "beds",
-                "baths",
-                "sqft",
-                "date_available",
-                "date_scraped",
-            ]
-            value_placeholders = ["%(" + item + ")s" for item in columns]
-            property_id_query = self.get_property_id_query(property_name, zipcode)
-            query = f"""INSERT INTO units (property_id, {(', '.join(columns))}) 
-                        VALUES (({property_id_query}), {(', '.join(value_placeholders))})"""
-
-            cur.executemany(query, data)
+            extras.execute_values(cur, query, data, page_size=max(len(data), 1))
             self.conn.commit()
-        except UniqueViolation:
-            self.conn.rollback()
         except Exception as e:
             print(f"Error: {e} at property: {property_name}")
             self.conn.rollback()
         finally:
             cur.close()
 
+    def insert_unit_store(self, store):
+        """Inserts every unit of a UnitStore, one batch per property"""
+        for property_name, zipcode, units in store.property_units():
+            self.insert_units(units, property_name, zipcode)
+
+    def copy_rows(self, cur, table: str, columns, rows):
+        """Streams rows into a table with COPY FROM STDIN"""
+        query = sql.SQL("COPY {table} ({columns}) FROM STDIN").format(
+            table=sql.Identifier(table),
+            columns=sql.SQL(", ").join(map(sql.Identifier, columns)),
+        )
+        cur.copy_expert(query, copy_buffer(rows))
+
+    def copy_properties(self, data: list, batch_size: int = 5000):
+        """Loads properties in batches, given as parsed dicts or PropertyRecords
+
+        Each batch is copied into a temporary staging table, then merged into
+        properties with a single upsert, and committed. The ids returned by
+        the upsert are cached for the units. A failing batch is rolled back
+        and its error raised, batches before it staying committed.
+
+        Returns:
+            int: Number of properties inserted or updated
+        """
+        loaded = 0
+        for batch in batched(data, batch_size):
+            # A property can only be upserted once per statement, so the last
+            # time it was scraped in the batch wins
+            batch = list(
+                {
+                    (row["property_name"], row["zipcode"]): row
+                    for row in map(as_row, batch)
+                }.values()
+            )
+            columns = list(batch[0].keys())
+            column_list = sql.SQL(", ").join(map(sql.Identifier, columns))
+            cur = self.conn.cursor()
+            try:
+                cur.execute(
+                    sql.SQL(
+                        """CREATE TEMP TABLE staging_properties ON COMMIT DROP AS
+                            SELECT {columns} FROM properties WITH NO DATA"""
+                    ).format(columns=column_list)
+                )
+                self.copy_rows(
+                    cur,
+                    "staging_properties",
+                    columns,
+                    ([row[column] for column in columns] for row in batch),
+                )
+                cur.execute(
+                    self.upsert_properties_query(
+                        columns,
+                        sql.SQL("SELECT {columns} FROM staging_properties").format(
+                            columns=column_list
+                        ),
+                    )
+                )
+                stored = cur.fetchall()
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            finally:
+                cur.close()
+            for property_name, zipcode, property_id in stored:
+                self.property_ids[(property_name, zipcode)] = property_id
+            loaded += len(stored)
+        return loaded
+
+    def copy_units(self, property_units, batch_size: int = 50000):
+        """Loads units in batches, carrying the cached id of each unit's property
+
+        Each batch is copied into a temporary staging table, then merged into
+        units with a single insert, and committed. Units already stored and
+        units of properties that aren't stored are skipped. A failing batch
+        is rolled back and its error raised.
+
+        Args:
+            property_units (iterable): (property_name, zipcode, units) of each
+                                    property, as yielded by UnitStore.property_units.
+                                    The units are dicts of database values or
+                                    UnitRecords.
+            batch_size (int, optional): Number of units copied per batch
+
+        Returns:
+            int: Number of units inserted
+        """
+
+        def rows():
+            for property_name, zipcode, units in property_units:
+                property_id = self.get_property_id(property_name, zipcode)
+                if property_id is None:
+                    print(f"Error: no property_id for property: {property_name}")
+                    continue
+                for unit in map(as_row, units):
+                    yield [property_id] + [unit[column] for column in UNIT_ROW_COLUMNS]
+
+        columns = ("property_id",) + UNIT_ROW_COLUMNS
+        column_list = sql.SQL(", ").join(map(sql.Identifier, columns))
+        loaded = 0
+        for batch in batched(rows(), batch_size):
+            cur = self.conn.cursor()
+            try:
+                # Numbers are staged as numeric, so averaged ranges are rounded
+                # like an insert
+                cur.execute(
+                    """CREATE TEMP TABLE staging_units (
+                        property_id int,
+                        unit_label text,
+                        rent numeric,
+                        beds numeric,
+                        baths numeric,
+                        sqft numeric,
+                        date_available date,
+                        date_scraped date
+                        ) ON COMMIT DROP"""
+                )
+                self.copy_rows(cur, "staging_units", columns, batch)
+                cur.execute(
+                    sql.SQL(
+                        """INSERT INTO units ({columns})
+                            SELECT {columns} FROM staging_units
+                            ON CONFLICT DO NOTHING"""
+                    ).format(columns=column_list)
+                )
+                loaded += cur.rowcount
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            finally:
+                cur.close()
+        return loaded
+
+    def bulk_load(
+        self,
+        properties: list,
+        units,
+        property_batch_size: int = 5000,
+        unit_batch_size: int = 50000,
+    ):
+        """Loads a run's properties, then its units, with COPY and set-based merges
+
+        Args:
+            properties (list): Parsed property dicts or PropertyRecords
+            units (UnitStore): Units of the properties
+
+        Returns:
+            tuple: Number of properties and of units loaded
+        """
+        loaded_properties = self.copy_properties(properties, property_batch_size)
+        loaded_units = self.copy_units(units.property_units(), unit_batch_size)
+        return loaded_properties, loaded_units
+
+    def load_snapshot(self, city_name: str):
+        """Returns the last stored state of a city, for the change capture mode
+
+        Returns:
+            tuple: {(property_name, zipcode): (property_url, fingerprint)} of the
+                    city's properties, and {(property_name, zipcode, unit_key):
+                    fingerprint} of its listed units, where unit_key is
+                    (unit_label, beds, baths, sqft)
+        """
+        cur = self.conn.cursor()
+        cur.execute(
+            """SELECT property_name, zipcode, property_url, fingerprint
+                FROM properties
+                WHERE city_name = %s""",
+            (city_name,),
+        )
+        properties = {
+            (property_name, zipcode): (property_url, fingerprint)
+            for property_name, zipcode, property_url, fingerprint in cur
+        }
+        cur.execute(
+            """SELECT p.property_name, p.zipcode, e.unit_label, e.beds, e.baths,
+                    e.sqft, e.fingerprint
+                FROM (SELECT DISTINCT ON (property_id, unit_label, beds, baths, sqft) *
+                      FROM unit_events
+                      ORDER BY property_id, unit_label, beds, baths, sqft,
+                        event_id DESC) e
+                JOIN properties p USING (property_id)
+                WHERE p.city_name = %s AND e.event_type <> 'delist'""",
+            (city_name,),
+        )
+        units = {
+            (property_name, zipcode, tuple(unit_key)): fingerprint
+            for property_name, zipcode, *unit_key, fingerprint in cur
+        }
+        self.conn.commit()
+        cur.close()
+        return properties, units
+
+    def write_unit_events(self, events: list):
+        """Inserts unit events, given as UnitEvents, in one statement
+
+        The transaction is rolled back and the error raised if it fails.
+
+        Returns:
+            int: Number of events inserted
+        """
+        rows = []
+        for event in events:
+            property_id = self.get_property_id(event.property_name, event.zipcode)
+            if property_id is None:
+                print(f"Error: no property_id for property: {event.property_name}")
+                continue
+            rows.append((property_id, event.event_type) + event.values())
+        if not rows:
+            return 0
+
+        columns = ("property_id", "event_type") + UNIT_ROW_COLUMNS + ("fingerprint",)
+        query = sql.SQL("INSERT INTO unit_events ({columns}) VALUES %s").format(
+            columns=sql.SQL(", ").join(map(sql.Identifier, columns))
+        )
+        cur = self.conn.cursor()
+        try:
+            extras.execute_values(cur, query, rows, page_size=1000)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cur.close()
+        return len(rows)
+
     def close_connection(self):
         self.conn.commit()
-        self.conn.close()
+        if self.pool is None:
+            self.conn.close()
+        else:
+            self.pool.putconn(self.conn)
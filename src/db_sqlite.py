@@ -1,6 +1,9 @@
 import sqlite3
+from datetime import date
 from sqlite3 import Error, IntegrityError
 
+from .records import UNIT_ROW_COLUMNS, as_row, batched
+
 
 def create_connection(database):
     """Creates a connection to the specified database"""
@@ -22,6 +25,7 @@ def create_tables(conn):
                         property_name NOT NULL,
                         city_name NOT NULL,
                         fitness_center INTEGER,
+                        business_center INTEGER,
                         air_conditioning INTEGER,
                         in_unit_washer_dryer INTEGER,
                         dishwasher INTEGER,
@@ -43,6 +47,7 @@ def create_tables(conn):
                         unique_features TEXT,
                         property_url TEXT,
                         year_built INT,
+                        fingerprint INTEGER,
                         UNIQUE(property_name, zipcode)
                         ); """
 
@@ -60,45 +65,354 @@ def create_tables(conn):
                         UNIQUE(property_id, unit_label, beds, baths, sqft, date_scraped)
                         ); """
 
+    # Inserts, changes and delistings of units, written by the change capture mode
+    query_events = """CREATE TABLE IF NOT EXISTS unit_events (
+                        event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        property_id INTEGER NOT NULL,
+                        event_type TEXT NOT NULL
+                            CHECK (event_type IN ('insert', 'change', 'delist')),
+                        unit_label TEXT,
+                        rent INTEGER,
+                        beds INTEGER,
+                        baths REAL,
+                        sqft REAL,
+                        date_available TEXT,
+                        date_scraped TEXT NOT NULL,
+                        fingerprint INTEGER,
+                        FOREIGN KEY(property_id) REFERENCES properties(property_id)
+                        ); """
+
+    query_events_index = """CREATE INDEX IF NOT EXISTS unit_events_unit_idx
+                        ON unit_events
+                        (property_id, unit_label, beds, baths, sqft, event_id)"""
+
     try:
         c = conn.cursor()
         c.execute(query_property)
         c.execute(query_apartments)
+        c.execute(query_events)
+        c.execute(query_events_index)
     except Error as e:
         print(e)
 
 
 def insert_data(conn, data: dict, table_name: str):
-    """Creates a SQL query to insert the dictionary data into the database"""
+    """Inserts a row of dictionary data into the database and commits it
+
+    The data can also be a PropertyRecord or UnitRecord.
+    """
+    data = {column: sqlite_value(value) for column, value in as_row(data).items()}
+    columns = ", ".join(f'"{column}"' for column in data)
+    placeholders = ", ".join("?" for _ in data)
     try:
         c = conn.cursor()
-        query = f"INSERT INTO {table_name} {str(tuple(data.keys()))} VALUES {str(tuple(data.values()))};"
-        c.execute(query)
+        query = f'INSERT INTO "{table_name}" ({columns}) VALUES ({placeholders});'
+        c.execute(query, list(data.values()))
         conn.commit()
     except IntegrityError as e:
         pass
 
 
 def update_data(conn, data: dict):
-    """Creates a SQL query to update the property data in the database"""
+    """Updates the property data in the database"""
     c = conn.cursor()
-    query = f"""UPDATE properties 
-                SET dishwasher="{data['dishwasher']}", year_built="{data['year_built']}", property_url="{data['property_url']}"
-                WHERE property_name="{data['property_name']}"
-                AND zipcode="{data['zipcode']}";"""
-    c.execute(query)
+    query = """UPDATE properties
+                SET dishwasher=?, year_built=?, property_url=?
+                WHERE property_name=?
+                AND zipcode=?;"""
+    c.execute(
+        query,
+        (
+            data["dishwasher"],
+            data["year_built"],
+            data["property_url"],
+            data["property_name"],
+            data["zipcode"],
+        ),
+    )
     conn.commit()
 
 
 def get_property_id(conn, property_name: str, zipcode: str):
     """Returns the property_id for the specified property"""
     c = conn.cursor()
-    query = f"""SELECT p.property_id
+    query = """SELECT p.property_id
                 FROM properties p
-                WHERE property_name="{property_name}"
-                AND zipcode="{zipcode}";"""
+                WHERE property_name=?
+                AND zipcode=?;"""
 
     # fetchall returns a list containing a single tuple
-    property_id = c.execute(query).fetchall()[0][0]
+    property_id = c.execute(query, (property_name, zipcode)).fetchall()[0][0]
     return property_id
 
+
+def sqlite_value(value):
+    """Returns a value as stored by SQLite, dates as YYYY-MM-DD text"""
+    return value.isoformat() if isinstance(value, date) else value
+
+
+class dbSQLite:
+    """A SQLite database with the same interface as dbPostgres, for local and edge runs
+
+    Rows are written with executemany and bound parameters, one transaction
+    per batch, and upserted with INSERT ... ON CONFLICT. The database runs in
+    WAL mode with synchronous=NORMAL, so a commit doesn't wait for a sync of
+    the whole file.
+
+    Methods:
+        insert_properties: Upsert properties and cache their ids
+        insert_units: Insert the units of one property
+        insert_unit_store: Insert every unit of a UnitStore
+        copy_properties: Upsert properties in batches
+        copy_units: Insert the units of many properties in batches
+        bulk_load: Load a run's properties and units in large batches
+        load_snapshot: The stored fingerprints of a city, for the change capture mode
+        write_unit_events: Insert unit events
+        close_connection: Commit and close the connection
+    """
+
+    def __init__(self, database: str, cache_size_mb: int = 64):
+        """Connects to the database, sets its pragmas and creates the tables if needed
+
+        Args:
+            database (str): Path of the database file
+            cache_size_mb (int, optional): Size of the page cache
+        """
+        self.database = database
+        self.conn = create_connection(database)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"PRAGMA cache_size=-{int(cache_size_mb) * 1024}")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+
+        # property_id of each (property_name, zipcode), cached for the run
+        self.property_ids = {}
+        self.setup_schema()
+
+    def setup_schema(self):
+        """Creates the tables if they don't exist, migrates them and preloads the ids"""
+        create_tables(self.conn)
+        self.migrate()
+        self.load_property_ids()
+
+    def migrate(self):
+        """Adds the columns missing from databases created by older versions"""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(properties)")}
+        if "business_center" not in columns:
+            self.conn.execute(
+                "ALTER TABLE properties ADD COLUMN business_center INTEGER"
+            )
+        if "fingerprint" not in columns:
+            self.conn.execute("ALTER TABLE properties ADD COLUMN fingerprint INTEGER")
+        self.conn.commit()
+
+    def load_property_ids(self):
+        """Caches the property_id of every stored property, with a single query"""
+        for property_name, zipcode, property_id in self.conn.execute(
+            "SELECT property_name, zipcode, property_id FROM properties"
+        ):
+            self.property_ids[(property_name, zipcode)] = property_id
+
+    def lookup_property_ids(self, keys: list):
+        """Caches the ids of many (property_name, zipcode), a few hundred per query"""
+        keys = list(dict.fromkeys(keys))
+        for batch in batched(keys, 400):
+            rows = ", ".join("(?, ?)" for _ in batch)
+            query = f"""SELECT property_name, zipcode, property_id
+                        FROM properties
+                        WHERE (property_name, zipcode) IN (VALUES {rows})"""
+            parameters = [value for key in batch for value in key]
+            for property_name, zipcode, property_id in self.conn.execute(
+                query, parameters
+            ):
+                self.property_ids[(property_name, zipcode)] = property_id
+
+    def get_property_id(self, property_name: str, zipcode: str):
+        """Returns the property_id of a property, None if it isn't stored"""
+        key = (property_name, zipcode)
+        if key not in self.property_ids:
+            self.lookup_property_ids([key])
+        return self.property_ids.get(key)
+
+    def insert_properties(self, data: list):
+        """Upserts properties, as parsed dicts or PropertyRecords, in one transaction
+
+        Every column of a stored property is updated to the new values. The
+        transaction is rolled back and the error raised if the batch fails.
+        """
+        data = [as_row(property_data) for property_data in data]
+        if not data:
+            return
+        columns = list(data[0].keys())
+        updated = [c for c in columns if c not in ("property_name", "zipcode")]
+        query = f"""INSERT INTO properties ({', '.join(columns)})
+                    VALUES ({', '.join('?' for _ in columns)})
+                    ON CONFLICT(property_name, zipcode)
+                    DO
+                        UPDATE SET {', '.join(f'{c}=excluded.{c}' for c in updated)}"""
+        with self.conn:
+            self.conn.executemany(
+                query,
+                ([sqlite_value(row[column]) for column in columns] for row in data),
+            )
+        self.lookup_property_ids(
+            [(row["property_name"], row["zipcode"]) for row in data]
+        )
+
+    def insert_units(self, data: list, property_name: str, zipcode: str):
+        """Inserts the units of a property, given as parsed dicts or UnitRecords
+
+        Units already stored are skipped.
+        """
+        self.insert_unit_rows(self.unit_rows([(property_name, zipcode, data)]))
+
+    def insert_unit_store(self, store):
+        """Inserts every unit of a UnitStore"""
+        self.insert_unit_rows(self.unit_rows(store.property_units()))
+
+    def unit_rows(self, property_units):
+        """Yields the unit rows of (property_name, zipcode, units), with property ids"""
+        for property_name, zipcode, units in property_units:
+            property_id = self.get_property_id(property_name, zipcode)
+            if property_id is None:
+                print(f"Error: no property_id for property: {property_name}")
+                continue
+            for unit in map(as_row, units):
+                yield [property_id] + [
+                    sqlite_value(unit[column]) for column in UNIT_ROW_COLUMNS
+                ]
+
+    def insert_unit_rows(self, rows, batch_size: int = 50000):
+        """Inserts unit rows, one transaction per batch
+
+        A failing batch is rolled back and its error raised.
+
+        Returns:
+            int: Number of units inserted
+        """
+        query = f"""INSERT INTO units (property_id, {', '.join(UNIT_ROW_COLUMNS)})
+                    VALUES ({', '.join('?' for _ in range(len(UNIT_ROW_COLUMNS) + 1))})
+                    ON CONFLICT DO NOTHING"""
+        loaded = 0
+        for batch in batched(rows, batch_size):
+            with self.conn:
+                loaded += self.conn.executemany(query, batch).rowcount
+        return loaded
+
+    def copy_properties(self, data: list, batch_size: int = 5000):
+        """Upserts properties in batches, like dbPostgres.copy_properties
+
+        Returns:
+            int: Number of properties inserted or updated
+        """
+        loaded = 0
+        for batch in batched(data, batch_size):
+            self.insert_properties(batch)
+            loaded += len(batch)
+        return loaded
+
+    def copy_units(self, property_units, batch_size: int = 50000):
+        """Inserts units in batches, like dbPostgres.copy_units
+
+        Args:
+            property_units (iterable): (property_name, zipcode, units) of each property,
+                                    as yielded by UnitStore.property_units
+            batch_size (int, optional): Number of units inserted per transaction
+
+        Returns:
+            int: Number of units inserted
+        """
+        return self.insert_unit_rows(self.unit_rows(property_units), batch_size)
+
+    def bulk_load(
+        self,
+        properties: list,
+        units,
+        property_batch_size: int = 5000,
+        unit_batch_size: int = 50000,
+    ):
+        """Loads a run's properties, then its units, in large transactions
+
+        Args:
+            properties (list): Parsed property dicts or PropertyRecords
+            units (UnitStore): Units of the properties
+
+        Returns:
+            tuple: Number of properties and of units loaded
+        """
+        loaded_properties = self.copy_properties(properties, property_batch_size)
+        loaded_units = self.copy_units(units.property_units(), unit_batch_size)
+        return loaded_properties, loaded_units
+
+    def load_snapshot(self, city_name: str):
+        """Returns the last stored state of a city, like dbPostgres.load_snapshot
+
+        Returns:
+            tuple: {(property_name, zipcode): (property_url, fingerprint)} of the
+                    city's properties, and {(property_name, zipcode, unit_key):
+                    fingerprint} of its listed units, where unit_key is
+                    (unit_label, beds, baths, sqft)
+        """
+        properties = {
+            (property_name, zipcode): (property_url, fingerprint)
+            for property_name, zipcode, property_url, fingerprint in self.conn.execute(
+                """SELECT property_name, zipcode, property_url, fingerprint
+                    FROM properties
+                    WHERE city_name = ?""",
+                (city_name,),
+            )
+        }
+        # The last event of each unit, delisted units excluded
+        rows = self.conn.execute(
+            """SELECT p.property_name, p.zipcode, e.unit_label, e.beds, e.baths, e.sqft,
+                    e.fingerprint
+                FROM unit_events e
+                JOIN properties p USING (property_id)
+                WHERE p.city_name = ?
+                AND e.event_id = (
+                    SELECT max(last.event_id)
+                    FROM unit_events last
+                    WHERE last.property_id = e.property_id
+                    AND last.unit_label IS e.unit_label
+                    AND last.beds IS e.beds
+                    AND last.baths IS e.baths
+                    AND last.sqft IS e.sqft)
+                AND e.event_type <> 'delist'""",
+            (city_name,),
+        )
+        units = {
+            (property_name, zipcode, tuple(unit_key)): fingerprint
+            for property_name, zipcode, *unit_key, fingerprint in rows
+        }
+        return properties, units
+
+    def write_unit_events(self, events: list):
+        """Inserts unit events, given as UnitEvents, in one transaction
+
+        The transaction is rolled back and the error raised if it fails.
+
+        Returns:
+            int: Number of events inserted
+        """
+        rows = []
+        for event in events:
+            property_id = self.get_property_id(event.property_name, event.zipcode)
+            if property_id is None:
+                print(f"Error: no property_id for property: {event.property_name}")
+                continue
+            values = [sqlite_value(v) for v in event.values()]
+            rows.append([property_id, event.event_type] + values)
+        if not rows:
+            return 0
+
+        columns = ("property_id", "event_type") + UNIT_ROW_COLUMNS + ("fingerprint",)
+        query = f"""INSERT INTO unit_events ({', '.join(columns)})
+                    VALUES ({', '.join('?' for _ in columns)})"""
+        with self.conn:
+            self.conn.executemany(query, rows)
+        return len(rows)
+
+    def close_connection(self):
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,216 @@
+import asyncio
+import queue
+import threading
+from urllib.parse import urlsplit
+
+from .rate_limiter import AdaptiveRateLimiter
+from .response_cache import ResponseCache
+from .scraper import build_soup, random_headers
+from .session import ScraperSession
+
+
+class AsyncFetcher:
+    """Concurrent fetch engine for Apartments.com pages
+
+    An asyncio event loop runs on a background thread so the synchronous
+    pipeline methods can hand over a batch of URLs and consume the
+    (soup, status_code) results as soon as each request finishes.
+
+    Methods:
+        fetch: Fetch a single URL and wait for the result
+        fetch_many: Fetch many URLs concurrently, yielding results as they finish
+        close: Close the HTTP session and stop the event loop
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 16,
+        max_per_host: int = 8,
+        timeout: int = 15,
+        session: ScraperSession = None,
+        rate_limiter: AdaptiveRateLimiter = None,
+        cache: ResponseCache = None,
+        replay: bool = False,
+    ):
+        """Constructs the fetch engine
+
+        Args:
+            max_in_flight (int, optional): Max number of requests in flight at once.
+            max_per_host (int, optional): Max number of concurrent requests per host.
+            timeout (int, optional): Max timeout setting for each request.
+            session (ScraperSession, optional): Pooled HTTP session. One sized to
+                                    the concurrency limits is created if not provided.
+            rate_limiter (AdaptiveRateLimiter, optional): Request rate control shared by
+                                    every request made through this fetcher.
+            cache (ResponseCache, optional): On-disk cache of raw responses. Cached
+                                    responses are served without a request.
+            replay (bool, optional): Serve responses only from the cache, ignoring its
+                                    TTL, and never touch the network.
+        """
+        if replay and cache is None:
+            raise ValueError("Replay mode requires a response cache")
+
+        self.max_in_flight = max_in_flight
+        self.max_per_host = max_per_host
+        if session is None:
+            session = ScraperSession(
+                pool_size=max_in_flight,
+                pool_size_per_host=max_per_host,
+                timeout=timeout,
+            )
+        self.session = session
+        self.rate_limiter = (
+            AdaptiveRateLimiter() if rate_limiter is None else rate_limiter
+        )
+        self.cache = cache
+        self.replay = replay
+
+        self._loop = None
+        self._thread = None
+        self._in_flight = None
+        self._host_limits = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _ensure_loop(self):
+        """Starts the background event loop on first use"""
+        if self._loop is not None:
+            return self._loop
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="AsyncFetcher", daemon=True
+        )
+        self._thread.start()
+        return self._loop
+
+    def _host_limit(self, url: str):
+        """Returns the semaphore capping concurrent requests to the URL's host"""
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_limits[host]
+
+    async def fetch_async(self, url: str):
+        """Requests a URL on the event loop
+
+        Returns:
+            bytes: Raw response body. None is returned if the request failed.
+            int: Status code from the request.
+        """
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, url, self.replay)
+            if cached is not None:
+                return cached[0], cached[1]
+            if self.replay:
+                return None, 404
+
+        if self._in_flight is None:
+            self._in_flight = asyncio.Semaphore(self.max_in_flight)
+
+        # The token is taken before a slot, so a throttled host's waits don't
+        # hold slots the requests to other hosts could use
+        await self.rate_limiter.acquire(url)
+        async with self._in_flight, self._host_limit(url):
+            try:
+                content, status_code = await self.session.get(url, random_headers())
+            except Exception as e:
+                print(f"An error occured, {e}, while trying to access the URL: {url}")
+                self.rate_limiter.record(url, None)
+                return None, 404
+            self.rate_limiter.record(url, status_code)
+
+        if status_code == 403:
+            print(f"A status code of {status_code} occured at the URL: {url}")
+
+        # Redirects are cached too since they mark the end of a search page range
+        if self.cache is not None and status_code < 400:
+            await asyncio.to_thread(self.cache.put, url, content, status_code)
+
+        return content, status_code
+
+    def fetch(self, url: str):
+        """Fetches a single URL with the same contract as make_request
+
+        Returns:
+            BeautifulSoup: Parsed HTML. None is returned if status code is not 200.
+            int: Status code from the request.
+        """
+        loop = self._ensure_loop()
+        content, status_code = asyncio.run_coroutine_threadsafe(
+            self.fetch_async(url), loop
+        ).result()
+        return build_soup(content, status_code), status_code
+
+    def fetch_many(self, urls, raw: bool = False, parse_only=None):
+        """Fetches the URLs concurrently and yields each result as it finishes
+
+        Only a bounded window of URLs is submitted at a time, so a slow
+        consumer holds back the fetching instead of buffering every page.
+
+        Args:
+            urls (iterable): URLs to request
+            raw (bool, optional): Yield the raw response body instead of parsed HTML,
+                                    leaving the parsing to the consumer.
+            parse_only (SoupStrainer, optional): Only build the HTML tree for the
+                                    matching regions.
+
+        Yields:
+            str: The requested URL
+            BeautifulSoup: Parsed HTML. None is returned if status code is not 200.
+            int: Status code from the request.
+        """
+        loop = self._ensure_loop()
+        window = 2 * self.max_in_flight
+        finished = queue.Queue()
+        pending = 0
+        urls = iter(urls)
+
+        def submit(url):
+            future = asyncio.run_coroutine_threadsafe(self.fetch_async(url), loop)
+            future.add_done_callback(lambda f: finished.put((url, f)))
+
+        for url in urls:
+            submit(url)
+            pending += 1
+            if pending >= window:
+                break
+
+        while pending:
+            url, future = finished.get()
+            pending -= 1
+            content, status_code = future.result()
+
+            # Keep the window full before handing the result to the consumer
+            next_url = next(urls, None)
+            if next_url is not None:
+                submit(next_url)
+                pending += 1
+
+            if raw:
+                yield url, content, status_code
+            else:
+                yield url, build_soup(content, status_code, parse_only), status_code
+
+    def stats(self):
+        """Returns the session counters, the rate limiter state and cache hits"""
+        stats = self.session.stats() | {"rate_limits": self.rate_limiter.stats()}
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
+
+    def close(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.session.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+        self._thread = None
+        self._in_flight = None
+        self._host_limits = {}
@@ -1,6 +1,19 @@
-from datetime import datetime
+from collections import Counter, OrderedDict
+from datetime import date, datetime
 import re
 
+import numpy as np
+import pandas as pd
+
+# Characters kept from rents and areas, digits and the en dash of ranges
+AMOUNT_CHARACTERS = re.compile("[^0-9–]")
+NON_DIGITS = re.compile(r"\D")
+BATH_CHARACTERS = re.compile("[^0-9.]")
+PERIODS = re.compile("[.]")
+
+# Amounts with more digits than this may not fit in an int64
+MAX_INT64_DIGITS = 18
+
 
 def clean_unit_information(func):
     """
@@ -9,13 +22,20 @@ def clean_unit_information(func):
 
     def wrapper(self, *args, **kwargs):
         unit_information = func(self, *args, **kwargs)
+        # Parsers given the run's date normalizer share its clock and cache
+        dates = getattr(self, "dates", None)
         unit_information["rent"] = format_rent(unit_information["rent"])
         unit_information["beds"] = format_beds(unit_information["beds"])
         unit_information["baths"] = format_baths(unit_information["baths"])
         unit_information["sqft"] = format_sqft(unit_information["sqft"])
-        unit_information["date_available"] = format_date_available(
-            unit_information["date_available"]
-        )
+        if dates is not None:
+            unit_information["date_available"] = dates.normalize(
+                unit_information["date_available"]
+            )
+        else:
+            unit_information["date_available"] = format_date_available(
+                unit_information["date_available"]
+            )
         return unit_information
 
     return wrapper
@@ -23,7 +43,7 @@ def clean_unit_information(func):
 
 def format_rent(rent):
     try:
-        rent = re.sub("[^0-9–]", "", rent)
+        rent = AMOUNT_CHARACTERS.sub("", rent)
 
         # Certain listing use a range for the posted rent
         if "–" in rent:
@@ -39,7 +59,7 @@ def format_rent(rent):
 def format_beds(beds):
     try:
         beds = beds.replace("Studio", "0")
-        beds = re.sub("\D", "", beds)
+        beds = NON_DIGITS.sub("", beds)
         return beds
     except:
         return beds
@@ -47,14 +67,14 @@ def format_beds(beds):
 
 def format_baths(baths):
     try:
-        return re.sub("[^0-9.]", "", baths)
+        return BATH_CHARACTERS.sub("", baths)
     except:
         return baths
 
 
 def format_sqft(sqft):
     try:
-        sqft = re.sub("[^0-9–]", "", sqft)
+        sqft = AMOUNT_CHARACTERS.sub("", sqft)
 
         # Certain listing use a range for the posted sqft
         if "–" in sqft:
@@ -79,9 +99,249 @@ def format_date_available(date_available):
         else:
             current_year = datetime.now().year
             clean_date = (
-                re.sub("[.]", "", date_available.split(",")[0]) + f", {current_year}"
+                PERIODS.sub("", date_available.split(",")[0]) + f", {current_year}"
             )
             date = datetime.strptime(clean_date, "%b %d, %Y")
             return date.strftime("%Y-%m-%d")
     except:
         return date_available
+
+
+class DateNormalizer:
+    """Formats availability dates against a clock fixed for a whole run
+
+    Works like format_date_available, except that "today" is read once when
+    the normalizer is created, so every unit of a run is dated the same even
+    if the run goes past midnight. A date that would fall long before today
+    is taken to be in the next year, e.g. "Jan 5" scraped in December.
+
+    Listings repeat the same few strings, so formatted dates are kept in a
+    bounded LRU cache.
+
+    Methods:
+        normalize: Format a raw availability date
+        stats: Cache hits and misses, and the run's date
+    """
+
+    def __init__(
+        self, today: date = None, max_size: int = 1024, rollover_days: int = 180
+    ):
+        """Fixes the run's clock
+
+        Args:
+            today (date, optional): Date of the run. Defaults to today.
+            max_size (int, optional): Max number of formatted dates kept in the cache.
+            rollover_days (int, optional): Dates further in the past than this many
+                                    days are moved to the next year.
+        """
+        self.today = today or date.today()
+        self.today_string = self.today.strftime("%Y-%m-%d")
+        self.max_size = max_size
+        self.rollover_days = rollover_days
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def parse(self, date_available: str):
+        date_available = (
+            date_available.replace(r"Available Now", "Now")
+            .replace(r"Available Soon", "Now")
+            .replace("Soon", "Now")
+        )
+        if date_available == "Now":
+            return self.today_string
+
+        clean_date = PERIODS.sub("", date_available.split(",")[0])
+        for year in [self.today.year, self.today.year + 1]:
+            try:
+                parsed = datetime.strptime(f"{clean_date}, {year}", "%b %d, %Y").date()
+            except ValueError:
+                # Feb 29 only parses in a leap year
+                continue
+            if (self.today - parsed).days > self.rollover_days:
+                try:
+                    parsed = parsed.replace(year=year + 1)
+                except ValueError:
+                    pass
+            return parsed.strftime("%Y-%m-%d")
+        return date_available
+
+    def normalize(self, date_available: str):
+        """Formats a raw availability date as YYYY-MM-DD, returning other text as is"""
+        if date_available in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(date_available)
+            return self.cache[date_available]
+
+        self.misses += 1
+        formatted = self.parse(date_available)
+        self.cache[date_available] = formatted
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+        return formatted
+
+    def take_counts(self):
+        """Returns the hit and miss counts, and resets them"""
+        counts = Counter(hits=self.hits, misses=self.misses)
+        self.hits = 0
+        self.misses = 0
+        return counts
+
+    def add_counts(self, counts: Counter):
+        """Adds counts returned by take_counts, e.g. from a worker process"""
+        self.hits += counts["hits"]
+        self.misses += counts["misses"]
+
+    def stats(self):
+        return {
+            "today": self.today_string,
+            "hits": self.hits,
+            "misses": self.misses,
+            "cached": len(self.cache),
+        }
+
+
+# Batch versions of the formatting functions above. They take every raw
+# value of a column at once, a page or a whole city of units, and give the
+# same results as calling the scalar function on each value. Scraped values
+# repeat a lot, so the string operations run once per distinct value and
+# the results are spread back over the column. Missing values come back as
+# None.
+
+
+def by_distinct_value(format_distinct):
+    """Turns a function formatting a Series of distinct values into a batch function"""
+
+    def batch_function(values, **kwargs):
+        series = pd.Series(values, dtype=object)
+        codes, uniques = pd.factorize(series)
+        formatted = format_distinct(pd.Series(uniques, dtype=object), **kwargs)
+        formatted = formatted.tolist()
+        # Missing values have the code -1, which picks the None at the end
+        formatted = np.array(formatted + [None], dtype=object)
+        return pd.Series(formatted[codes], index=series.index, dtype=object)
+
+    batch_function.__doc__ = format_distinct.__doc__
+    return batch_function
+
+
+def _strings(series):
+    """Returns a mask of the values of a Series that are strings"""
+    return np.fromiter(
+        (isinstance(value, str) for value in series), dtype=bool, count=len(series)
+    )
+
+
+def _format_amounts(series, scalar_function):
+    """Batch format_rent and format_sqft: the amount, or the mean of a range"""
+    is_string = _strings(series)
+    result = series.copy()
+    if not is_string.any():
+        return result
+
+    # Cleaned strings are kept as they are when they aren't a number
+    cleaned = series[is_string].str.replace(AMOUNT_CHARACTERS, "", regex=True)
+    result[is_string] = cleaned
+
+    parts = cleaned.str.split("–")
+    low, high = parts.str[0].str.len(), parts.str[-1].str.len()
+    is_range = cleaned.str.contains("–", regex=False)
+    is_number = (low > 0) & (high > 0)
+    # Amounts too long for an int64 take the scalar path
+    fits = (low <= MAX_INT64_DIGITS) & (high <= MAX_INT64_DIGITS)
+
+    single = is_number & fits & ~is_range
+    result[single[single].index] = cleaned[single].astype(np.int64).tolist()
+
+    ranged = is_number & fits & is_range
+    low_values = parts[ranged].str[0].astype(np.int64).to_numpy()
+    high_values = parts[ranged].str[-1].astype(np.int64).to_numpy()
+    result[ranged[ranged].index] = ((low_values + high_values) / 2).tolist()
+
+    too_long = (is_number & ~fits)[lambda mask: mask].index
+    result[too_long] = [scalar_function(value) for value in series[too_long]]
+    return result
+
+
+@by_distinct_value
+def format_rent_batch(rents):
+    """Batch format_rent, for any sequence of raw rents
+
+    Returns:
+        Series: The formatted rents, in the same order
+    """
+    return _format_amounts(rents, format_rent)
+
+
+@by_distinct_value
+def format_sqft_batch(areas):
+    """Batch format_sqft, for any sequence of raw areas"""
+    return _format_amounts(areas, format_sqft)
+
+
+@by_distinct_value
+def format_beds_batch(beds):
+    """Batch format_beds, for any sequence of raw bedroom counts"""
+    is_string = _strings(beds)
+    result = beds.copy()
+    result[is_string] = (
+        beds[is_string]
+        .str.replace("Studio", "0", regex=False)
+        .str.replace(NON_DIGITS, "", regex=True)
+    )
+    return result
+
+
+@by_distinct_value
+def format_baths_batch(baths):
+    """Batch format_baths, for any sequence of raw bathroom counts"""
+    is_string = _strings(baths)
+    result = baths.copy()
+    result[is_string] = baths[is_string].str.replace(BATH_CHARACTERS, "", regex=True)
+    return result
+
+
+@by_distinct_value
+def format_date_available_batch(values, dates: DateNormalizer = None):
+    """Batch format_date_available, for any sequence of raw availability dates
+
+    The run's clock and cache are used if a DateNormalizer is given.
+    """
+    format_date = format_date_available if dates is None else dates.normalize
+    return values.map(
+        lambda value: format_date(value) if isinstance(value, str) else value
+    )
+
+
+# Unit columns and the batch function formatting each of them
+UNIT_FORMATTERS = {
+    "rent": format_rent_batch,
+    "beds": format_beds_batch,
+    "baths": format_baths_batch,
+    "sqft": format_sqft_batch,
+    "date_available": format_date_available_batch,
+}
+
+
+def format_units(units, dates: DateNormalizer = None):
+    """Formats the raw values of many units at once, like clean_unit_information
+
+    Args:
+        units (DataFrame or list): Units with raw rent, beds, baths, sqft and
+                                date_available values, as a DataFrame or a list of
+                                unit dicts
+        dates (DateNormalizer, optional): Clock and cache used for the dates
+
+    Returns:
+        The formatted units, of the same type as given
+    """
+    frame = units if isinstance(units, pd.DataFrame) else pd.DataFrame(units)
+    frame = frame.copy()
+    for column, formatter in UNIT_FORMATTERS.items():
+        if column not in frame:
+            continue
+        kwargs = {"dates": dates} if column == "date_available" else {}
+        frame[column] = formatter(frame[column].astype(object), **kwargs).to_numpy()
+    if isinstance(units, pd.DataFrame):
+        return frame
+    return frame.to_dict("records")
@@ -1,18 +1,32 @@
 from sys import argv
-import numpy as np
-from .scraper import make_request, generate_page_URL
-from .unit_parser import Unit_Parser
-from .property_parser import Property_Parser
-import pickle as pkl
-from datetime import date
+from .fetcher import AsyncFetcher
+from .search_planner import SearchPlanner
+from .checkpoint import Checkpoint
+from .page_parser import PageParser
+from .lxml_parser import LxmlPageParser
+from .property_parser import (
+    DEFAULT_AMENITY_MATCHER,
+    AmenityMatcher,
+    check_amenity_columns,
+)
+from .formatting import DateNormalizer
+from .records import PropertyRecord
+from .unit_store import UnitStore
+from .parse_pool import ParsePool, parse_one
+from .parquet_store import ParquetSink
+
+# Parser backends selectable with the parse_backend argument
+PAGE_PARSERS = {"bs4": PageParser, "lxml": LxmlPageParser}
 
 
 class ApartmentsPipeline:
     """A class for extracting raw HTML from Apartments.com, parsing, and saving to a db
 
     Methods:
-        get_property_urls: Extracts the general information for each listing
-        get_property_urls_details: Extract the listing details for each listing
+        get_property_urls: Plans the search and saves the property URLs as the frontier
+        resume: Restores the frontier and parsed records of an unfinished run
+        scrape_property_urls: Fetches and parses the property pages not fetched yet
+        run: Scrapes the city, resuming from the checkpoint if asked to
     """
 
     def __init__(
@@ -22,16 +36,50 @@ class ApartmentsPipeline:
         start_price: int = 500,
         end_price: int = 750,
         price_step: int = 250,
+        fetcher: AsyncFetcher = None,
+        checkpoint_dir: str = "./data/checkpoints",
+        parse_workers: int = 0,
+        parse_batch_size: int = 8,
+        parse_backend: str = "bs4",
+        amenity_table: dict = None,
+        partial_parse: bool = False,
+        structured_data: bool = True,
+        dates: DateNormalizer = None,
+        export_dir: str = "./data/parquet",
     ):
         """Constructs the attributes to use for web scraping apartments
 
         Args:
             city_name (str): City name to be scraped.
             state_abbv (str): Abbreviated state name to be scraped.
-            db_file (str): Location of db for connection
             start_price (int, optional): Price to begin scraping. Defaults to 500.
-            end_price (int, optional): Price to stop scraping. Defaults to 5000.
-            price_step (int, optional): Sets the min and max price range. Defaults to 500.
+            end_price (int, optional): Price to stop scraping. Defaults to 750.
+            price_step (int, optional): Sets the min and max price range.
+                                    Defaults to 250.
+            fetcher (AsyncFetcher, optional): Fetch engine to share across pipelines.
+                                    A new one is created and closed by run() if not
+                                    provided.
+            checkpoint_dir (str, optional): Directory of the progress checkpoints,
+                                    used to resume runs.
+            parse_workers (int, optional): Number of worker processes parsing property
+                                    pages. Pages are parsed on the calling thread if 0.
+            parse_batch_size (int, optional): Number of pages sent to a parse worker
+                                    at once.
+            parse_backend (str, optional): "bs4" for the BeautifulSoup parsers or "lxml"
+                                    for the faster compiled XPath parsers.
+            amenity_table (dict, optional): Amenities to detect, in the same format as
+                                    HTML_AMENITIES and a subset of it, as only those
+                                    have a database column. Defaults to HTML_AMENITIES.
+            partial_parse (bool, optional): Only build the HTML tree for the regions
+                                    of the search and property pages that are read.
+            structured_data (bool, optional): Read the location and unit details from
+                                    the JSON-LD of property pages, searching the HTML
+                                    only for the missing fields.
+            dates (DateNormalizer, optional): Clock of the run, to share one date
+                                    across several cities. A new one is started if not
+                                    provided.
+            export_dir (str, optional): Directory of the Parquet export of the run's
+                                    properties and units.
         """
 
         self.start_price = int(start_price)
@@ -40,123 +88,172 @@ class ApartmentsPipeline:
         self.city_name = city_name
         self.state_abbv = state_abbv
         self.BASE_URL = f"https://www.apartments.com/{city_name.lower().replace(' ', '-')}-{state_abbv.lower()}/"  # "/price range/page"
-        self.price_range = list(np.arange(start_price, end_price, price_step))
-        self.page_range = list(np.arange(1, 29, 1))
         self.property_urls = []
+        # Whether property_urls is every listing of the search, None if not planned
+        self.search_complete = None
         self.properties = []
-        self.units = {}
+        self.units = UnitStore()
+        self.owns_fetcher = fetcher is None
+        self.fetcher = AsyncFetcher() if fetcher is None else fetcher
+        self.checkpoint = Checkpoint(city_name, checkpoint_dir)
+        if parse_backend not in PAGE_PARSERS:
+            raise ValueError(f"Unknown parse backend: {parse_backend}")
+        amenity_matcher = (
+            DEFAULT_AMENITY_MATCHER
+            if amenity_table is None
+            else AmenityMatcher(amenity_table)
+        )
+        check_amenity_columns(amenity_matcher.columns)
+        self.dates = DateNormalizer() if dates is None else dates
+        self.page_parser = PAGE_PARSERS[parse_backend](
+            city_name,
+            amenity_matcher,
+            partial_parse,
+            structured_data,
+            dates=self.dates,
+        )
+        # Kept properties are exported as they are parsed, and published by run().
+        # A streaming run writes the export as one of its sinks, with a FanOutSink.
+        self.export = ParquetSink(
+            export_dir,
+            city_name,
+            self.dates.today,
+            amenity_columns=amenity_matcher.columns,
+        )
+        self.partial_parse = partial_parse
+        self.parse_workers = parse_workers
+        self.parse_batch_size = parse_batch_size
 
     def get_property_urls(self):
 
-        # Loop through all price ranges
-        for min_price in self.price_range:
-
-            for page_num in self.page_range:
-                url = generate_page_URL(
-                    self.BASE_URL, min_price, min_price + self.price_step, page_num
-                )
-                soup, res_status = make_request(url)
-                # If URL was redirected then end of page range was reached
-                if res_status == 301:
-                    break
-                # If soup is None, skip iteration
-                if soup == None:
-                    continue
-
-                listings = soup.find_all("li", {"class": "mortar-wrapper"})
-                for listing in listings:
-                    url = listing.find("a", {"class": "property-link"})["href"]
-                    self.property_urls.append(url)
-
-        # Remove any duplicate property URLs
-        self.property_urls = list(set(self.property_urls))
+        planner = SearchPlanner(
+            self.fetcher,
+            self.BASE_URL,
+            self.start_price,
+            self.end_price,
+            self.price_step,
+            partial=self.partial_parse,
+        )
+        self.property_urls = planner.plan()
+        self.search_complete = not (planner.failed_requests or planner.truncated_bands)
+        print(
+            f"{planner.search_requests} search pages requested across "
+            f"{len(planner.bands)} price ranges"
+        )
+        self.checkpoint.save_frontier(self.property_urls)
 
-    def scrape_property_urls(self):
+    def resume(self):
+        """Restores the URL frontier and parsed records of the last unfinished run
 
-        for url in self.property_urls:
-            soup, res_status = make_request(url)
-            # If soup is None, skip iteration
-            if soup == None:
-                continue
-            try:
-                property_name = (
-                    soup.find("h1", {"class": "propertyName"})
-                    .get_text(strip=True)
-                    .replace("'", "")
-                )
-
-                # Extract all property details
-                self.properties.append(
-                    self.parse_property(soup, property_name, self.city_name, url)
-                )
-                # Find all of the current unit listings
-                self.units[property_name] = {
-                    "units": self.parse_units(soup),
-                    "zipcode": self.properties[-1]["zipcode"],
-                }
-
-            except Exception as e:
-                print(f"The exception, {e}, occurred at the following URL: {url}")
-                continue
+        Returns:
+            bool: False if there was no checkpoint to resume from
+        """
+        if not self.checkpoint.load():
+            return False
 
-    def parse_property(self, soup, property_name, city_name, url):
-        property_data = Property_Parser(property_name, url).parse_property_page(soup)
+        self.property_urls = self.checkpoint.frontier
+        for record in self.checkpoint.records:
+            self.keep(record["property"], record["units"])
+        return True
 
-        property_data["city_name"] = city_name
+    def scrape_property_urls(self):
 
-        return property_data
+        # Pages finished before a resume are not requested again
+        remaining_urls = [
+            url for url in self.property_urls if url not in self.checkpoint.fetched
+        ]
+        pages = (
+            (url, content)
+            for url, content, res_status in self.fetcher.fetch_many(
+                remaining_urls, raw=True
+            )
+            # Skip pages that could not be fetched
+            if res_status == 200 and content is not None
+        )
+        for url, property_data, units, error in self.parse_pages(pages):
+            if error is not None:
+                print(f"The exception, {error}, occurred at the following URL: {url}")
+                self.checkpoint.mark_fetched(url)
+                continue
 
-    def parse_units(self, soup):
+            self.keep(property_data, units)
+            self.checkpoint.record(url, property_data, units)
 
-        raw_units = self.get_all_units(soup)
-
-        # Extract each unit from the listing
-        units = []
-        for unit in raw_units:
-            current_unit = Unit_Parser().parse_unit(unit)
-            if current_unit["date_available"] != "Not Available":
-                units.append(current_unit)
-            else:
-                pass
-        return units
-
-    @staticmethod
-    def get_all_units(soup):
-        """Grab all units from a listing URl"""
-
-        # Normal HTML layout for units
-        units_html_1 = soup.find("div", {"data-tab-content-id": "all"}).find_all(
-            "li", {"class": "unitContainer js-unitContainer"}
-        )
+        self.checkpoint.close()
 
-        # Alternate HTML layout for units
-        units_html_2 = soup.find("div", {"data-tab-content-id": "all"}).find_all(
-            "div", {"class": "pricingGridItem multiFamily"},
+    def keep(self, property_data: dict, units: dict):
+        """Keeps a parsed property for the rest of the run as a compact record,
+        adds its units to the run's unit store and exports both"""
+        record = PropertyRecord.from_dict(
+            property_data, self.page_parser.amenity_matcher.columns
         )
-        units_html_3 = soup.find_all(
-            "div", {"class": "priceGridModelWrapper js-unitContainer mortar-wrapper"},
+        self.properties.append(record)
+        self.units.add_property(
+            property_data["property_name"], units["zipcode"], units["units"]
         )
-        if len(units_html_1) != 0:
-            return units_html_1
-        elif len(units_html_2) != 0:
-            return units_html_2
+        self.export.write_properties([record])
+        self.export.write_units(
+            [(record.property_name, units["zipcode"], units["units"])]
+        )
+
+    def parse_pages(self, pages):
+        """Parses raw property pages, on worker processes if parse_workers is set
+
+        Args:
+            pages (iterable): (url, content) pairs of raw property pages
+
+        Yields:
+            tuple: (url, property_data, units, error) for every page
+        """
+        if self.parse_workers:
+            pool = ParsePool(
+                self.page_parser, self.parse_workers, self.parse_batch_size
+            )
+            try:
+                yield from pool.parse_pages(pages)
+            finally:
+                pool.close()
         else:
-            return units_html_3
+            for url, content in pages:
+                yield parse_one(self.page_parser, url, content)
+
+    def parse_page(self, soup, url):
+        return self.page_parser.parse_page(soup, url)
 
-    def run(self):
+    def parse_property(self, soup, property_name, city_name, url):
+        return self.page_parser.parse_property(soup, property_name, city_name, url)
+
+    def parse_units(self, soup):
+        return self.page_parser.parse_units(soup)
+
+    def get_all_units(self, soup):
+        return self.page_parser.get_all_units(soup)
+
+    def run(self, resume: bool = False):
         print("Begin scraping...")
-        self.get_property_urls()
+        if resume and self.resume():
+            print(
+                f"Resuming with {len(self.checkpoint.fetched)} property pages "
+                "already fetched"
+            )
+        else:
+            self.get_property_urls()
         print("All property urls extracted")
         print(f"The total number of listings is {len(self.property_urls)}")
         self.scrape_property_urls()
         print("Done extracting properties and units")
+        print(f"Session stats: {self.fetcher.stats()}")
+        print(f"Field sources: {self.page_parser.source_stats()}")
+        print(f"Unit layouts: {dict(self.page_parser.layout_fingerprints)}")
+        print(f"Date cache: {self.dates.stats()}")
+        if self.owns_fetcher:
+            self.fetcher.close()
 
-        # Dump the saved data to have as a backup
-        data_dump = [self.properties, self.units]
-        scrape_date = date.today().strftime("%Y-%m-%d")
-        filename = f"{self.city_name}_{scrape_date}.pkl"
-        with open(f"./data/raw/{filename}", "wb") as file:
-            pkl.dump(data_dump, file)
+        # Publish the Parquet export of the run, read back with read_snapshots
+        self.export.close()
+
+        # The run finished, so there is nothing left to resume
+        self.checkpoint.clear()
 
 
 seattle_counties = ["King County"]
@@ -183,4 +280,3 @@ chicago_counties = ["Chicago"]
 # Boston
 
 # Washington DC
-
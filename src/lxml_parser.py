@@ -0,0 +1,333 @@
+import re
+import threading
+from dataclasses import dataclass
+
+from lxml import etree
+
+from .page_parser import MissingElementError, PageParser
+from .scraper import declared_encoding
+from .unit_layouts import UNIT_ELEMENTS, UNIT_LAYOUTS, UnitLayout
+from .property_parser import Property_Parser
+from .unit_parser import Unit_Parser
+
+
+def has_class(class_name: str):
+    """XPath predicate matching an element the same way as BeautifulSoup's class lookup
+
+    A single class name matches any of the element's classes, while a value
+    with spaces has to match the whole class attribute.
+    """
+    if " " in class_name:
+        return f'normalize-space(@class)="{class_name}"'
+    return f'contains(concat(" ", normalize-space(@class), " "), " {class_name} ")'
+
+
+# Text nodes as collected by BeautifulSoup's get_text, which skips script contents
+_TEXT = etree.XPath(
+    ".//text()[not(parent::script or parent::style or parent::template)]"
+)
+_NO_TEXT_TAGS = {"script", "style", "template"}
+
+_PROPERTY_NAME = etree.XPath(f"//h1[{has_class('propertyName')}]")
+_DESCRIPTION = etree.XPath('//section[@id="descriptionSection"]')
+_PARAGRAPHS = etree.XPath(".//p")
+_UNIQUE_FEATURES = etree.XPath('//div[@id="uniqueFeatures"]')
+_UNIQUE_FEATURE_ITEMS = etree.XPath(f".//li[{has_class('specInfo uniqueAmenity')}]")
+_LATITUDE = etree.XPath('//meta[@property="place:location:latitude"]')
+_LONGITUDE = etree.XPath('//meta[@property="place:location:longitude"]')
+_NEIGHBORHOOD = etree.XPath(f"//a[{has_class('neighborhood')}]")
+_STATE_ZIP = etree.XPath(f"//span[{has_class('stateZipContainer')}]")
+
+_UNITS_TAB = etree.XPath('//div[@data-tab-content-id="all"]')
+# Layouts searched for in the whole page
+_UNITS_LAYOUTS = {
+    layout.name: etree.XPath(f"//{layout.tag}[{has_class(layout.class_name)}]")
+    for layout in UNIT_LAYOUTS
+    if not layout.in_units_tab
+}
+
+
+def first(xpath, element):
+    """Returns the first match of a compiled XPath, or None like BeautifulSoup's find"""
+    matches = xpath(element)
+    return matches[0] if matches else None
+
+
+def get_text(element, strip: bool = False):
+    """Equivalent of BeautifulSoup's get_text for an lxml element"""
+    if element is None:
+        raise MissingElementError("The element to read the text of is missing")
+    if len(element) == 0 and element.tag not in _NO_TEXT_TAGS:
+        # A leaf's only text node, skipping the XPath for most unit fields
+        text = element.text or ""
+        return text.strip() if strip else text
+    if strip:
+        return "".join(text.strip() for text in _TEXT(element) if text.strip())
+    return "".join(_TEXT(element))
+
+
+def next_element(element):
+    """The next element in document order, like BeautifulSoup's find_next()
+
+    Walked by hand because the XPath following axis scans the rest of the document.
+    """
+    for descendant in element.iterdescendants():
+        if isinstance(descendant.tag, str):
+            return descendant
+    while element is not None:
+        sibling = element.getnext()
+        while sibling is not None:
+            if isinstance(sibling.tag, str):
+                return sibling
+            sibling = sibling.getnext()
+        element = element.getparent()
+    return None
+
+
+# Tags of the elements looked up in a unit and of the unit layouts, the other
+# elements can't match and are skipped by lxml itself
+_UNIT_ELEMENT_TAGS = sorted({tag for tag, _ in UNIT_ELEMENTS.values()})
+_LAYOUT_TAGS = sorted({layout.tag for layout in UNIT_LAYOUTS})
+
+
+def tree_elements(node, tags=()):
+    """Yields (element, name, class attribute) for each element inside an lxml node
+
+    Args:
+        node: Element to walk
+        tags (iterable): Only yield elements with these tags, all of them if empty
+    """
+    for element in node.iterdescendants(*tags):
+        if isinstance(element.tag, str):
+            yield element, element.tag, element.get("class")
+
+
+def element_string(element):
+    """Equivalent of BeautifulSoup's .string, the text of an element with one child"""
+    while True:
+        if len(element) == 0:
+            return element.text
+        if element.text or len(element) > 1 or element[0].tail:
+            return None
+        element = element[0]
+        if not isinstance(element.tag, str):
+            # Comments and processing instructions
+            return element.text
+
+
+# lxml parsers can't be shared between threads, so each thread keeps its own
+_parsers = threading.local()
+
+
+def html_parser(encoding: str):
+    """Returns this thread's HTML parser for the encoding, falling back to UTF-8"""
+    parsers = _parsers.__dict__
+    if encoding not in parsers:
+        try:
+            parsers[encoding] = etree.HTMLParser(encoding=encoding)
+        except LookupError:
+            parsers[encoding] = html_parser("utf-8")
+    return parsers[encoding]
+
+
+def tree_strings(root, html_elements: set):
+    """Yields each string of the tree with the elements it is the only text of,
+    like AmenityMatcher.soup_strings does for a BeautifulSoup tree"""
+    for node in root.iter():
+        if len(node) != 0 or not node.text:
+            continue
+        # The text of a comment belongs to its parent
+        elements = [node.tag] if isinstance(node.tag, str) else []
+        child, parent = node, node.getparent()
+        while (
+            parent is not None
+            and not parent.text
+            and len(parent) == 1
+            and not child.tail
+        ):
+            elements.append(parent.tag)
+            child, parent = parent, parent.getparent()
+        if html_elements.intersection(elements):
+            yield node.text, elements
+
+
+def build_tree(content: bytes):
+    """Parses the raw page with the document's declared encoding, UTF-8 otherwise"""
+    # Plain etree elements avoid the element class lookup of lxml.html
+    return etree.fromstring(content, parser=html_parser(declared_encoding(content)))
+
+
+@dataclass
+class Lxml_Property_Parser(Property_Parser):
+    """Property_Parser backed by compiled XPath lookups on an lxml tree"""
+
+    def get_property_description(self, root):
+        section = first(_DESCRIPTION, root)
+        if section is None:
+            raise MissingElementError("The page has no description section")
+        # Extract all of the paragraphs
+        paragraphs = [get_text(p, strip=True) for p in _PARAGRAPHS(section)]
+
+        raw_description = " ".join(paragraphs).replace("\n", "")
+        raw_description = re.sub("[']", "", raw_description)
+        raw_description = re.sub("[:]", "", raw_description)
+        self.description = re.sub('"', "", raw_description)
+
+    def extract_amenities(self, root):
+        """Parse the property HTML and search for various amenities"""
+        matcher = self.amenity_matcher
+        self.amenities.update(matcher.match(tree_strings(root, matcher.html_elements)))
+
+    def extract_unique_features(self, root):
+        """Parse the property HTML and collect a list of the unique features"""
+        container = first(_UNIQUE_FEATURES, root)
+        # Some listings don't have any unique features listed
+        if container is None:
+            self.unique_features = None
+            return
+
+        for feature in _UNIQUE_FEATURE_ITEMS(container):
+            cleaned_feature = re.sub("[']", "", get_text(feature, strip=True))
+            cleaned_feature = re.sub('"', "", cleaned_feature)
+            self.unique_features.append(cleaned_feature)
+
+    def extract_location(self, root):
+        """Parse the property HTML and search for location amenities"""
+
+        latitude = first(_LATITUDE, root)
+        longitude = first(_LONGITUDE, root)
+        if (
+            latitude is None
+            or longitude is None
+            or "content" not in latitude.attrib
+            or "content" not in longitude.attrib
+        ):
+            latitude = None
+            longitude = None
+        else:
+            latitude = latitude.attrib["content"]
+            longitude = longitude.attrib["content"]
+
+        neighborhood = first(_NEIGHBORHOOD, root)
+        state_zip = first(_STATE_ZIP, root)
+        if neighborhood is None or state_zip is None:
+            neighborhood = None
+            zipcode = None
+        else:
+            neighborhood = get_text(neighborhood, strip=True)
+            zipcode = re.sub(r"[\D]", "", get_text(state_zip, strip=True))
+
+        self.location["latitude"] = latitude
+        self.location["longitude"] = longitude
+        self.location["neighborhood"] = neighborhood
+        self.location["zipcode"] = zipcode
+
+    def get_year_built(self, root):
+        pattern = re.compile("Built in")
+        for element in root.iter("div"):
+            string = element_string(element)
+            if string is not None and pattern.search(string):
+                self.year_built = re.sub(r"[\D]", "", get_text(element, strip=True))
+                return
+        self.year_built = None
+
+
+@dataclass
+class Lxml_Unit_Parser(Unit_Parser):
+    """Unit_Parser reading the unit elements of an lxml tree"""
+
+    @staticmethod
+    def iter_elements(unit):
+        return tree_elements(unit, _UNIT_ELEMENT_TAGS)
+
+    @staticmethod
+    def attributes(unit):
+        return unit.attrib
+
+    def detail_spans(self, unit):
+        details = self.element(unit, "details")
+        if details is None:
+            raise MissingElementError("The unit has no details")
+        return list(details.iterdescendants("span"))
+
+    def get_unit_label(self, unit):
+        if "data-unit" in unit.attrib:
+            self.unit_label = unit.attrib["data-unit"]
+        else:
+            self.unit_label = get_text(self.element(unit, "model_name"))
+
+    def get_rent(self, unit):
+        pricing = self.element(unit, "pricing")
+        rent = None
+        if pricing is not None:
+            rent = next_element(pricing)
+            if rent is not None:
+                rent = next_element(rent)
+        if rent is not None:
+            self.rent = get_text(rent, strip=True)
+        else:
+            self.rent = get_text(self.element(unit, "rent_label"))
+
+        if self.rent == "":
+            self.rent = None
+
+    def get_bedrooms(self, unit):
+        if "data-beds" in unit.attrib:
+            self.beds = unit.attrib["data-beds"]
+        else:
+            self.beds = get_text(self.detail_spans(unit)[0])
+
+    def get_bathrooms(self, unit):
+        if "data-beds" in unit.attrib:
+            self.baths = unit.attrib["data-beds"]
+        else:
+            self.baths = get_text(self.detail_spans(unit)[1])
+
+    def get_sqft(self, unit):
+        sqft = self.element(unit, "sqft")
+        if sqft is not None:
+            self.area = get_text(sqft, strip=True).strip("square feet")
+        else:
+            self.area = get_text(self.detail_spans(unit)[2])
+        if self.area == "":
+            self.area = None
+
+    def get_date_available(self, unit):
+        date_available = self.element(unit, "date_available")
+        if date_available is not None:
+            self.date_available = get_text(date_available, strip=True).strip(
+                "availability"
+            )
+        else:
+            self.date_available = get_text(self.element(unit, "availability"))
+
+
+@dataclass
+class LxmlPageParser(PageParser):
+    """PageParser that walks an lxml tree with compiled XPath instead of BeautifulSoup
+
+    Produces exactly the same property and unit dicts as PageParser. The
+    lxml tree is cheap enough to build whole, so partial is ignored.
+    """
+
+    property_parser = Lxml_Property_Parser
+    unit_parser = Lxml_Unit_Parser
+
+    def build_tree(self, content: bytes):
+        return build_tree(content)
+
+    @staticmethod
+    def get_property_name(root):
+        return get_text(first(_PROPERTY_NAME, root), strip=True).replace("'", "")
+
+    @staticmethod
+    def units_tab(root):
+        return first(_UNITS_TAB, root)
+
+    @staticmethod
+    def iter_elements(node):
+        return tree_elements(node, _LAYOUT_TAGS)
+
+    @staticmethod
+    def find_units(root, layout: UnitLayout):
+        return _UNITS_LAYOUTS[layout.name](root)
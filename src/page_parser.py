@@ -0,0 +1,202 @@
+from collections import Counter
+from dataclasses import dataclass, field
+
+from .formatting import DateNormalizer
+from .scraper import build_soup
+from .strainers import PROPERTY_PAGE_STRAINER
+from .structured_data import StructuredData
+from .unit_layouts import (
+    UNIT_LAYOUTS,
+    UnitLayout,
+    layout_fingerprint,
+    match_layouts,
+    soup_elements,
+)
+from .unit_parser import Unit_Parser
+from .property_parser import DEFAULT_AMENITY_MATCHER, AmenityMatcher, Property_Parser
+
+
+class MissingElementError(AttributeError):
+    """Raised when an element the parser needs is missing from the page
+
+    It is an AttributeError, which the BeautifulSoup parsers raise when a
+    lookup returns None, so the fallbacks catching it work for every backend.
+    """
+
+
+@dataclass
+class PageParser:
+    """Turns a property page into property and unit records
+
+    Holds only plain settings, so it can be pickled and sent to worker
+    processes that parse pages in parallel.
+
+    With partial set, only the regions of the page listed in
+    PROPERTY_PAGE_REGIONS are turned into a tree, so amenities shown
+    outside of them are not detected.
+
+    With structured_data set, the location and unit details are read from
+    the page's JSON-LD first, and the HTML is only searched for the fields
+    it doesn't give. field_sources counts which of the two supplied each field.
+
+    The layout of the units is detected once per page, and layout_fingerprints
+    counts the unit structures seen, so a change of the site's markup shows up
+    as a new fingerprint instead of only as parse errors.
+
+    Unit dates are formatted with the dates normalizer, whose clock is fixed
+    when the parser is created and shared by the worker processes.
+
+    Methods:
+        parse_html: Parse the raw bytes of a property page
+        parse_page: Parse an already built BeautifulSoup tree
+        source_stats: Number of values of each field read from each source
+    """
+
+    city_name: str
+    amenity_matcher: AmenityMatcher = DEFAULT_AMENITY_MATCHER
+    partial: bool = False
+    structured_data: bool = True
+    field_sources: Counter = field(default_factory=Counter, compare=False)
+    layout_fingerprints: Counter = field(default_factory=Counter, compare=False)
+    dates: DateNormalizer = field(default_factory=DateNormalizer, compare=False)
+
+    # Parsers used for the property details and each unit
+    property_parser = Property_Parser
+    unit_parser = Unit_Parser
+
+    def build_tree(self, content: bytes):
+        parse_only = PROPERTY_PAGE_STRAINER if self.partial else None
+        return build_soup(content, 200, parse_only)
+
+    def parse_html(self, content: bytes, url: str):
+        """Builds the HTML tree from the raw page and parses it"""
+        structured = StructuredData.from_html(content) if self.structured_data else None
+        return self.parse_page(self.build_tree(content), url, structured)
+
+    def source_stats(self):
+        """Returns the number of values of each field read from the structured data
+        and from the HTML"""
+        stats = {}
+        for (key, source), count in sorted(self.field_sources.items()):
+            stats.setdefault(key, {"structured": 0, "dom": 0})[source] = count
+        return stats
+
+    def parse_page(self, soup, url, structured: StructuredData = None):
+        """Extracts the property details and current unit listings from a property page
+
+        Returns:
+            dict: Property details
+            dict: The property's units and zipcode
+        """
+        property_name = self.get_property_name(soup)
+
+        # Extract all property details
+        property_data = self.parse_property(
+            soup, property_name, self.city_name, url, structured
+        )
+        # Find all of the current unit listings
+        units = {
+            "units": self.parse_units(soup, structured),
+            "zipcode": property_data["zipcode"],
+        }
+        return property_data, units
+
+    @staticmethod
+    def get_property_name(soup):
+        return (
+            soup.find("h1", {"class": "propertyName"})
+            .get_text(strip=True)
+            .replace("'", "")
+        )
+
+    def parse_property(self, soup, property_name, city_name, url, structured=None):
+        property_data = self.property_parser(
+            property_name, url, amenity_matcher=self.amenity_matcher
+        ).parse_property_page(soup, structured, self.field_sources)
+
+        property_data["city_name"] = city_name
+
+        return property_data
+
+    def parse_units(self, soup, structured=None):
+
+        layout, raw_units = self.detect_layout(soup)
+        structured_units = structured.units if structured is not None else None
+
+        # Extract each unit from the listing
+        units = []
+        fingerprint = layout_fingerprint(layout, (), {})
+        for index, unit in enumerate(raw_units):
+            unit_parser = self.unit_parser(dates=self.dates)
+            current_unit = unit_parser.parse_unit(
+                unit, structured_units, self.field_sources
+            )
+            if index == 0:
+                fingerprint = unit_parser.fingerprint(layout, unit)
+            if current_unit["date_available"] != "Not Available":
+                units.append(current_unit)
+            else:
+                pass
+        self.layout_fingerprints[fingerprint] += 1
+        return units
+
+    @staticmethod
+    def units_tab(soup):
+        return soup.find("div", {"data-tab-content-id": "all"})
+
+    @staticmethod
+    def iter_elements(node):
+        return soup_elements(node)
+
+    @staticmethod
+    def find_units(soup, layout: UnitLayout):
+        return soup.find_all(layout.tag, {"class": layout.class_name})
+
+    def detect_layout(self, soup):
+        """Finds the layout of the page's units and the unit elements
+
+        The layouts listed inside the units tab are all matched in one walk
+        over the tab, and the whole page is only searched when none of them are
+        found.
+
+        Returns:
+            UnitLayout: Layout of the units, None if there are no units
+            list: The unit elements
+        """
+        units_tab = self.units_tab(soup)
+        if units_tab is None:
+            self.layout_fingerprints["no units tab"] += 1
+            raise MissingElementError("The page has no units tab")
+
+        tab_layouts = [layout for layout in UNIT_LAYOUTS if layout.in_units_tab]
+        tab_units = match_layouts(self.iter_elements(units_tab), tab_layouts)
+        for layout in UNIT_LAYOUTS:
+            if layout.in_units_tab:
+                units = tab_units[layout.name]
+            else:
+                units = self.find_units(soup, layout)
+            if len(units) != 0:
+                return layout, units
+        return None, []
+
+    def get_all_units(self, soup):
+        """Grab all units from a listing URl"""
+        _, units = self.detect_layout(soup)
+        return units
+
+    def take_counters(self):
+        """Returns the field source, layout and date cache counts, and resets them"""
+        counters = {
+            "field_sources": self.field_sources.copy(),
+            "layout_fingerprints": self.layout_fingerprints.copy(),
+            "dates": self.dates.take_counts(),
+        }
+        self.field_sources.clear()
+        self.layout_fingerprints.clear()
+        return counters
+
+    def add_counters(self, counters: dict):
+        """Adds counts returned by take_counters, e.g. from a worker process"""
+        self.field_sources.update(counters["field_sources"])
+        self.layout_fingerprints.update(counters["layout_fingerprints"])
+        self.dates.add_counts(counters["dates"])
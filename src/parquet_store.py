@@ -0,0 +1,261 @@
+from datetime import date
+import os
+from urllib.parse import quote
+import uuid
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .property_parser import DEFAULT_AMENITY_MATCHER
+from .records import PROPERTY_FIELDS, PropertyRecord, UnitRecord, as_row, ordinal_date
+from .sinks import StorageSink
+
+# Every snapshot is stored under <root>/<table>/city_name=<city>/date_scraped=<date>/
+PARTITION_SCHEMA = pa.schema(
+    [("city_name", pa.string()), ("date_scraped", pa.date32())]
+)
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor="hive")
+
+# Types of the property fields, the amenities being booleans
+PROPERTY_TYPES = {
+    "latitude": pa.float64(),
+    "longitude": pa.float64(),
+    "neighborhood": pa.string(),
+    "zipcode": pa.string(),
+    "description": pa.string(),
+    "unique_features": pa.string(),
+    "year_built": pa.int16(),
+    "property_url": pa.string(),
+}
+
+# Units are stored with the key of their property, missing numbers and dates as nulls
+UNIT_SCHEMA = pa.schema(
+    [
+        ("property_name", pa.string()),
+        ("zipcode", pa.string()),
+        ("unit_label", pa.string()),
+        ("rent", pa.float64()),
+        ("beds", pa.int8()),
+        ("baths", pa.float32()),
+        ("sqft", pa.float64()),
+        ("date_available", pa.date32()),
+    ]
+)
+
+
+def property_schema(amenity_columns: tuple = None):
+    """Returns the schema of the properties parsed with the given amenity columns
+
+    The partition columns, city_name and date_scraped, are not stored in the files.
+    """
+    if amenity_columns is None:
+        amenity_columns = DEFAULT_AMENITY_MATCHER.columns
+    fields = [("property_name", pa.string())]
+    fields += [(column, pa.bool_()) for column in amenity_columns]
+    fields += [
+        (name, PROPERTY_TYPES[name]) for name in PROPERTY_FIELDS if name != "city_name"
+    ]
+    return pa.schema(fields)
+
+
+def partition_dir(root: str, table: str, city_name: str, scrape_date: date):
+    """Returns the directory of a city's snapshot of a table"""
+    return os.path.join(
+        root,
+        table,
+        f"city_name={quote(city_name, safe='')}",
+        f"date_scraped={scrape_date.isoformat()}",
+    )
+
+
+class ParquetSink(StorageSink):
+    """Exports a city's snapshot to Parquet files partitioned by city and scrape date
+
+    Properties and units are buffered column by column, and written as a
+    compressed row group each time row_group_size rows are buffered, so
+    the export grows while the crawl runs and memory stays bounded.
+
+    Each open sink writes a new part file per table, hidden by a leading dot
+    until the sink is closed. Readers only see complete files, and a sink
+    that is never closed leaves nothing readable, so a resumed run has to
+    write its stored properties again, as ApartmentsPipeline.resume does.
+    On close, the new part replaces the parts published by earlier exports
+    of the same city and day. Hidden parts are left alone, as they may be
+    another sink's still being written.
+
+    Methods:
+        write_properties: Buffer parsed property dicts or PropertyRecords
+        write_units: Buffer the units of (property_name, zipcode, units)
+        flush: Does nothing, rows are only readable once the sink is closed
+        close: Write the buffered rows and publish the part files
+    """
+
+    def __init__(
+        self,
+        root: str,
+        city_name: str,
+        scrape_date: date,
+        row_group_size: int = 100_000,
+        compression: str = "zstd",
+        amenity_columns: tuple = None,
+    ):
+        """
+        Args:
+            root (str): Directory of the export, e.g. ./data/parquet
+            city_name (str): City of the snapshot
+            scrape_date (date): Date of the snapshot
+            row_group_size (int, optional): Number of rows per row group.
+            compression (str, optional): Parquet compression codec.
+            amenity_columns (tuple, optional): AmenityMatcher.columns of the parser.
+                                    Defaults to those of HTML_AMENITIES.
+        """
+        self.root = root
+        self.city_name = city_name
+        self.scrape_date = scrape_date
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.amenity_columns = amenity_columns
+        self.schemas = {
+            "properties": property_schema(amenity_columns),
+            "units": UNIT_SCHEMA,
+        }
+        self.buffers = {}
+        self.writers = {}
+        self.paths = {}
+        self.rows_written = dict.fromkeys(self.schemas, 0)
+        for table, schema in self.schemas.items():
+            self.buffers[table] = {column: [] for column in schema.names}
+
+    def buffered(self, table: str):
+        return len(self.buffers[table]["property_name"])
+
+    def write_properties(self, properties: list):
+        columns = self.buffers["properties"]
+        for record in properties:
+            if isinstance(record, dict):
+                record = PropertyRecord.from_dict(record, self.amenity_columns)
+            row = as_row(record)
+            for column, values in columns.items():
+                values.append(row[column])
+        self.write_full_row_groups("properties")
+
+    def write_units(self, property_units: list):
+        columns = list(self.buffers["units"].values())
+        for property_name, zipcode, units in property_units:
+            for unit in units:
+                if isinstance(unit, dict):
+                    unit = UnitRecord.from_dict(unit)
+                # Columns of UNIT_SCHEMA, date_scraped being the partition
+                row = (property_name, zipcode) + unit[:5]
+                row += (ordinal_date(unit.date_available),)
+                for values, value in zip(columns, row):
+                    values.append(value)
+        self.write_full_row_groups("units")
+
+    def write_full_row_groups(self, table: str):
+        while self.buffered(table) >= self.row_group_size:
+            self.write_row_group(table, self.row_group_size)
+
+    def write_row_group(self, table: str, rows: int = None):
+        """Writes the first rows buffered for a table, all if None, as a row group"""
+        buffer = self.buffers[table]
+        rows = self.buffered(table) if rows is None else rows
+        if rows == 0:
+            return
+        data = pa.Table.from_pydict(
+            {column: values[:rows] for column, values in buffer.items()},
+            schema=self.schemas[table],
+        )
+        if table not in self.writers:
+            directory = partition_dir(
+                self.root, table, self.city_name, self.scrape_date
+            )
+            os.makedirs(directory, exist_ok=True)
+            name = f"part-{uuid.uuid4().hex}.parquet"
+            self.paths[table] = os.path.join(directory, name)
+            self.writers[table] = pq.ParquetWriter(
+                os.path.join(directory, f".{name}"),
+                self.schemas[table],
+                compression=self.compression,
+            )
+        self.writers[table].write_table(data, row_group_size=rows)
+        self.rows_written[table] += rows
+        for values in buffer.values():
+            del values[:rows]
+
+    def flush(self):
+        """Does nothing: a part is only readable once its footer is written on
+        close, so partial row groups stay buffered rather than written small"""
+
+    def close(self):
+        for table in self.schemas:
+            self.write_row_group(table)
+        for table, writer in self.writers.items():
+            writer.close()
+            directory, name = os.path.split(self.paths[table])
+            os.replace(os.path.join(directory, f".{name}"), self.paths[table])
+            # The snapshot of a city and day is the last one exported
+            for stale in os.listdir(directory):
+                if stale != name and stale.startswith("part-"):
+                    os.remove(os.path.join(directory, stale))
+        self.writers = {}
+
+
+def snapshot_dataset(root: str = "./data/parquet", table: str = "units"):
+    """Returns the Parquet dataset of every exported snapshot of a table
+
+    Args:
+        root (str, optional): Directory of the export
+        table (str, optional): "properties" or "units"
+    """
+    return ds.dataset(
+        os.path.join(root, table), format="parquet", partitioning=PARTITIONING
+    )
+
+
+def read_snapshots(
+    root: str = "./data/parquet",
+    table: str = "units",
+    columns: list = None,
+    cities: list = None,
+    start_date: date = None,
+    end_date: date = None,
+    filter: ds.Expression = None,
+):
+    """Reads exported snapshots into a typed DataFrame
+
+    The city and date filters select partitions, so the files of other
+    cities and days aren't opened. Only the given columns are read, and
+    filter is pushed down to the row groups, skipping those whose
+    statistics rule it out.
+
+    Args:
+        root (str, optional): Directory of the export
+        table (str, optional): "properties" or "units"
+        columns (list, optional): Columns to read, city_name and date_scraped included.
+                                    Defaults to every column.
+        cities (list, optional): Cities to read. Defaults to every city.
+        start_date (date, optional): First scrape date to read, included.
+        end_date (date, optional): Last scrape date to read, included.
+        filter (Expression, optional): Row filter, e.g. ds.field("rent") < 3000
+
+    Returns:
+        DataFrame: Dates as datetime64 and the city as a categorical
+    """
+    conditions = [] if filter is None else [filter]
+    if cities is not None:
+        conditions.append(ds.field("city_name").isin(list(cities)))
+    if start_date is not None:
+        conditions.append(ds.field("date_scraped") >= start_date)
+    if end_date is not None:
+        conditions.append(ds.field("date_scraped") <= end_date)
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    data = snapshot_dataset(root, table).to_table(columns=columns, filter=expression)
+    frame = data.to_pandas(date_as_object=False)
+    if "city_name" in frame:
+        frame["city_name"] = frame["city_name"].astype("category")
+    return frame
@@ -0,0 +1,105 @@
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+from .page_parser import PageParser
+
+# Parser of the current worker process, set once by the pool initializer
+_worker_parser = None
+
+
+def _init_worker(page_parser: PageParser):
+    global _worker_parser
+    _worker_parser = page_parser
+
+
+def parse_one(page_parser: PageParser, url: str, content: bytes):
+    """Parses a single raw property page into plain records
+
+    Returns:
+        tuple: (url, property_data, units, error). The records are None and
+               error holds the message if the page could not be parsed.
+    """
+    try:
+        property_data, units = page_parser.parse_html(content, url)
+    except Exception as e:
+        return url, None, None, str(e)
+    return url, property_data, units, None
+
+
+def _parse_batch(batch: list):
+    results = [parse_one(_worker_parser, url, content) for url, content in batch]
+    # Hand the counts of the batch back to the parent process
+    return results, _worker_parser.take_counters()
+
+
+class ParsePool:
+    """Parses raw property pages on a pool of worker processes
+
+    Pages are sent to the workers in batches to amortize the cost of moving
+    them between processes, and each worker returns plain dicts built by the
+    same PageParser code as the single-threaded path.
+
+    Methods:
+        parse_pages: Parse (url, content) pairs, yielding results as batches finish
+        close: Shut the worker processes down
+    """
+
+    def __init__(
+        self, page_parser: PageParser, workers: int = None, batch_size: int = 8
+    ):
+        """Starts the worker processes
+
+        Args:
+            page_parser (PageParser): Parser copied to every worker process.
+            workers (int, optional): Number of worker processes. Defaults to the
+                                    number of CPUs.
+            batch_size (int, optional): Number of pages sent to a worker at once.
+        """
+        self.page_parser = page_parser
+        self.workers = workers or os.cpu_count()
+        self.batch_size = batch_size
+        # Workers are spawned rather than forked, as the parent runs the
+        # fetcher's event loop thread, whose locks a fork could copy held
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(page_parser,),
+        )
+
+    def parse_pages(self, pages):
+        """Parses the pages on the worker processes
+
+        At most two batches per worker are queued at a time, so the pool
+        consumes pages only as fast as it can parse them. The field source
+        and layout counts of the workers are added to those of page_parser.
+
+        Args:
+            pages (iterable): (url, content) pairs of raw property pages
+
+        Yields:
+            tuple: (url, property_data, units, error) for every page
+        """
+        pages = iter(pages)
+        pending = set()
+        max_pending = 2 * self.workers
+
+        while True:
+            while len(pending) < max_pending:
+                batch = list(islice(pages, self.batch_size))
+                if not batch:
+                    break
+                pending.add(self.executor.submit(_parse_batch, batch))
+            if not pending:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results, counters = future.result()
+                self.page_parser.add_counters(counters)
+                yield from results
+
+    def close(self):
+        self.executor.shutdown()
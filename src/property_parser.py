@@ -1,7 +1,126 @@
 #%%
 from dataclasses import dataclass, field
+from bs4 import NavigableString
 import re
 
+from .structured_data import LOCATION_FIELDS
+
+# amenities to check for on the url
+# Key = the html element feature name
+# Value = the html element the value should be stored in
+HTML_AMENITIES = {
+    "Fitness Center": "span",
+    "Business Center": "span",
+    "Air Conditioning": "span",
+    "In Unit Washer & Dryer": "span",
+    "Dishwasher": "span",
+    "Laundry Facilities": "span",
+    "Car Charging": "span",
+    "Roof": "span",
+    "Concierge": "span",
+    "Pool": "span",
+    "Elevator": "span",
+    "Garage": "div",
+    "Dogs Allowed": "h4",
+    "Cats Allowed": "h4",
+    "Income Restrictions": "h2",
+}
+
+
+def amenity_column(amenity: str):
+    """The amenity name has to match the HTML lookup,
+    however, it needs to be converted to a proper format
+    for the database."""
+    return amenity.lower().replace(" & ", " ").replace(" ", "_")
+
+
+class AmenityMatcher:
+    """Detects every amenity of a table in a single walk over the page's text
+
+    An amenity is found when the text of an element of its HTML type matches
+    it, using the same rule as soup.find(html_element, text=re.compile(amenity)):
+    the element must hold that one string, directly or through single children.
+    One combined pattern rejects the text that matches no amenity at all, and
+    only the rest is checked against the individual amenities.
+
+    Methods:
+        match: Returns the amenity columns found in (string, elements) pairs
+        soup_strings: Yields the (string, elements) pairs of a BeautifulSoup tree
+    """
+
+    def __init__(self, amenity_table: dict = HTML_AMENITIES):
+        """Compiles the amenity table
+
+        Args:
+            amenity_table (dict, optional): Key = the html element feature name,
+                                    Value = the html element the value is stored in.
+        """
+        self.amenity_table = dict(amenity_table)
+        # A tuple, so property records can share it
+        self.columns = tuple(amenity_column(amenity) for amenity in self.amenity_table)
+        self.patterns = [
+            (amenity_column(amenity), re.compile(amenity), html_element)
+            for amenity, html_element in self.amenity_table.items()
+        ]
+        self.any_amenity = re.compile(
+            "|".join(f"(?:{amenity})" for amenity in self.amenity_table)
+        )
+        self.html_elements = set(self.amenity_table.values())
+
+    def match(self, strings):
+        """Checks every string against the amenity table
+
+        Args:
+            strings (iterable): (string, elements) pairs, where elements are the
+                                    names of the elements whose text is that string
+
+        Returns:
+            dict: True/False for each amenity column, in table order
+        """
+        amenities = dict.fromkeys(self.columns, False)
+        remaining = list(self.patterns)
+        for string, elements in strings:
+            if not self.any_amenity.search(string):
+                continue
+            for amenity in list(remaining):
+                column, pattern, html_element = amenity
+                if html_element in elements and pattern.search(string):
+                    amenities[column] = True
+                    remaining.remove(amenity)
+            # Stop walking the page once every amenity has been found
+            if not remaining:
+                break
+        return amenities
+
+    def soup_strings(self, soup):
+        """Yields each string of the page with the elements it is the only text of"""
+        for node in soup.descendants:
+            if not isinstance(node, NavigableString):
+                continue
+            elements = []
+            parent = node.parent
+            while parent is not None and len(parent.contents) == 1:
+                elements.append(parent.name)
+                parent = parent.parent
+            if self.html_elements.intersection(elements):
+                yield node, elements
+
+
+DEFAULT_AMENITY_MATCHER = AmenityMatcher()
+
+
+def check_amenity_columns(columns: tuple):
+    """Raises a ValueError for the amenity columns the database tables lack
+
+    The properties tables only have a column for each amenity of HTML_AMENITIES,
+    so a custom amenity table has to be a subset of it to be stored.
+    """
+    unknown = [c for c in columns if c not in DEFAULT_AMENITY_MATCHER.columns]
+    if unknown:
+        raise ValueError(
+            f"No properties column for the amenities: {', '.join(unknown)}"
+        )
+
 
 @dataclass
 class Property_Parser:
@@ -12,6 +131,7 @@ class Property_Parser:
     unique_features: list = field(default_factory=list)
     location: dict = field(default_factory=dict)
     year_built: str = field(init=False)
+    amenity_matcher: AmenityMatcher = DEFAULT_AMENITY_MATCHER
 
     def get_property_description(self, soup):
         raw_description = soup.find("section", {"id": "descriptionSection"}).find_all(
@@ -29,38 +149,8 @@ class Property_Parser:
 
     def extract_amenities(self, soup):
         """Parse the property HTML and search for various amenities"""
-
-        # amenities to check for on the url
-        # Key = the html element feature name
-        # Value = the html element the value should be stored in
-        html_amenities = {
-            "Fitness Center": "span",
-            "Business Center": "span",
-            "Air Conditioning": "span",
-            "In Unit Washer & Dryer": "span",
-            "Dishwasher": "span",
-            "Laundry Facilities": "span",
-            "Car Charging": "span",
-            "Roof": "span",
-            "Concierge": "span",
-            "Pool": "span",
-            "Elevator": "span",
-            "Garage": "div",
-            "Dogs Allowed": "h4",
-            "Cats Allowed": "h4",
-            "Income Restrictions": "h2",
-        }
-        for amenity, html_element in html_amenities.items():
-            amenity_check = (
-                False
-                if soup.find(html_element, text=re.compile(amenity)) == None
-                else True
-            )
-            # The amenity name has to match the HTML lookup,
-            # however, it needs to be converted to a proper format
-            # for the database.
-            cleaned_amenity_name = amenity.lower().replace(" & ", " ").replace(" ", "_")
-            self.amenities[cleaned_amenity_name] = amenity_check
+        matcher = self.amenity_matcher
+        self.amenities.update(matcher.match(matcher.soup_strings(soup)))
 
     def extract_unique_features(self, soup):
         """Parse the property HTML and collect a list of the unique features"""
@@ -110,6 +200,20 @@ class Property_Parser:
         self.location["neighborhood"] = neighborhood
         self.location["zipcode"] = zipcode
 
+    def fill_location(self, soup, structured_location: dict, sources=None):
+        """Takes each location field from the structured data, reading the page only for
+        the fields it doesn't give"""
+        if any(structured_location[key] is None for key in LOCATION_FIELDS):
+            self.extract_location(soup)
+        for key in LOCATION_FIELDS:
+            if structured_location[key] is not None:
+                self.location[key] = structured_location[key]
+                source = "structured"
+            else:
+                source = "dom"
+            if sources is not None:
+                sources[(key, source)] += 1
+
     def get_year_built(self, soup):
         try:
             year_built = soup.find("div", text=re.compile("Built in")).get_text(
@@ -119,11 +223,14 @@ class Property_Parser:
         except:
             self.year_built = None
 
-    def parse_property_page(self, soup):
+    def parse_property_page(self, soup, structured=None, sources=None):
         self.get_property_description(soup)
         self.extract_amenities(soup)
         self.extract_unique_features(soup)
-        self.extract_location(soup)
+        if structured is not None:
+            self.fill_location(soup, structured.location, sources)
+        else:
+            self.extract_location(soup)
         self.get_year_built(soup)
 
         # Combined all of the dictionaries and other property values
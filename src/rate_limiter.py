@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Status codes that mean the server wants us to slow down
+THROTTLE_STATUS_CODES = {403, 429}
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at a fixed number of tokens per second
+
+    Tokens are reserved rather than polled: a caller that arrives when the
+    bucket is empty is told how long to wait for its token, so concurrent
+    callers queue up in arrival order without spinning.
+    """
+
+    def __init__(self, rate: float, burst: float = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Takes one token and returns the number of seconds to wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.last_refill) * self.rate
+            )
+            self.last_refill = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.last_refill) * self.rate
+            )
+            self.last_refill = now
+            self.rate = rate
+
+
+class AdaptiveRateLimiter:
+    """Per-host token buckets under one global budget, with AIMD backoff
+
+    Every host gets its own bucket, and each request must also take a token
+    from a global bucket shared by all hosts, workers and cities using this
+    limiter. A throttling response (403, 429 or 5xx) or a failed request
+    multiplies the host's rate by backoff_factor. Each successful response
+    then adds recovery_step back, until the configured rate is reached again.
+
+    Methods:
+        acquire: Wait until a request to the URL is allowed
+        record: Adjust the host's rate after a response
+        stats: Current rate and throttle count per host
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float = 4,
+        global_requests_per_second: float = 8,
+        jitter: float = 0.25,
+        backoff_factor: float = 0.5,
+        recovery_step: float = 0.05,
+        min_rate: float = 0.1,
+        backoff_cooldown: float = 5,
+    ):
+        """Constructs the rate limiter
+
+        Args:
+            requests_per_second (float, optional): Max request rate for each host.
+            global_requests_per_second (float, optional): Max request rate across all
+                                    hosts.
+            jitter (float, optional): Max random delay in seconds added to each request.
+            backoff_factor (float, optional): Multiplier applied to a host's rate when
+                                    throttled.
+            recovery_step (float, optional): Rate added back after each successful
+                                    request.
+            min_rate (float, optional): The rate never drops below this value.
+            backoff_cooldown (float, optional): Seconds after a backoff during which
+                                    further throttled responses do not reduce the
+                                    rate again.
+        """
+        self.requests_per_second = requests_per_second
+        self.jitter = jitter
+        self.backoff_factor = backoff_factor
+        self.recovery_step = recovery_step
+        self.min_rate = min_rate
+        self.backoff_cooldown = backoff_cooldown
+
+        self.global_bucket = TokenBucket(global_requests_per_second)
+        self.host_buckets = {}
+        self.last_backoff = {}
+        self.throttled = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, host: str):
+        with self._lock:
+            if host not in self.host_buckets:
+                self.host_buckets[host] = TokenBucket(self.requests_per_second)
+                self.last_backoff[host] = 0
+                self.throttled[host] = 0
+            return self.host_buckets[host]
+
+    async def acquire(self, url: str):
+        """Sleeps until both the host and the global budget allow a request"""
+        host_delay = self._bucket(urlsplit(url).netloc).reserve()
+        global_delay = self.global_bucket.reserve()
+        delay = max(host_delay, global_delay)
+        if self.jitter > 0:
+            delay += np.random.uniform(0, self.jitter)
+        await asyncio.sleep(delay)
+
+    def record(self, url: str, status_code: int = None):
+        """Backs off or recovers the host's rate based on the response
+
+        Args:
+            url (str): The requested URL
+            status_code (int, optional): Status code of the response. None means
+                                    the request failed without a response.
+        """
+        host = urlsplit(url).netloc
+        bucket = self._bucket(host)
+
+        if (
+            status_code is None
+            or status_code in THROTTLE_STATUS_CODES
+            or status_code >= 500
+        ):
+            now = time.monotonic()
+            with self._lock:
+                self.throttled[host] += 1
+                if now - self.last_backoff[host] < self.backoff_cooldown:
+                    return
+                self.last_backoff[host] = now
+            new_rate = max(self.min_rate, bucket.rate * self.backoff_factor)
+            logger.info(
+                "Throttled by %s, reducing rate to %.2f requests/s", host, new_rate
+            )
+            bucket.set_rate(new_rate)
+        elif bucket.rate < self.requests_per_second:
+            bucket.set_rate(
+                min(self.requests_per_second, bucket.rate + self.recovery_step)
+            )
+
+    def stats(self):
+        """Returns the current rate and number of throttled responses per host"""
+        return {
+            host: {"rate": bucket.rate, "throttled": self.throttled[host]}
+            for host, bucket in self.host_buckets.items()
+        }
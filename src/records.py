@@ -0,0 +1,161 @@
+from datetime import date
+from functools import lru_cache
+from itertools import islice
+from typing import NamedTuple, Optional, Union
+
+from .property_parser import DEFAULT_AMENITY_MATCHER
+
+# Property fields that follow the amenities, in the order of the parsed dicts
+PROPERTY_FIELDS = (
+    "latitude",
+    "longitude",
+    "neighborhood",
+    "zipcode",
+    "description",
+    "unique_features",
+    "year_built",
+    "property_url",
+    "city_name",
+)
+
+
+@lru_cache(maxsize=4096)
+def date_ordinal(text: str):
+    """Returns the ordinal of a YYYY-MM-DD date or a date object, None for other text
+
+    Cached, so the units of a run share one int object per date.
+    """
+    if isinstance(text, date):
+        return text.toordinal()
+    try:
+        return date.fromisoformat(text).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def ordinal_date(ordinal: int):
+    """Returns the date of an ordinal, None if there is none"""
+    return None if ordinal is None else date.fromordinal(ordinal)
+
+
+def parse_number(value, number_type):
+    """Converts a formatted value to a number, None for empty or unparsed text"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        return number_type(value)
+    except ValueError:
+        return None
+
+
+class UnitRecord(NamedTuple):
+    """A unit listing, with numbers parsed and dates stored as ordinals"""
+
+    unit_label: str
+    rent: Optional[Union[int, float]]
+    beds: Optional[int]
+    baths: Optional[float]
+    sqft: Optional[Union[int, float]]
+    date_available: Optional[int]
+    date_scraped: Optional[int]
+
+    @classmethod
+    def from_dict(cls, unit: dict):
+        """Packs a formatted unit dict, as returned by Unit_Parser.parse_unit"""
+        return cls(
+            unit["unit_label"],
+            parse_number(unit["rent"], int),
+            parse_number(unit["beds"], int),
+            parse_number(unit["baths"], float),
+            parse_number(unit["sqft"], int),
+            date_ordinal(unit["date_available"]),
+            date_ordinal(unit["date_scraped"]),
+        )
+
+    def as_dict(self):
+        """Returns the unit as a dict of database values, with dates as date objects"""
+        unit = self._asdict()
+        unit["date_available"] = ordinal_date(self.date_available)
+        unit["date_scraped"] = ordinal_date(self.date_scraped)
+        return unit
+
+
+class PropertyRecord:
+    """A property with its amenities packed into a bitmask
+
+    Attributes:
+        amenity_columns (tuple): Amenity column of each bit, shared by all records
+                                    parsed with the same amenity table
+        amenities (int): Bit i is set if the property has amenity_columns[i]
+    """
+
+    __slots__ = ("property_name", "amenity_columns", "amenities") + PROPERTY_FIELDS
+
+    def __init__(
+        self, property_name: str, amenity_columns: tuple, amenities: int, **fields
+    ):
+        self.property_name = property_name
+        self.amenity_columns = amenity_columns
+        self.amenities = amenities
+        for name in PROPERTY_FIELDS:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_dict(cls, property_data: dict, amenity_columns: tuple = None):
+        """Packs a parsed property dict, as returned by PageParser.parse_property
+
+        Args:
+            property_data (dict): Parsed property
+            amenity_columns (tuple, optional): AmenityMatcher.columns of the parser.
+                                    Defaults to those of HTML_AMENITIES.
+        """
+        if amenity_columns is None:
+            amenity_columns = DEFAULT_AMENITY_MATCHER.columns
+        amenities = 0
+        for bit, column in enumerate(amenity_columns):
+            if property_data.get(column):
+                amenities |= 1 << bit
+
+        fields = {name: property_data.get(name) for name in PROPERTY_FIELDS}
+        fields["latitude"] = parse_number(fields["latitude"], float)
+        fields["longitude"] = parse_number(fields["longitude"], float)
+        fields["year_built"] = parse_number(fields["year_built"] or None, int)
+        return cls(property_data["property_name"], amenity_columns, amenities, **fields)
+
+    def has_amenity(self, column: str):
+        return bool(self.amenities >> self.amenity_columns.index(column) & 1)
+
+    def as_dict(self):
+        """Returns the property as a dict of database values, in parsed dict order"""
+        property_data = {"property_name": self.property_name}
+        for bit, column in enumerate(self.amenity_columns):
+            property_data[column] = bool(self.amenities >> bit & 1)
+        for name in PROPERTY_FIELDS:
+            property_data[name] = getattr(self, name)
+        return property_data
+
+    def __eq__(self, other):
+        if not isinstance(other, PropertyRecord):
+            return NotImplemented
+        return self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        return f"PropertyRecord({self.property_name!r}, {self.zipcode!r})"
+
+
+def as_row(record):
+    """Returns a property or unit, as a record or a dict, as a dict of column values"""
+    if isinstance(record, dict):
+        return record
+    return record.as_dict()
+
+
+# Unit columns written by the storage backends, in the order of UnitRecord
+UNIT_ROW_COLUMNS = UnitRecord._fields
+
+
+def batched(iterable, size: int):
+    """Yields lists of up to size items"""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
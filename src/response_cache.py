@@ -0,0 +1,175 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+class ResponseCache:
+    """Compressed on-disk cache of raw HTTP responses keyed by URL
+
+    Each body is gzipped into a file named after the SHA-256 of its URL, and
+    a small SQLite index keeps the status code, fetch time and size of every
+    entry. Entries older than the TTL are dropped, and the least recently
+    used entries are evicted once the cache grows past max_bytes.
+
+    Methods:
+        get: Look up a cached response
+        put: Store a response
+        evict: Drop expired entries and shrink the cache to max_bytes
+    """
+
+    def __init__(
+        self, cache_dir: str = "./data/cache", ttl: float = None, max_bytes: int = None
+    ):
+        """Opens (or creates) the cache
+
+        Args:
+            cache_dir (str, optional): Directory holding the cached responses.
+            ttl (float, optional): Seconds a response stays valid. Never expires if
+                                    None.
+            max_bytes (int, optional): Max compressed size of the cache. Unbounded if
+                                    None.
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            os.path.join(cache_dir, "index.db"), check_same_thread=False
+        )
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            );""")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    @staticmethod
+    def url_key(url: str):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.gz")
+
+    def get(self, url: str, ignore_ttl: bool = False):
+        """Returns the cached response for the URL
+
+        Args:
+            url (str): URL of the response
+            ignore_ttl (bool, optional): Return the entry even if it has expired.
+
+        Returns:
+            tuple: (content, status_code, fetched_at), or None if the URL is not cached.
+        """
+        key = self.url_key(url)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT status, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            expired = (
+                row is not None
+                and not ignore_ttl
+                and self.ttl is not None
+                and time.time() - row[1] > self.ttl
+            )
+            if row is None or expired:
+                self.misses += 1
+                return None
+
+            try:
+                with gzip.open(self._path(key), "rb") as file:
+                    content = file.read()
+            except (FileNotFoundError, OSError):
+                self._delete(key)
+                self.conn.commit()
+                self.misses += 1
+                return None
+
+            self.conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self.conn.commit()
+            self.hits += 1
+        return content, row[0], row[1]
+
+    def put(self, url: str, content: bytes, status_code: int):
+        """Compresses and stores the response, replacing any previous entry"""
+        key = self.url_key(url)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so a crash never leaves a partial entry
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(gzip.compress(content or b""))
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+
+        now = time.time()
+        with self._lock:
+            previous = self.conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self.conn.execute(
+                """INSERT OR REPLACE INTO responses
+                   (key, url, status, fetched_at, size, last_access)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (key, url, status_code, now, size, now),
+            )
+            self.conn.commit()
+            self.total_bytes += size - (previous[0] if previous else 0)
+
+        if self.max_bytes is not None and self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def _delete(self, key: str):
+        row = self.conn.execute(
+            "SELECT size FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return
+        self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self.total_bytes -= row[0]
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """Drops expired entries, then the least recently used until under max_bytes"""
+        with self._lock:
+            if self.ttl is not None:
+                expired = self.conn.execute(
+                    "SELECT key FROM responses WHERE fetched_at < ?",
+                    (time.time() - self.ttl,),
+                ).fetchall()
+                for (key,) in expired:
+                    self._delete(key)
+
+            if self.max_bytes is not None and self.total_bytes > self.max_bytes:
+                entries = self.conn.execute(
+                    "SELECT key FROM responses ORDER BY last_access"
+                )
+                for (key,) in entries.fetchall():
+                    if self.total_bytes <= self.max_bytes:
+                        break
+                    self._delete(key)
+            self.conn.commit()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "bytes": self.total_bytes}
+
+    def close(self):
+        self.conn.close()
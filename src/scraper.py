@@ -1,8 +1,17 @@
 from bs4 import BeautifulSoup
+import re
 import requests
 import time
 import numpy as np
 
+USER_AGENTS = [
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_5) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/13.1.1 Safari/605.1.15",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:77.0) Gecko/20100101 Firefox/77.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/83.0.4103.97 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:77.0) Gecko/20100101 Firefox/77.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/83.0.4103.97 Safari/537.36",
+]
+
 
 def make_request(
     url: str,
@@ -26,20 +35,11 @@ def make_request(
             res.status_code: Status code from request to check if request was successful.
         """
 
-    user_agents = [
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_5) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/13.1.1 Safari/605.1.15",
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:77.0) Gecko/20100101 Firefox/77.0",
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/83.0.4103.97 Safari/537.36",
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:77.0) Gecko/20100101 Firefox/77.0",
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/83.0.4103.97 Safari/537.36",
-    ]
-
     # Control the request rate
     time.sleep(round(np.random.uniform(min_delay, max_delay)))
 
     # Pick a random user agent and set headers
-    user_agent = np.random.choice(user_agents)
-    headers = {"User-Agent": user_agent}
+    headers = random_headers()
 
     # Try/except block to execute the request and handle any exceptions
     try:
@@ -65,14 +65,43 @@ def make_request(
         return soup, status_code
 
     # Verify that the request was successful
-    if res.status_code == 200:
-        soup = BeautifulSoup(res.content, "lxml")
-    elif res.status_code == 403:
+    if res.status_code == 403:
         raise (f"A status code of {res.status_code} occured.")
-    else:
-        soup = None
 
-    return soup, res.status_code
+    return build_soup(res.content, res.status_code), res.status_code
+
+
+def random_headers():
+    """Returns request headers with a randomly selected user agent"""
+    return {"User-Agent": np.random.choice(USER_AGENTS)}
+
+
+def declared_encoding(content: bytes, default: str = "utf-8"):
+    """Returns the charset declared in the page's meta tags, the default otherwise"""
+    match = re.search(rb'<meta[^>]+charset=["\']?([\w-]+)', content[:2048], re.I)
+    return match.group(1).decode("ascii").lower() if match else default
+
+
+def build_soup(content: bytes, status_code: int, parse_only=None):
+    """Parses the raw HTML of a response. None is returned if status code is not 200.
+
+    Args:
+        content (bytes): Raw response body
+        status_code (int): Status code of the response
+        parse_only (SoupStrainer, optional): Only build the tree for the matching
+                                regions. The declared encoding is then passed on
+                                instead of sniffed.
+    """
+    if status_code == 200 and content is not None:
+        if parse_only is None:
+            return BeautifulSoup(content, "lxml")
+        return BeautifulSoup(
+            content,
+            "lxml",
+            parse_only=parse_only,
+            from_encoding=declared_encoding(content),
+        )
+    return None
 
 
 def generate_page_URL(BASE_URL: str, min_price: int, max_price: int, page_num: int):
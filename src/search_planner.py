@@ -0,0 +1,249 @@
+import re
+
+from .fetcher import AsyncFetcher
+from .scraper import generate_page_URL
+from .strainers import SEARCH_PAGE_STRAINER
+
+# Apartments.com stops paginating a search after this many pages
+PAGE_CAP = 28
+
+# A search page past the last page of results redirects
+REDIRECT_STATUS_CODES = {301, 302}
+
+
+def read_page_count(soup):
+    """Returns the number of result pages shown on a search page, None if not shown"""
+    page_range = soup.find("span", {"class": "pageRange"})
+    if page_range is not None:
+        match = re.search(r"of\s+(\d+)", page_range.get_text(strip=True))
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def read_result_count(soup):
+    """Returns the number of listings reported by a search page, if shown"""
+    for element in [soup.find("title"), soup.find("h1"), soup.find("h2")]:
+        if element is None:
+            continue
+        match = re.search(
+            r"(\d[\d,]*)\s+(?:Rentals|Apartments|Properties)",
+            element.get_text(" ", strip=True),
+        )
+        if match:
+            return int(match.group(1).replace(",", ""))
+    return None
+
+
+def read_listing_urls(soup):
+    """Returns the property URLs of every listing card on a search page"""
+    urls = []
+    for listing in soup.find_all("li", {"class": "mortar-wrapper"}):
+        link = listing.find("a", {"class": "property-link"})
+        if link is not None:
+            urls.append(link["href"])
+    return urls
+
+
+class SearchPlanner:
+    """Enumerates every listing URL of a city with as few search requests as possible
+
+    Planning starts from the whole price range as one band, so sparse
+    neighbouring price steps stay merged into a single search. The first page
+    of each band gives its page count, and the remaining pages are then
+    fetched in parallel. A band that hits the page cap is split in half and
+    each half probed again, down to min_step, so no listings are dropped.
+
+    A band whose first page shows no page count, as with single page
+    results or a changed layout, is walked one page at a time until a page
+    redirects or has no listings. Failed requests are retried through the
+    fetcher, whose rate limiter has slowed the host down after the failure,
+    and the URLs still failing afterwards are kept in failed_requests, as
+    the plan may be missing listings.
+
+    Methods:
+        plan: Returns the unique property URLs found in the price range
+    """
+
+    def __init__(
+        self,
+        fetcher: AsyncFetcher,
+        base_url: str,
+        start_price: int,
+        end_price: int,
+        price_step: int = 250,
+        min_step: int = 10,
+        partial: bool = False,
+        retries: int = 3,
+    ):
+        """Constructs the planner
+
+        Args:
+            fetcher (AsyncFetcher): Fetch engine used for the search pages.
+            base_url (str): City search URL the price range and page are appended to.
+            start_price (int): Lowest price to search.
+            end_price (int): Highest price to search.
+            price_step (int, optional): Split points are aligned to this price step
+                                    while bands are wider than it.
+            min_step (int, optional): Bands are never split below this width.
+            partial (bool, optional): Only build the HTML tree for the listing cards,
+                                    page range and headings of each search page.
+            retries (int, optional): Number of times a failed search request is retried.
+        """
+        self.fetcher = fetcher
+        self.base_url = base_url
+        self.start_price = int(start_price)
+        self.end_price = int(end_price)
+        self.price_step = int(price_step)
+        self.min_step = int(min_step)
+        self.parse_only = SEARCH_PAGE_STRAINER if partial else None
+        self.retries = retries
+        self.search_requests = 0
+        self.bands = []
+        self.truncated_bands = []
+        self.failed_requests = []
+
+    def split_band(self, min_price: int, max_price: int):
+        """Splits a band in two near its midpoint, on a price_step boundary if it can"""
+        width = max_price - min_price
+        step = self.price_step if width > self.price_step else self.min_step
+        mid_price = min_price + (width // 2 // step) * step
+        if mid_price <= min_price:
+            mid_price = min_price + width // 2
+        return [(min_price, mid_price), (mid_price, max_price)]
+
+    def fetch_pages(self, urls):
+        """Fetches search pages, retrying failed requests
+
+        A retry waits for a token of the fetcher's rate limiter like any
+        request, so it is paced by the backoff the failure caused, without
+        blocking the thread or bypassing the shared budget.
+
+        Returns:
+            dict: Parsed page of each URL fetched, None for the redirected ones.
+                    URLs still failing after every retry are left out, and
+                    added to failed_requests.
+        """
+        pages = {}
+        pending = list(urls)
+        for _ in range(self.retries + 1):
+            failed = []
+            for url, soup, res_status in self.fetcher.fetch_many(
+                pending, parse_only=self.parse_only
+            ):
+                self.search_requests += 1
+                if soup is not None:
+                    pages[url] = soup
+                elif res_status in REDIRECT_STATUS_CODES:
+                    pages[url] = None
+                else:
+                    failed.append(url)
+            pending = failed
+            if not pending:
+                break
+        self.failed_requests.extend(pending)
+        return pages
+
+    def add_band(self, min_price: int, max_price: int, pages: int, results: int):
+        if pages >= PAGE_CAP:
+            self.truncated_bands.append((min_price, max_price))
+        self.bands.append(
+            {
+                "min_price": min_price,
+                "max_price": max_price,
+                "pages": pages,
+                "results": results,
+            }
+        )
+
+    def walk_bands(self, walks: dict, property_urls: set):
+        """Fetches the pages of bands without a page count one at a time, in
+        parallel across bands, until a page redirects or has no listings
+
+        Args:
+            walks (dict): Listing count of each (min_price, max_price) band to walk
+            property_urls (set): Gets the listings found
+
+        Returns:
+            list: Bands that reached the page cap, to be split and probed again
+        """
+        split = []
+        last_pages = dict.fromkeys(walks, 1)
+        while last_pages:
+            urls = {
+                generate_page_URL(self.base_url, *band, last_page + 1): band
+                for band, last_page in last_pages.items()
+            }
+            pages = self.fetch_pages(urls)
+            next_pages = {}
+            for url, band in urls.items():
+                soup = pages.get(url)
+                listing_urls = read_listing_urls(soup) if soup is not None else []
+                property_urls.update(listing_urls)
+                page = last_pages[band] + bool(listing_urls)
+                if listing_urls and page < PAGE_CAP:
+                    next_pages[band] = page
+                elif page >= PAGE_CAP and band[1] - band[0] > self.min_step:
+                    split.extend(self.split_band(*band))
+                else:
+                    self.add_band(*band, page, walks[band])
+            last_pages = next_pages
+        return split
+
+    def plan(self):
+        property_urls = set()
+        bands = [(self.start_price, self.end_price)]
+
+        while bands:
+            # Probe the first page of every band at once
+            probes = {
+                generate_page_URL(self.base_url, min_price, max_price, 1): (
+                    min_price,
+                    max_price,
+                )
+                for min_price, max_price in bands
+            }
+            bands = []
+            page_urls = []
+            walks = {}
+            for url, soup in self.fetch_pages(probes).items():
+                # A redirect means the band has no results
+                if soup is None:
+                    continue
+                listing_urls = read_listing_urls(soup)
+                property_urls.update(listing_urls)
+
+                min_price, max_price = probes[url]
+                page_count = read_page_count(soup)
+                if page_count is None:
+                    if listing_urls:
+                        walks[(min_price, max_price)] = read_result_count(soup)
+                    continue
+                if page_count >= PAGE_CAP and max_price - min_price > self.min_step:
+                    bands.extend(self.split_band(min_price, max_price))
+                    continue
+
+                self.add_band(min_price, max_price, page_count, read_result_count(soup))
+                page_urls.extend(
+                    generate_page_URL(self.base_url, min_price, max_price, page_num)
+                    for page_num in range(2, page_count + 1)
+                )
+
+            # Then fetch the remaining pages of every finished band in parallel
+            for soup in self.fetch_pages(page_urls).values():
+                if soup is not None:
+                    property_urls.update(read_listing_urls(soup))
+            bands.extend(self.walk_bands(walks, property_urls))
+
+        for min_price, max_price in self.truncated_bands:
+            print(
+                f"The price range {min_price}-{max_price} still has {PAGE_CAP} pages,"
+                " some listings may be missing"
+            )
+        if self.failed_requests:
+            print(
+                f"{len(self.failed_requests)} search pages failed after"
+                f" {self.retries} retries, some listings may be missing"
+            )
+
+        return list(property_urls)
@@ -0,0 +1,130 @@
+import zlib
+
+import aiohttp
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class ScraperSession:
+    """Pooled keep-alive HTTP session shared by every request in a scraping run
+
+    Connections are reused across search pages, property pages and cities,
+    and responses are requested compressed. Decompression is done here rather
+    than by aiohttp so the bytes actually transferred can be counted.
+
+    Methods:
+        open: Create the connection pool on the running event loop
+        get: Request a URL and return the decoded body and status code
+        stats: Connection reuse and transfer counters
+        close: Close every pooled connection
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 16,
+        pool_size_per_host: int = 8,
+        keepalive_timeout: int = 30,
+        timeout: int = 15,
+    ):
+        """Constructs the session layer
+
+        Args:
+            pool_size (int, optional): Max number of open connections.
+            pool_size_per_host (int, optional): Max number of open connections per host.
+            keepalive_timeout (int, optional): Seconds an idle connection is kept open.
+            timeout (int, optional): Max timeout setting for each request.
+        """
+        self.pool_size = pool_size
+        self.pool_size_per_host = pool_size_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self.accept_encoding = "gzip, deflate, br" if brotli else "gzip, deflate"
+
+        self._session = None
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.bytes_wire = 0
+        self.bytes_decoded = 0
+
+    async def open(self):
+        if self._session is not None:
+            return self._session
+
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_create_end.append(self._on_connection_created)
+        trace.on_connection_reuseconn.append(self._on_connection_reused)
+
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            limit_per_host=self.pool_size_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"Accept-Encoding": self.accept_encoding},
+            auto_decompress=False,
+            trace_configs=[trace],
+        )
+        return self._session
+
+    async def _on_connection_created(self, session, context, params):
+        self.connections_created += 1
+
+    async def _on_connection_reused(self, session, context, params):
+        self.connections_reused += 1
+
+    async def get(self, url: str, headers: dict = None):
+        """Requests a URL without following redirects
+
+        Returns:
+            bytes: Decoded response body
+            int: Status code from the request
+        """
+        session = await self.open()
+        async with session.get(url, allow_redirects=False, headers=headers) as res:
+            raw = await res.read()
+            status_code = res.status
+            encoding = res.headers.get("Content-Encoding", "")
+
+        content = decode_body(raw, encoding)
+        self.requests += 1
+        self.bytes_wire += len(raw)
+        self.bytes_decoded += len(content)
+        return content, status_code
+
+    def stats(self):
+        """Returns the connection reuse and bytes-on-the-wire counters"""
+        return {
+            "requests": self.requests,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "bytes_wire": self.bytes_wire,
+            "bytes_decoded": self.bytes_decoded,
+        }
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def decode_body(raw: bytes, encoding: str):
+    """Decompresses a response body according to its Content-Encoding header"""
+    encoding = encoding.strip().lower()
+    if encoding == "gzip":
+        return zlib.decompress(raw, 16 + zlib.MAX_WBITS)
+    elif encoding == "deflate":
+        try:
+            return zlib.decompress(raw)
+        except zlib.error:
+            # Some servers send raw deflate data without the zlib header
+            return zlib.decompress(raw, -zlib.MAX_WBITS)
+    elif encoding == "br" and brotli is not None:
+        return brotli.decompress(raw)
+    return raw
@@ -0,0 +1,449 @@
+from abc import ABC, abstractmethod
+from datetime import date
+import json
+import os
+import queue
+import threading
+import time
+
+from .records import PropertyRecord, UnitRecord, as_row
+
+# Marks the end of the stream on the writer queue
+_DONE = object()
+
+
+class StorageSink(ABC):
+    """Where the properties and units of a run are stored
+
+    A sink is opened once, given batches of properties and of their units,
+    flushed whenever what was written so far has to be durable, and closed.
+    Sinks can also be used as context managers.
+
+    Methods:
+        open: Connect to the storage
+        write_properties: Store a batch of parsed property dicts or PropertyRecords
+        write_units: Store a batch of (property_name, zipcode, units), the
+                        properties having been written before
+        flush: Make everything written so far durable
+        close: Flush and disconnect
+    """
+
+    def open(self):
+        return self
+
+    @abstractmethod
+    def write_properties(self, properties: list):
+        pass
+
+    @abstractmethod
+    def write_units(self, property_units: list):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class DatabaseSink(StorageSink):
+    """Stores to a dbPostgres or dbSQLite, loading each batch with its copy methods"""
+
+    def __init__(self, connect):
+        """
+        Args:
+            connect (callable): Returns the connected database when the sink is opened
+        """
+        self.connect = connect
+        self.database = None
+
+    def open(self):
+        self.database = self.connect()
+        return self
+
+    def write_properties(self, properties: list):
+        self.database.copy_properties(properties)
+
+    def write_units(self, property_units: list):
+        self.database.copy_units(property_units)
+
+    def flush(self):
+        # Every batch is committed as it is written
+        pass
+
+    def close(self):
+        if self.database is not None:
+            self.database.close_connection()
+            self.database = None
+
+
+class PostgresSink(DatabaseSink):
+    """Stores to Postgres, borrowing the connection from a pool if given one"""
+
+    def __init__(self, pool=None, **connect_kwargs):
+        """
+        Args:
+            pool (ConnectionPool, optional): Pool to borrow the connection from.
+            connect_kwargs: Arguments of dbPostgres when there is no pool.
+        """
+        # Imported here, so the other sinks don't need psycopg2
+        from .db_postgres import dbPostgres
+
+        super().__init__(lambda: dbPostgres(pool=pool, **connect_kwargs))
+
+
+class SQLiteSink(DatabaseSink):
+    """Stores to a SQLite database file"""
+
+    def __init__(self, database: str, **kwargs):
+        from .db_sqlite import dbSQLite
+
+        super().__init__(lambda: dbSQLite(database, **kwargs))
+
+
+class FileSink(StorageSink):
+    """Appends the properties and units to JSON lines files
+
+    The files are properties.jsonl, and units.jsonl where each line is a
+    unit with its property_name and zipcode. Dates are written as YYYY-MM-DD.
+    """
+
+    def __init__(self, directory: str, prefix: str = ""):
+        """
+        Args:
+            directory (str): Directory of the files, created if needed
+            prefix (str, optional): Start of the file names, e.g. the city and date
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.files = {}
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        for name in ("properties", "units"):
+            filename = os.path.join(self.directory, f"{self.prefix}{name}.jsonl")
+            self.files[name] = open(filename, "a", encoding="utf-8")
+        return self
+
+    @staticmethod
+    def _line(row: dict):
+        return json.dumps(
+            row,
+            default=lambda value: (
+                value.isoformat() if isinstance(value, date) else str(value)
+            ),
+        )
+
+    def write_properties(self, properties: list):
+        file = self.files["properties"]
+        for property_data in properties:
+            file.write(self._line(as_row(property_data)) + "\n")
+
+    def write_units(self, property_units: list):
+        file = self.files["units"]
+        for property_name, zipcode, units in property_units:
+            for unit in units:
+                row = {"property_name": property_name, "zipcode": zipcode}
+                file.write(self._line(row | as_row(unit)) + "\n")
+
+    def flush(self):
+        for file in self.files.values():
+            file.flush()
+            os.fsync(file.fileno())
+
+    def close(self):
+        if self.files:
+            self.flush()
+            for file in self.files.values():
+                file.close()
+            self.files = {}
+
+
+class FanOutSink(StorageSink):
+    """Writes every batch to several sinks, e.g. a database and a Parquet export
+
+    The sinks are written in order, so an error in one leaves the batch
+    unwritten by the sinks after it.
+    """
+
+    def __init__(self, *sinks: StorageSink):
+        self.sinks = sinks
+
+    def open(self):
+        for sink in self.sinks:
+            sink.open()
+        return self
+
+    def write_properties(self, properties: list):
+        for sink in self.sinks:
+            sink.write_properties(properties)
+
+    def write_units(self, property_units: list):
+        for sink in self.sinks:
+            sink.write_units(property_units)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+class BackgroundWriter:
+    """Writes parsed properties to a sink in batches, on a background thread
+
+    write() only queues the property, so storage latency overlaps fetching
+    and parsing instead of adding to it. The queue is bounded, so a slow
+    sink holds back its callers rather than filling memory.
+
+    A batch is written when it reaches batch_size properties, or once the
+    oldest property of the batch has waited flush_interval seconds. Each
+    property's on_stored, or on_failed, is called on the writer thread
+    once its batch is flushed.
+
+    A failed batch is split in halves that are written again, down to
+    single properties, so only the properties that fail on their own are
+    given the error. The sinks' writes have to be safe to repeat for this,
+    as the database upserts are.
+
+    An error the writer thread can't hand to on_failed, e.g. raised by a
+    callback, stops the thread. The error is then raised by the next
+    write(), flush() or close(), rather than leaving them waiting.
+
+    Methods:
+        open: Start the writer thread and open the sink on it
+        write: Queue a property and its units
+        flush: Wait until everything queued so far is written
+        close: Write what is left, stop the thread and close the sink
+        stats: Batches and properties written, and failures
+    """
+
+    def __init__(
+        self,
+        sink: StorageSink,
+        batch_size: int = 200,
+        flush_interval: float = 2.0,
+        queue_size: int = 1000,
+        amenity_columns: tuple = None,
+    ):
+        """
+        Args:
+            sink (StorageSink): Where the properties are written
+            batch_size (int, optional): Max number of properties written at once.
+            flush_interval (float, optional): Max seconds a property waits for its
+                                    batch.
+            queue_size (int, optional): Max number of properties waiting to be written.
+            amenity_columns (tuple, optional): AmenityMatcher.columns of the parser.
+                                    Defaults to those of HTML_AMENITIES.
+        """
+        self.sink = sink
+        self.amenity_columns = amenity_columns
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.open_error = None
+        self.error = None
+        self.batches_written = 0
+        self.properties_written = 0
+        self.failed_batches = 0
+        self.failed_properties = 0
+        self.write_time = 0.0
+
+    def open(self):
+        """Starts the writer thread, which opens the sink, and waits for the sink"""
+        opened = threading.Event()
+        self.open_error = None
+        self.thread = threading.Thread(
+            target=self.run, args=(opened,), name="writer", daemon=True
+        )
+        self.thread.start()
+        opened.wait()
+        if self.open_error is not None:
+            self.thread.join()
+            self.thread = None
+            raise self.open_error
+        return self
+
+    def write(self, property_data, units: dict, on_stored=None, on_failed=None):
+        """Queues a property for the next batch
+
+        Args:
+            property_data (dict): Parsed property dict or PropertyRecord
+            units (dict): The property's units and zipcode, as returned by parse_units
+            on_stored (callable, optional): Called once the property is written
+            on_failed (callable, optional): Called with the exception if its batch fails
+        """
+        self.put((property_data, units, on_stored, on_failed))
+
+    def flush(self):
+        """Waits until everything queued before the call is written"""
+        flushed = threading.Event()
+        self.put(flushed)
+        while not flushed.wait(timeout=0.1):
+            self.check_running()
+
+    def close(self):
+        """Writes what is left and stops the thread, raising the error it stopped on"""
+        if self.thread is None:
+            return
+        try:
+            self.put(_DONE)
+        except Exception:
+            pass
+        self.thread.join()
+        self.thread = None
+        if self.error is not None:
+            raise self.error
+
+    def put(self, item):
+        """Queues an item, checking the writer thread is alive when the queue is full"""
+        while True:
+            self.check_running()
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def check_running(self):
+        if self.thread is None or not self.thread.is_alive():
+            if self.error is not None:
+                raise self.error
+            raise RuntimeError("The writer thread is not running")
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, *exc_info):
+        try:
+            self.close()
+        except Exception:
+            # Don't hide the error already being raised, often the same one
+            if exc_type is None:
+                raise
+
+    def run(self, opened: threading.Event):
+        # The sink is only used on this thread, as SQLite connections have to be
+        try:
+            self.sink.open()
+        except Exception as e:
+            self.open_error = e
+            return
+        finally:
+            opened.set()
+        try:
+            self.write_batches()
+        except Exception as e:
+            self.error = e
+        try:
+            self.sink.close()
+        except Exception as e:
+            self.error = self.error or e
+
+    def write_batches(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is None or item is _DONE or isinstance(item, threading.Event):
+                self.write_batch(batch)
+                batch, deadline = [], None
+                if item is _DONE:
+                    break
+                if item is not None:
+                    item.set()
+                continue
+
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch)
+                batch, deadline = [], None
+
+    def write_batch(self, batch: list, retry: bool = False):
+        """Writes a batch, splitting it in halves if it fails
+
+        Args:
+            batch (list): Queued (property_data, units, on_stored, on_failed)
+            retry (bool, optional): Whether the batch is half of a failed one
+        """
+        if not batch:
+            return
+        start = time.perf_counter()
+        try:
+            self.write_to_sink(batch)
+            error = None
+        except Exception as e:
+            error = e
+        finally:
+            self.write_time += time.perf_counter() - start
+
+        if error is not None:
+            if not retry:
+                self.failed_batches += 1
+            if len(batch) > 1:
+                middle = len(batch) // 2
+                self.write_batch(batch[:middle], retry=True)
+                self.write_batch(batch[middle:], retry=True)
+                return
+            self.failed_properties += 1
+            _, _, _, on_failed = batch[0]
+            if on_failed is not None:
+                on_failed(error)
+            return
+
+        self.batches_written += 1
+        self.properties_written += len(batch)
+        for _, _, on_stored, _ in batch:
+            if on_stored is not None:
+                on_stored()
+
+    def write_to_sink(self, batch: list):
+        """Converts a batch to records and writes it to the sink"""
+        # Records carry typed values, so a unit's "" rent is stored as NULL
+        properties = [
+            (
+                PropertyRecord.from_dict(property_data, self.amenity_columns)
+                if isinstance(property_data, dict)
+                else property_data
+            )
+            for property_data, *_ in batch
+        ]
+        property_units = [
+            (
+                record.property_name,
+                units["zipcode"],
+                [
+                    UnitRecord.from_dict(unit) if isinstance(unit, dict) else unit
+                    for unit in units["units"]
+                ],
+            )
+            for record, (_, units, *_) in zip(properties, batch)
+        ]
+        self.sink.write_properties(properties)
+        self.sink.write_units(property_units)
+        self.sink.flush()
+
+    def stats(self):
+        return {
+            "batches_written": self.batches_written,
+            "properties_written": self.properties_written,
+            "failed_batches": self.failed_batches,
+            "failed_properties": self.failed_properties,
+            "write_time": round(self.write_time, 3),
+        }
@@ -0,0 +1,64 @@
+from bs4 import SoupStrainer
+
+# Regions of a property page read by Property_Parser and get_all_units
+# Key = the attribute to look at, Value = the values marking a region
+PROPERTY_PAGE_REGIONS = {
+    "id": {"descriptionSection", "amenitiesSection", "uniqueFeatures"},
+    "class": {
+        "propertyName",
+        "neighborhood",
+        "stateZipContainer",
+        "feesPoliciesCard",
+        "fact",
+        "priceGridModelWrapper",
+    },
+    "property": {"place:location:latitude", "place:location:longitude"},
+    "data-tab-content-id": {"all"},
+}
+
+# Regions of a search page read by the SearchPlanner
+SEARCH_PAGE_REGIONS = {"class": {"mortar-wrapper", "pageRange"}}
+
+
+class RegionStrainer(SoupStrainer):
+    """SoupStrainer keeping only the elements that start one of a page's regions
+
+    BeautifulSoup still tokenizes the whole document, but only builds tree
+    objects for the kept elements and everything inside them, so the
+    navigation, scripts and footers around them cost no memory. A lookup
+    outside of the regions finds nothing, the same as on a page without them.
+
+    Args:
+        regions (dict): Key = an attribute, Value = the attribute values that mark
+                                a region. For the class attribute any single class
+                                matches.
+        tags (set, optional): Element names kept wherever they appear.
+    """
+
+    def __init__(self, regions: dict, tags: set = frozenset()):
+        self.regions = {attr: set(values) for attr, values in regions.items()}
+        self.tags = set(tags)
+        # The tag name callable is how older versions of BeautifulSoup filter tags
+        super().__init__(self.keep)
+
+    def keep(self, name, attrs=None):
+        if name in self.tags:
+            return True
+        for attr, values in (attrs or {}).items():
+            if attr not in self.regions:
+                continue
+            if attr == "class":
+                classes = values.split() if isinstance(values, str) else values
+                if self.regions[attr].intersection(classes):
+                    return True
+            elif values in self.regions[attr]:
+                return True
+        return False
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return self.keep(name, attrs)
+
+
+# Income restrictions are shown in an h2 heading that can be anywhere on the page
+PROPERTY_PAGE_STRAINER = RegionStrainer(PROPERTY_PAGE_REGIONS, tags={"h1", "h2"})
+SEARCH_PAGE_STRAINER = RegionStrainer(SEARCH_PAGE_REGIONS, tags={"title", "h1", "h2"})
@@ -0,0 +1,214 @@
+from contextlib import closing
+from functools import partial
+import queue
+import threading
+
+from .items import ApartmentsPipeline
+from .sinks import BackgroundWriter
+
+# Marks the end of the stream on a stage queue
+_DONE = object()
+
+
+class StreamingPipeline:
+    """Runs fetching, parsing and storage of property pages as overlapping stages
+
+    Raw pages flow from the fetcher to a parse thread, and parsed records
+    flow from there to a storage thread that writes each property as soon
+    as it is parsed. Both queues are bounded, so a slow parser or database
+    holds back the fetcher and memory stays flat however big the city is.
+
+    Methods:
+        run: Enumerate the city's listings and stream every property to storage
+    """
+
+    def __init__(self, pipeline: ApartmentsPipeline, write, queue_size: int = 32):
+        """Constructs the streaming stages around a pipeline
+
+        Args:
+            pipeline (ApartmentsPipeline): Provides the fetcher, parsers and checkpoint.
+            write (callable or BackgroundWriter): Called with (property_data, units)
+                                    for every parsed property, where units is the
+                                    dict of the property's units and zipcode. An open
+                                    BackgroundWriter stores the properties in batches,
+                                    and they are checkpointed once written.
+            queue_size (int, optional): Max number of pages or records waiting between
+                                    stages.
+        """
+        self.pipeline = pipeline
+        self.write = write
+        self.writer = write if isinstance(write, BackgroundWriter) else None
+        # The writer thread checkpoints stored properties while pages are marked fetched
+        self.checkpoint_lock = threading.Lock()
+        self.parse_queue = queue.Queue(maxsize=queue_size)
+        self.store_queue = queue.Queue(maxsize=queue_size)
+        self.parse_thread = None
+        self.store_thread = None
+        # Exceptions that stopped the parse or store stage, raised by run()
+        self.errors = []
+        self.properties_written = 0
+        self.failed_writes = 0
+
+    @staticmethod
+    def put(stage_queue: queue.Queue, item, consumer: threading.Thread):
+        """Puts an item on a bounded stage queue, unless its consuming stage stopped
+
+        Returns:
+            bool: False if the consumer stopped, the item being dropped
+        """
+        while True:
+            try:
+                stage_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if not consumer.is_alive():
+                    return False
+
+    def fetch_stage(self, urls):
+        try:
+            for url, content, res_status in self.pipeline.fetcher.fetch_many(
+                urls, raw=True
+            ):
+                # Skip pages that could not be fetched
+                if res_status != 200 or content is None:
+                    continue
+                # Stop fetching once the parse stage has failed
+                if not self.put(self.parse_queue, (url, content), self.parse_thread):
+                    break
+        finally:
+            self.put(self.parse_queue, _DONE, self.parse_thread)
+
+    def queued_pages(self):
+        """Yields the raw pages waiting in the parse queue until the stream ends"""
+        while True:
+            item = self.parse_queue.get()
+            if item is _DONE:
+                break
+            yield item
+
+    def parse_stage(self):
+        try:
+            with closing(self.pipeline.parse_pages(self.queued_pages())) as results:
+                for url, property_data, units, error in results:
+                    if error is not None:
+                        print(
+                            f"The exception, {error}, occurred at the following "
+                            f"URL: {url}"
+                        )
+                    item = (url, property_data, units)
+                    if not self.put(self.store_queue, item, self.store_thread):
+                        break
+        except Exception as e:
+            # e.g. a broken worker pool, the pages left are fetched again on resume
+            self.errors.append(e)
+        finally:
+            self.put(self.store_queue, _DONE, self.store_thread)
+
+    def store_stage(self):
+        checkpoint = self.pipeline.checkpoint
+        try:
+            self.store_items()
+        except Exception as e:
+            self.errors.append(e)
+        finally:
+            # The writer's callbacks append to the checkpoint, so it is only
+            # closed once everything queued is written, even on the error path
+            if self.writer is not None:
+                try:
+                    self.writer.flush()
+                except Exception as e:
+                    if e not in self.errors:
+                        self.errors.append(e)
+            with self.checkpoint_lock:
+                checkpoint.close()
+
+    def store_items(self):
+        checkpoint = self.pipeline.checkpoint
+        while True:
+            item = self.store_queue.get()
+            if item is _DONE:
+                break
+
+            url, property_data, units = item
+            if property_data is None:
+                with self.checkpoint_lock:
+                    checkpoint.mark_fetched(url)
+                continue
+            if self.writer is not None:
+                self.writer.write(
+                    property_data,
+                    units,
+                    on_stored=partial(self.stored, url, property_data, units),
+                    on_failed=partial(self.failed, url),
+                )
+                continue
+            try:
+                self.write(property_data, units)
+            except Exception as e:
+                self.failed(url, e)
+                continue
+            self.stored(url, property_data, units)
+
+    def stored(self, url: str, property_data: dict, units: dict):
+        with self.checkpoint_lock:
+            self.pipeline.checkpoint.record(url, property_data, units)
+            self.properties_written += 1
+
+    def failed(self, url: str, error: Exception):
+        # Not checkpointed, so the page is fetched again on resume
+        print(f"The exception, {error}, occurred while storing: {url}")
+        with self.checkpoint_lock:
+            self.failed_writes += 1
+
+    def run(self, resume: bool = False):
+        pipeline = self.pipeline
+        print("Begin scraping...")
+        # Stored records are not needed again, only the frontier and fetched URLs
+        if resume and pipeline.checkpoint.load(load_records=False):
+            pipeline.property_urls = pipeline.checkpoint.frontier
+            print(
+                f"Resuming with {len(pipeline.checkpoint.fetched)} property pages "
+                "already fetched"
+            )
+        else:
+            pipeline.get_property_urls()
+        print(f"The total number of listings is {len(pipeline.property_urls)}")
+
+        remaining_urls = [
+            url
+            for url in pipeline.property_urls
+            if url not in pipeline.checkpoint.fetched
+        ]
+        self.parse_thread = threading.Thread(
+            target=self.parse_stage, name="parse", daemon=True
+        )
+        self.store_thread = threading.Thread(
+            target=self.store_stage, name="store", daemon=True
+        )
+        for worker in [self.parse_thread, self.store_thread]:
+            worker.start()
+        self.fetch_stage(remaining_urls)
+        for worker in [self.parse_thread, self.store_thread]:
+            worker.join()
+
+        print(f"Done, {self.properties_written} properties stored")
+        print(f"Session stats: {pipeline.fetcher.stats()}")
+        print(f"Field sources: {pipeline.page_parser.source_stats()}")
+        print(f"Unit layouts: {dict(pipeline.page_parser.layout_fingerprints)}")
+        print(f"Date cache: {pipeline.dates.stats()}")
+        if self.writer is not None:
+            print(f"Writer stats: {self.writer.stats()}")
+        if pipeline.owns_fetcher:
+            pipeline.fetcher.close()
+
+        # The checkpoint is kept, so the run can be resumed once fixed
+        if self.errors:
+            raise self.errors[0]
+
+        # Keep the checkpoint if some properties still have to be stored on resume
+        if self.failed_writes == 0:
+            pipeline.checkpoint.clear()
+        else:
+            print(
+                f"{self.failed_writes} properties failed to store, rerun with --resume"
+            )
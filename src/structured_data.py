@@ -0,0 +1,129 @@
+import json
+import re
+
+from .scraper import declared_encoding
+
+# Property location fields, in the order the DOM parser stores them
+LOCATION_FIELDS = ("latitude", "longitude", "neighborhood", "zipcode")
+
+# Unit fields that can be read from the structured data
+UNIT_FIELDS = ("rent", "beds", "baths", "sqft", "date_available")
+
+_LD_JSON = re.compile(rb"<script[^>]+type=[\"']?application/ld\+json[\"']?[^>]*>", re.I)
+_DECODER = json.JSONDecoder()
+
+
+def json_ld_blocks(content: bytes):
+    """Yields the decoded JSON-LD blocks of a raw page
+
+    The page is scanned for the script tags without building any HTML tree,
+    and only the JSON value at the start of each block is decoded.
+    """
+    encoding = None
+    for match in _LD_JSON.finditer(content):
+        end = content.find(b"</script", match.end())
+        if end == -1:
+            end = len(content)
+        if encoding is None:
+            encoding = declared_encoding(content)
+        block = content[match.end() : end].decode(encoding, errors="replace")
+        try:
+            value, _ = _DECODER.raw_decode(block.strip())
+        except ValueError:
+            continue
+        yield value
+
+
+def json_nodes(value):
+    """Yields every JSON object of a block, including those of an @graph list"""
+    if isinstance(value, list):
+        for item in value:
+            yield from json_nodes(item)
+    elif isinstance(value, dict):
+        yield value
+        yield from json_nodes(value.get("@graph"))
+
+
+def as_text(value):
+    """Renders a JSON value the way the same value is written on the page"""
+    if isinstance(value, dict):
+        value = value.get("value")
+    if value is None or value == "":
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def read_location(node: dict):
+    """Reads the location fields of a property node"""
+    geo = node.get("geo") or {}
+    address = node.get("address") or {}
+    contained_in = node.get("containedInPlace") or {}
+    zipcode = as_text(address.get("postalCode") if isinstance(address, dict) else None)
+    return {
+        "latitude": as_text(geo.get("latitude")),
+        "longitude": as_text(geo.get("longitude")),
+        "neighborhood": (
+            as_text(contained_in.get("name"))
+            if isinstance(contained_in, dict)
+            else None
+        ),
+        "zipcode": re.sub(r"[\D]", "", zipcode) if zipcode is not None else None,
+    }
+
+
+def read_unit(node: dict):
+    """Reads the unit fields of an accommodation node, as the DOM parser finds them"""
+    offers = node.get("offers") or {}
+    if isinstance(offers, list):
+        offers = offers[0] if offers else {}
+
+    rent = as_text(offers.get("price"))
+    low, high = as_text(offers.get("lowPrice")), as_text(offers.get("highPrice"))
+    if rent is None and low is not None:
+        # Ranges are written with an en dash, like the pricing column
+        rent = low if high is None or high == low else f"{low}–{high}"
+
+    available = as_text(offers.get("availabilityStarts"))
+    return {
+        "rent": rent,
+        "beds": as_text(node.get("numberOfBedrooms")),
+        "baths": as_text(
+            node.get("numberOfBathroomsTotal", node.get("numberOfFullBathrooms"))
+        ),
+        "sqft": as_text(node.get("floorSize")),
+        "date_available": available[:10] if available is not None else None,
+    }
+
+
+class StructuredData:
+    """Property location and unit details read from the JSON-LD blocks of a page
+
+    The structured data is cheaper to read and less likely to change than
+    the page layout, so it is used first and the DOM parsers only fill in
+    the fields it is missing.
+
+    Attributes:
+        location (dict): The LOCATION_FIELDS, None where the page doesn't give them
+        units (dict): The UNIT_FIELDS of each unit, by unit label
+    """
+
+    def __init__(self, location: dict = None, units: dict = None):
+        self.location = location or dict.fromkeys(LOCATION_FIELDS)
+        self.units = units or {}
+
+    @classmethod
+    def from_html(cls, content: bytes):
+        """Reads the first property described by the page's JSON-LD"""
+        for block in json_ld_blocks(content):
+            for node in json_nodes(block):
+                if "geo" not in node and "address" not in node:
+                    continue
+                units = {}
+                for unit in json_nodes(node.get("containsPlace")):
+                    label = as_text(unit.get("name"))
+                    if label is not None:
+                        units.setdefault(label, read_unit(unit))
+                return cls(read_location(node), units)
+        return cls()
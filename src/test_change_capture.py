@@ -0,0 +1,194 @@
+# %%
+from datetime import date
+import sqlite3
+
+import pytest
+
+from src.change_capture import ChangeCaptureSink
+from src.formatting import DateNormalizer
+from src.property_parser import DEFAULT_AMENITY_MATCHER
+from src.records import PropertyRecord, UnitRecord
+from src.sinks import SQLiteSink
+
+
+def property_record(name: str, year_built: str = "1990"):
+    property_data = {"property_name": name}
+    property_data |= dict.fromkeys(DEFAULT_AMENITY_MATCHER.columns, False)
+    property_data |= {
+        "latitude": "40.1",
+        "longitude": "-74.2",
+        "neighborhood": "Midtown",
+        "zipcode": "10001",
+        "description": "",
+        "unique_features": "",
+        "year_built": year_built,
+        "property_url": f"https://www.apartments.com/{name}/",
+        "city_name": "New York",
+    }
+    return PropertyRecord.from_dict(property_data)
+
+
+def unit(label: str, rent: int, scraped: str):
+    return UnitRecord.from_dict(
+        {
+            "unit_label": label,
+            "rent": rent,
+            "beds": "1",
+            "baths": "1",
+            "sqft": 700,
+            "date_available": "2025-12-20",
+            "date_scraped": scraped,
+        }
+    )
+
+
+def capture(database: str, today: date, properties: dict, listed_urls: set):
+    sink = ChangeCaptureSink(SQLiteSink(database), "New York", today=today)
+    with sink:
+        sink.write_properties([record for record, _ in properties.values()])
+        sink.write_units(
+            [(name, "10001", units) for name, (_, units) in properties.items()]
+        )
+        sink.listed_urls = listed_urls
+    return sink.stats()
+
+
+def test_change_capture(tmp_path):
+    database = str(tmp_path / "apartments.db")
+    first = capture(
+        database,
+        date(2025, 12, 20),
+        {
+            "a": (property_record("a"), [unit("101", 2000, "2025-12-20")]),
+            "b": (
+                property_record("b"),
+                [unit("101", 2500, "2025-12-20"), unit("102", 2600, "2025-12-20")],
+            ),
+        },
+        listed_urls=set(),
+    )
+    assert first == {"new properties": 2, "insert": 3}
+
+    # a is no longer listed, b's 101 has a new rent and its 102 is gone, c is new
+    second = capture(
+        database,
+        date(2025, 12, 21),
+        {
+            "b": (
+                property_record("b"),
+                [unit("101", 2400, "2025-12-21")],
+            ),
+            "c": (property_record("c", "2020"), [unit("101", 3000, "2025-12-21")]),
+        },
+        listed_urls={"https://www.apartments.com/b/", "https://www.apartments.com/c/"},
+    )
+    assert second == {
+        "unchanged properties": 1,
+        "new properties": 1,
+        "change": 1,
+        "delist": 2,
+        "insert": 1,
+    }
+
+    conn = sqlite3.connect(database)
+    events = conn.execute(
+        """SELECT p.property_name, e.unit_label, e.event_type, e.rent, e.date_scraped
+            FROM unit_events e JOIN properties p USING (property_id)
+            WHERE e.date_scraped = '2025-12-21'
+            ORDER BY e.event_id"""
+    ).fetchall()
+    assert events == [
+        ("b", "101", "change", 2400, "2025-12-21"),
+        ("b", "102", "delist", None, "2025-12-21"),
+        ("c", "101", "insert", 3000, "2025-12-21"),
+        ("a", "101", "delist", None, "2025-12-21"),
+    ]
+    assert conn.execute("SELECT count(*) FROM units").fetchone() == (0,)
+    conn.close()
+
+    # Nothing changed, so nothing is written
+    third = capture(
+        database,
+        date(2025, 12, 22),
+        {"b": (property_record("b"), [unit("101", 2400, "2025-12-22")])},
+        listed_urls={"https://www.apartments.com/b/", "https://www.apartments.com/c/"},
+    )
+    assert third == {"unchanged properties": 1, "unchanged": 1}
+
+
+def test_available_now_is_unchanged(tmp_path):
+    database = str(tmp_path / "apartments.db")
+    stats = []
+    for today, date_available in (
+        (date(2025, 12, 20), "Available Now"),
+        (date(2025, 12, 21), "Available Now"),
+        # A past date is available now too
+        (date(2025, 12, 22), "Dec 21"),
+        (date(2025, 12, 23), "Jan 15"),
+    ):
+        dates = DateNormalizer(today)
+        available = UnitRecord.from_dict(
+            {
+                "unit_label": "101",
+                "rent": 2000,
+                "beds": "1",
+                "baths": "1",
+                "sqft": 700,
+                "date_available": dates.normalize(date_available),
+                "date_scraped": dates.today_string,
+            }
+        )
+        stats.append(
+            capture(database, today, {"a": (property_record("a"), [available])}, None)
+        )
+    assert [{k: v for k, v in s.items() if "properties" not in k} for s in stats] == [
+        {"insert": 1},
+        {"unchanged": 1},
+        {"unchanged": 1},
+        {"change": 1},
+    ]
+
+
+def test_no_delisting_after_a_broken_search(tmp_path):
+    database = str(tmp_path / "apartments.db")
+    properties = {
+        name: (property_record(name), [unit("101", 2000, "2025-12-20")])
+        for name in "abcd"
+    }
+    capture(database, date(2025, 12, 20), properties, listed_urls=set())
+
+    # Only one of the four stored properties was found by the search
+    stats = capture(
+        database,
+        date(2025, 12, 21),
+        {"a": (property_record("a"), [unit("101", 2000, "2025-12-21")])},
+        listed_urls={"https://www.apartments.com/a/"},
+    )
+    assert "delist" not in stats
+
+
+def test_failed_write_is_retried(tmp_path, monkeypatch):
+    database = str(tmp_path / "apartments.db")
+    sink = ChangeCaptureSink(SQLiteSink(database), "New York", today=date(2025, 12, 20))
+    units = [("a", "10001", [unit("101", 2000, "2025-12-20")])]
+    with sink:
+        sink.write_properties([property_record("a")])
+        write_unit_events = sink.sink.database.write_unit_events
+
+        def broken_write(events):
+            raise sqlite3.OperationalError("database is locked")
+
+        monkeypatch.setattr(sink.sink.database, "write_unit_events", broken_write)
+        with pytest.raises(sqlite3.OperationalError):
+            sink.write_units(units)
+        assert sink.stats() == {"new properties": 1}
+
+        # The retry still finds the unit new, rather than taken as stored
+        monkeypatch.setattr(sink.sink.database, "write_unit_events", write_unit_events)
+        sink.write_units(units)
+    assert sink.stats() == {"new properties": 1, "insert": 1}
+    conn = sqlite3.connect(database)
+    assert conn.execute("SELECT event_type FROM unit_events").fetchall() == [
+        ("insert",)
+    ]
+    conn.close()
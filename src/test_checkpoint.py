@@ -0,0 +1,67 @@
+# %%
+import json
+import os
+
+from src.checkpoint import Checkpoint
+
+URLS = [f"https://www.apartments.com/property-{i}/" for i in range(3)]
+
+
+def record(url: str):
+    return {"property_name": url, "property_url": url}, {
+        "units": [],
+        "zipcode": "10001",
+    }
+
+
+def test_resume(tmp_path):
+    checkpoint = Checkpoint("New York", str(tmp_path), sync_every=1)
+    checkpoint.save_frontier(URLS)
+    checkpoint.record(URLS[0], *record(URLS[0]))
+    checkpoint.mark_fetched(URLS[1])
+    checkpoint.close()
+
+    resumed = Checkpoint("New York", str(tmp_path))
+    assert resumed.load()
+    assert resumed.frontier == URLS
+    assert resumed.fetched == {URLS[0], URLS[1]}
+    assert [r["property"]["property_url"] for r in resumed.records] == [URLS[0]]
+
+    # Stored records don't have to be read back
+    assert resumed.load(load_records=False) and resumed.records == []
+
+
+def test_torn_last_line(tmp_path):
+    checkpoint = Checkpoint("New York", str(tmp_path), sync_every=1)
+    checkpoint.save_frontier(URLS)
+    checkpoint.record(URLS[0], *record(URLS[0]))
+    checkpoint.close()
+
+    # A crash in the middle of the next record leaves half a line
+    line = json.dumps({"property": record(URLS[1])[0]})
+    with open(os.path.join(checkpoint.path, "records.jsonl"), "a") as file:
+        file.write(line[: len(line) // 2])
+    with open(os.path.join(checkpoint.path, "fetched.txt"), "a") as file:
+        file.write(URLS[1][:10])
+
+    resumed = Checkpoint("New York", str(tmp_path), sync_every=1)
+    assert resumed.load()
+    assert resumed.fetched == {URLS[0]}
+    assert len(resumed.records) == 1
+
+    # Appending after the torn line starts a new line, so later records load
+    resumed.record(URLS[2], *record(URLS[2]))
+    resumed.close()
+    reloaded = Checkpoint("New York", str(tmp_path))
+    assert reloaded.load()
+    assert reloaded.fetched == {URLS[0], URLS[2]}
+    assert len(reloaded.records) == 2
+
+
+def test_clear(tmp_path):
+    checkpoint = Checkpoint("New York", str(tmp_path))
+    assert not checkpoint.load()
+    checkpoint.save_frontier(URLS)
+    checkpoint.record(URLS[0], *record(URLS[0]))
+    checkpoint.clear()
+    assert not Checkpoint("New York", str(tmp_path)).load()
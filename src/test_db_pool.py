@@ -0,0 +1,100 @@
+# %%
+import threading
+import time
+
+import pytest
+from psycopg2.pool import PoolError
+
+from src import db_pool
+from src.db_pool import ConnectionPool
+
+
+class FakeConnectionPool:
+    """Stands in for psycopg2's ThreadedConnectionPool, without a server"""
+
+    def __init__(self, min_size: int, max_size: int, **connect_kwargs):
+        self.max_size = max_size
+        self.connections = 0
+        self.idle = []
+
+    def getconn(self):
+        if self.idle:
+            return self.idle.pop()
+        if self.connections >= self.max_size:
+            raise PoolError("connection pool exhausted")
+        self.connections += 1
+        return object()
+
+    def putconn(self, conn, close: bool = False):
+        self.idle.append(conn)
+
+    def closeall(self):
+        self.idle = []
+
+
+@pytest.fixture
+def connection_pool(monkeypatch):
+    monkeypatch.setattr(db_pool.pool, "ThreadedConnectionPool", FakeConnectionPool)
+    connection_pool = ConnectionPool(min_size=1, max_size=2)
+    yield connection_pool
+    connection_pool.close()
+
+
+def test_exhausted_pool_waits(connection_pool):
+    first = connection_pool.getconn()
+    second = connection_pool.getconn()
+    assert connection_pool.stats()["in_use"] == 2
+
+    # A bare psycopg2 pool would raise at once, this one waits for the timeout
+    start = time.perf_counter()
+    with pytest.raises(PoolError):
+        connection_pool.getconn(timeout=0.05)
+    assert time.perf_counter() - start >= 0.05
+
+    # A waiting writer gets the connection given back
+    borrowed = []
+    waiter = threading.Thread(
+        target=lambda: borrowed.append(connection_pool.getconn(timeout=5))
+    )
+    waiter.start()
+    time.sleep(0.05)
+    assert borrowed == []
+    connection_pool.putconn(first)
+    waiter.join()
+    assert borrowed == [first]
+
+    stats = connection_pool.stats()
+    assert stats["checkouts"] == 3
+    assert stats["waits"] == 1
+    assert stats["peak_in_use"] == 2
+    connection_pool.putconn(second)
+    connection_pool.putconn(borrowed[0])
+    assert connection_pool.stats()["in_use"] == 0
+
+
+def test_connection_context(connection_pool):
+    with connection_pool.connection() as conn:
+        assert connection_pool.stats()["in_use"] == 1
+    assert connection_pool.stats()["in_use"] == 0
+    # The connection is reused rather than opened again
+    with connection_pool.connection() as again:
+        assert again is conn
+
+
+def test_setup_once(connection_pool):
+    calls = []
+
+    def setup():
+        time.sleep(0.02)
+        calls.append(1)
+
+    writers = [
+        threading.Thread(target=connection_pool.setup_once, args=(setup,))
+        for _ in range(4)
+    ]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    assert calls == [1]
+    assert connection_pool.is_setup
@@ -0,0 +1,235 @@
+#%%
+import os
+from datetime import date, timedelta
+
+import psycopg2
+import pytest
+
+from src import db_postgres
+from src.db_postgres import copy_buffer, dbPostgres
+from src.property_parser import DEFAULT_AMENITY_MATCHER
+from src.records import PropertyRecord
+from src.unit_store import UnitStore
+
+
+def test_copy_buffer():
+    rows = [
+        ["The Lofts", True, None, float("nan"), date(2025, 12, 20), 1275.5],
+        ["Tab\tand\nnew line \\", False, 0, 1.5, None, 1250],
+    ]
+    assert copy_buffer(rows).read() == (
+        "The Lofts\tt\t\\N\t\\N\t2025-12-20\t1275.5\n"
+        "Tab\\tand\\nnew line \\\\\tf\t0\t1.5\t\\N\t1250\n"
+    )
+
+
+# Database the integration tests empty and load, they are skipped without a server
+TEST_DATABASE = {
+    "host": os.environ.get("APARTMENTS_TEST_HOST", "localhost"),
+    "dbname": os.environ.get("APARTMENTS_TEST_DB", "apartments_test"),
+    "user": os.environ.get("APARTMENTS_TEST_USER", "postgres"),
+    "password": os.environ.get("APARTMENTS_TEST_PASSWORD", "postgres"),
+    "port": int(os.environ.get("APARTMENTS_TEST_PORT", 5432)),
+}
+
+
+@pytest.fixture
+def connection():
+    """A connection to the test database, emptied first"""
+    try:
+        conn = psycopg2.connect(**TEST_DATABASE)
+    except psycopg2.OperationalError:
+        pytest.skip("No Postgres server to test against")
+    with conn.cursor() as cur:
+        cur.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def database(connection):
+    database = dbPostgres(**TEST_DATABASE)
+    yield database
+    database.close_connection()
+
+
+def query(conn, statement: str, parameters=None):
+    with conn.cursor() as cur:
+        cur.execute(statement, parameters)
+        rows = cur.fetchall()
+    conn.commit()
+    return rows
+
+
+def property_dict(property_name: str, zipcode: str, neighborhood: str = "Midtown"):
+    property_data = {"property_name": property_name}
+    property_data |= {
+        column: index % 2 == 0
+        for index, column in enumerate(DEFAULT_AMENITY_MATCHER.columns)
+    }
+    property_data |= {
+        "latitude": "40.1",
+        "longitude": "-74.2",
+        "neighborhood": neighborhood,
+        "zipcode": zipcode,
+        "description": "Tabs\tand\nnew lines \\",
+        "unique_features": "",
+        "year_built": "1999",
+        "property_url": f"https://www.apartments.com/{zipcode}/",
+        "city_name": "New York",
+    }
+    return property_data
+
+
+def unit_dict(unit_label: str, rent):
+    return {
+        "unit_label": unit_label,
+        "rent": rent,
+        "beds": "1",
+        "baths": "1.5",
+        "sqft": 700,
+        "date_available": date.today().isoformat(),
+        "date_scraped": date.today().isoformat(),
+    }
+
+
+def stored_rows(database):
+    """The stored properties and units, without the ids given by the sequence"""
+    cur = database.conn.cursor()
+    cur.execute("""SELECT * FROM properties ORDER BY property_name, zipcode""")
+    names = [column.name for column in cur.description]
+    properties = [
+        {name: value for name, value in zip(names, row) if name != "property_id"}
+        for row in cur
+    ]
+    cur.execute(
+        """SELECT p.property_name, p.zipcode, u.unit_label, u.rent, u.beds, u.baths,
+                u.sqft, u.date_available, u.date_scraped
+            FROM units u JOIN properties p USING (property_id)
+            ORDER BY p.property_name, u.unit_label"""
+    )
+    units = cur.fetchall()
+    database.conn.commit()
+    cur.close()
+    return properties, units
+
+
+def test_copy_load_matches_inserts(database):
+    columns = DEFAULT_AMENITY_MATCHER.columns
+    properties = [
+        property_dict("The Lofts", "10001", "Chelsea"),
+        PropertyRecord.from_dict(property_dict("The Yard", "10003"), columns),
+        # Scraped twice in the run, the last one is kept
+        property_dict("The Lofts", "10001"),
+    ]
+    units = UnitStore()
+    units.add_property("The Lofts", "10001", [unit_dict("101", 1250.5)])
+    units.add_property(
+        "The Yard", "10003", [unit_dict("1", 2000), unit_dict("2", None)]
+    )
+    # Units of a property that wasn't stored are skipped
+    units.add_property("Missing", "10009", [unit_dict("1", 900)])
+
+    database.insert_properties(properties)
+    database.insert_unit_store(units)
+    expected = stored_rows(database)
+    assert len(expected[0]) == 2 and len(expected[1]) == 3
+
+    cur = database.conn.cursor()
+    cur.execute("TRUNCATE units, properties RESTART IDENTITY CASCADE")
+    database.conn.commit()
+    cur.close()
+    database.property_ids.clear()
+
+    assert database.bulk_load(properties, units) == (2, 3)
+    assert stored_rows(database) == expected
+    # Loading again updates the properties and skips the stored units
+    assert database.bulk_load(properties, units) == (2, 0)
+    assert stored_rows(database) == expected
+
+
+# The tables of a database created before the migrations
+OLD_TABLES = """CREATE TABLE properties (
+                property_id SERIAL PRIMARY KEY,
+                property_name text NOT NULL,
+                city_name text NOT NULL,
+                zipcode text NOT NULL,
+                CONSTRAINT name_zipcode_uc UNIQUE(property_name, zipcode)
+                );
+            CREATE TABLE units (
+                unit_id SERIAL PRIMARY KEY,
+                unit_label text,
+                rent int,
+                beds int,
+                baths real,
+                sqft real,
+                date_available date,
+                date_scraped date,
+                property_id int NOT NULL,
+                FOREIGN KEY(property_id) REFERENCES properties(property_id),
+                UNIQUE(property_id, unit_label, beds, baths, sqft, date_scraped)
+                );
+            INSERT INTO properties (property_name, city_name, zipcode)
+                VALUES ('The Lofts', 'New York', '10001');
+            INSERT INTO units (unit_label, rent, date_scraped, property_id)
+                VALUES ('101', 1250, '2025-11-03', 1),
+                       ('101', 1300, '2025-12-20', 1),
+                       ('102', 900, NULL, 1);"""
+
+
+def test_migrate_old_units(connection):
+    with connection.cursor() as cur:
+        cur.execute(OLD_TABLES)
+    connection.commit()
+
+    database = dbPostgres(**TEST_DATABASE)
+    assert query(connection, "SELECT version FROM schema_migrations") == [
+        (1,),
+        (2,),
+        (3,),
+        (4,),
+    ]
+    assert query(
+        connection, "SELECT relkind FROM pg_class WHERE relname = 'units'"
+    ) == [("p",)]
+    # The rows keep their ids, and are in the partition of their month
+    assert (
+        query(
+            connection,
+            """SELECT unit_id, rent, tableoid::regclass::text,
+                date_scraped = '-infinity'
+            FROM units ORDER BY unit_id""",
+        )
+        == [
+            (1, 1250, "units_2025_11", False),
+            (2, 1300, "units_2025_12", False),
+            (3, 900, "units_default", True),
+        ]
+    )
+    # New units are numbered after them
+    database.copy_units([("The Lofts", "10001", [unit_dict("101", 1400)])])
+    assert query(connection, "SELECT max(unit_id) FROM units") == [(4,)]
+    database.close_connection()
+
+
+def test_partition_takes_default_rows(database):
+    database.copy_properties([property_dict("The Lofts", "10001")])
+    # Past the partitions created ahead, so stored in the default partition
+    later = date.today() + timedelta(days=100)
+    unit = unit_dict("101", 1250) | {"date_scraped": later}
+    database.copy_units([("The Lofts", "10001", [unit])])
+    location = "SELECT tableoid::regclass::text FROM units"
+    assert query(database.conn, location) == [("units_default",)]
+
+    database.create_partitions_and_views(months_ahead=4)
+    assert query(database.conn, location) == [(f"units_{later:%Y_%m}",)]
+
+
+def test_failed_migration_raises(connection, monkeypatch):
+    broken = (5, ["ALTER TABLE missing ADD COLUMN broken int"])
+    monkeypatch.setattr(db_postgres, "MIGRATIONS", db_postgres.MIGRATIONS + [broken])
+    with pytest.raises(psycopg2.errors.UndefinedTable):
+        dbPostgres(**TEST_DATABASE)
+    # The migrations before it stay applied
+    assert query(connection, "SELECT max(version) FROM schema_migrations") == [(4,)]
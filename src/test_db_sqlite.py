@@ -0,0 +1,97 @@
+# %%
+import sqlite3
+
+import pytest
+
+from src.db_sqlite import dbSQLite
+from src.property_parser import DEFAULT_AMENITY_MATCHER
+from src.records import PropertyRecord
+from src.unit_store import UnitStore
+
+
+def build_property(name: str, zipcode: str):
+    property_data = {"property_name": name}
+    property_data |= dict.fromkeys(DEFAULT_AMENITY_MATCHER.columns, True)
+    property_data |= {
+        "latitude": "40.1",
+        "longitude": "-74.2",
+        "neighborhood": "Midtown",
+        "zipcode": zipcode,
+        "description": "",
+        "unique_features": "",
+        "year_built": "1999",
+        "property_url": "https://www.apartments.com/",
+        "city_name": "New York",
+    }
+    return PropertyRecord.from_dict(property_data)
+
+
+UNIT = {
+    "unit_label": "101",
+    "rent": 1250,
+    "beds": "1",
+    "baths": "1.5",
+    "sqft": 700,
+    "date_available": "2025-12-20",
+    "date_scraped": "2025-12-20",
+}
+
+
+def test_sqlite_backend(tmp_path):
+    database = dbSQLite(str(tmp_path / "apartments.db"))
+    assert database.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    properties = [
+        build_property("Joe's Lofts", "10001"),
+        build_property("The Yard", "10002"),
+    ]
+    units = UnitStore()
+    units.add_property("Joe's Lofts", "10001", [UNIT, {**UNIT, "unit_label": "102"}])
+    units.add_property("The Yard", "10002", [UNIT])
+    units.add_property("Not Stored", "10003", [UNIT])
+    assert database.bulk_load(properties, units) == (2, 3)
+    # Loading the same run again stores nothing new
+    assert database.bulk_load(properties, units) == (2, 0)
+    database.insert_units([UNIT], "Joe's Lofts", "10001")
+    database.close_connection()
+
+    database = dbSQLite(str(tmp_path / "apartments.db"))
+    assert set(database.property_ids) == {
+        ("Joe's Lofts", "10001"),
+        ("The Yard", "10002"),
+    }
+    rows = database.conn.execute(
+        """SELECT p.property_name, u.unit_label, u.rent, u.beds, u.date_available
+            FROM units u JOIN properties p USING (property_id)
+            ORDER BY u.unit_id"""
+    ).fetchall()
+    assert rows == [
+        ("Joe's Lofts", "101", 1250, 1, "2025-12-20"),
+        ("Joe's Lofts", "102", 1250, 1, "2025-12-20"),
+        ("The Yard", "101", 1250, 1, "2025-12-20"),
+    ]
+    database.close_connection()
+
+
+def test_upsert_updates_stored_properties(tmp_path):
+    database = dbSQLite(str(tmp_path / "apartments.db"))
+    database.insert_properties([build_property("Joe's Lofts", "10001")])
+
+    moved = build_property("Joe's Lofts", "10001").as_dict()
+    moved |= {
+        "year_built": 2005,
+        "dishwasher": False,
+        "property_url": "https://www.apartments.com/joes-lofts/",
+    }
+    database.insert_properties([moved])
+    assert database.conn.execute(
+        "SELECT year_built, dishwasher, property_url FROM properties"
+    ).fetchall() == [(2005, 0, "https://www.apartments.com/joes-lofts/")]
+
+    # A failing batch is rolled back and raised, not printed
+    broken = build_property("The Yard", "10002")
+    broken.city_name = None
+    with pytest.raises(sqlite3.IntegrityError):
+        database.insert_properties([build_property("Elm House", "10003"), broken])
+    assert database.conn.execute("SELECT COUNT(*) FROM properties").fetchone() == (1,)
+    database.close_connection()
@@ -0,0 +1,98 @@
+# %%
+import asyncio
+
+from src.fetcher import AsyncFetcher
+from src.rate_limiter import AdaptiveRateLimiter
+
+
+class FakeSession:
+    """Answers every URL after a short delay, recording the requests in flight"""
+
+    def __init__(self, delay: float = 0.01, fail: set = ()):
+        self.delay = delay
+        self.fail = set(fail)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requested = []
+
+    async def get(self, url: str, headers: dict = None):
+        self.requested.append(url)
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if url in self.fail:
+                raise ConnectionError("reset by peer")
+            return f"<html><title>{url}</title></html>".encode(), 200
+        finally:
+            self.in_flight -= 1
+
+    def stats(self):
+        return {"requests": len(self.requested)}
+
+    async def close(self):
+        pass
+
+
+def unlimited():
+    return AdaptiveRateLimiter(
+        requests_per_second=1000, global_requests_per_second=1000, jitter=0
+    )
+
+
+def test_fetch_many():
+    session = FakeSession()
+    urls = [f"https://www.apartments.com/property-{i}/" for i in range(40)]
+    with AsyncFetcher(
+        max_in_flight=4, session=session, rate_limiter=unlimited()
+    ) as fetcher:
+        results = list(fetcher.fetch_many(urls, raw=True))
+
+    assert sorted(url for url, _, _ in results) == sorted(urls)
+    assert all(status == 200 for _, _, status in results)
+    assert all(
+        content == f"<html><title>{url}</title></html>".encode()
+        for url, content, _ in results
+    )
+    # Never more requests in flight than allowed
+    assert 1 < session.peak_in_flight <= 4
+
+
+def test_fetch_failure():
+    url = "https://www.apartments.com/property-0/"
+    limiter = unlimited()
+    with AsyncFetcher(session=FakeSession(fail={url}), rate_limiter=limiter) as fetcher:
+        soup, status = fetcher.fetch(url)
+        assert (soup, status) == (None, 404)
+        # A failed request counts as throttling
+        assert limiter.stats()["www.apartments.com"]["throttled"] == 1
+
+        soup, status = fetcher.fetch("https://www.apartments.com/property-1/")
+        assert status == 200
+        assert soup.title.text == "https://www.apartments.com/property-1/"
+
+
+class SlowHostLimiter(AdaptiveRateLimiter):
+    """Makes the requests to one host wait a while for their token"""
+
+    def __init__(self, slow_host: str):
+        super().__init__(
+            requests_per_second=1000, global_requests_per_second=1000, jitter=0
+        )
+        self.slow_host = slow_host
+
+    async def acquire(self, url: str):
+        if self.slow_host in url:
+            await asyncio.sleep(0.5)
+
+
+def test_rate_limit_wait_holds_no_slot():
+    session = FakeSession()
+    slow = "https://slow.example.com/"
+    fast = [f"https://www.apartments.com/property-{i}/" for i in range(3)]
+    with AsyncFetcher(
+        max_in_flight=1, session=session, rate_limiter=SlowHostLimiter("slow")
+    ) as fetcher:
+        results = [url for url, _, _ in fetcher.fetch_many([slow] + fast, raw=True)]
+    # The other host's requests go ahead while the slow one waits for its token
+    assert results == fast + [slow]
@@ -0,0 +1,92 @@
+#%%
+from datetime import date
+
+import pandas as pd
+
+from src import formatting
+
+# Raw values covering the cases of tests.py and the fallbacks of the scalar functions
+RAW_VALUES = {
+    "rent": [
+        "$1,250",
+        None,
+        "$1,250–$1,300",
+        "Call for Rent",
+        "$1,800–",
+        "1–2–3",
+    ],
+    "beds": ["Studio", None, "1 bed", "5", "2 beds"],
+    "baths": ["1 baths", None, "0.5 baths", "5", "1.5 baths"],
+    "sqft": ["100 sq ft", "1,200 sq ft", None, "", "700–900 sq ft"],
+    "date_available": ["Now", "Soon", "Apr 16", "Apr. 16", "Not Available", "Feb 30"],
+}
+
+
+def test_batch_formatting_parity():
+    for column, values in RAW_VALUES.items():
+        scalar_function = getattr(formatting, f"format_{column}")
+        expected = [scalar_function(value) for value in values]
+        result = formatting.UNIT_FORMATTERS[column](values).tolist()
+        assert result == expected, column
+        assert [type(value) for value in result] == [
+            type(value) for value in expected
+        ], column
+
+
+def test_format_units():
+    units = [
+        {
+            "unit_label": "1",
+            "rent": "$1,250",
+            "beds": "Studio",
+            "baths": "1 bath",
+            "sqft": "450 sq ft",
+            "date_available": "Apr. 16",
+        },
+        {
+            "unit_label": "2",
+            "rent": "Call for Rent",
+            "beds": "2 beds",
+            "baths": "2 baths",
+            "sqft": "",
+            "date_available": "Not Available",
+        },
+    ]
+    expected = [
+        unit
+        | {
+            column: getattr(formatting, f"format_{column}")(unit[column])
+            for column in formatting.UNIT_FORMATTERS
+        }
+        for unit in units
+    ]
+    assert formatting.format_units(units) == expected
+    assert formatting.format_units(pd.DataFrame(units)).to_dict("records") == expected
+
+
+def test_date_normalizer():
+    dates = formatting.DateNormalizer(today=date(2025, 12, 20))
+    assert dates.normalize("Now") == "2025-12-20"
+    assert dates.normalize("Available Soon") == "2025-12-20"
+    assert dates.normalize("Dec. 24") == "2025-12-24"
+    # Early next year dates are not taken to be in the past
+    assert dates.normalize("Jan 5") == "2026-01-05"
+    assert dates.normalize("Not Available") == "Not Available"
+    assert dates.normalize("Jan 5") == "2026-01-05"
+    assert dates.stats() == {
+        "today": "2025-12-20",
+        "hits": 1,
+        "misses": 5,
+        "cached": 5,
+    }
+    # Feb 29 only exists in the next year
+    assert formatting.DateNormalizer(date(2027, 12, 20)).normalize("Feb 29") == (
+        "2028-02-29"
+    )
+
+
+def test_date_normalizer_cache_is_bounded():
+    dates = formatting.DateNormalizer(today=date(2025, 6, 1), max_size=2)
+    for value in ["Jun 2", "Jun 3", "Jun 2", "Jun 4"]:
+        dates.normalize(value)
+    assert list(dates.cache) == ["Jun 2", "Jun 4"]
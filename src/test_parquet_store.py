@@ -0,0 +1,105 @@
+# %%
+from datetime import date
+import os
+
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.parquet_store import ParquetSink, read_snapshots
+from src.property_parser import DEFAULT_AMENITY_MATCHER
+
+
+def parsed_property(name: str, city_name: str):
+    property_data = {"property_name": name}
+    property_data |= dict.fromkeys(DEFAULT_AMENITY_MATCHER.columns, False)
+    property_data |= {
+        "latitude": "40.1",
+        "longitude": "-74.2",
+        "neighborhood": "Midtown",
+        "zipcode": "10001",
+        "description": "",
+        "unique_features": "",
+        "year_built": "",
+        "property_url": f"https://www.apartments.com/{name}/",
+        "city_name": city_name,
+    }
+    return property_data
+
+
+def units(count: int, scraped: str):
+    return [
+        {
+            "unit_label": str(label),
+            "rent": 2000 + label if label % 2 else "",
+            "beds": "1",
+            "baths": "1.5",
+            "sqft": 700,
+            "date_available": "2025-12-20",
+            "date_scraped": scraped,
+        }
+        for label in range(count)
+    ]
+
+
+def export(root: str, city_name: str, scrape_date: date):
+    sink = ParquetSink(root, city_name, scrape_date, row_group_size=4)
+    with sink:
+        for name in ("a", "b", "c"):
+            sink.write_properties([parsed_property(name, city_name)])
+            sink.write_units([(name, "10001", units(3, scrape_date.isoformat()))])
+        # Row groups are written, but not readable before the sink is closed
+        assert sink.rows_written["units"] == 8
+        assert not os.path.exists(sink.paths["units"])
+    return sink
+
+
+def test_parquet_sink(tmp_path):
+    root = str(tmp_path)
+    sink = export(root, "New York", date(2025, 12, 20))
+    export(root, "New York", date(2025, 12, 21))
+    export(root, "Seattle", date(2025, 12, 21))
+
+    # 9 units written as row groups of 4, 4 and 1
+    assert sink.rows_written == {"properties": 3, "units": 9}
+    assert pq.ParquetFile(sink.paths["units"]).metadata.num_row_groups == 3
+
+    frame = read_snapshots(
+        root,
+        columns=["property_name", "rent", "baths", "date_available", "city_name"],
+        cities=["New York"],
+        start_date=date(2025, 12, 21),
+        filter=ds.field("rent") > 2000,
+    )
+    assert len(frame) == 3
+    assert list(frame["rent"]) == [2001.0] * 3
+    assert frame["city_name"].dtype == "category"
+    assert set(frame["city_name"]) == {"New York"}
+    assert str(frame["baths"].dtype) == "float32"
+    assert frame["date_available"].dtype.kind == "M"
+
+    properties = read_snapshots(root, "properties", end_date=date(2025, 12, 20))
+    assert list(properties["property_name"]) == ["a", "b", "c"]
+    assert properties["year_built"].isna().all()
+    assert properties["latitude"].tolist() == [40.1] * 3
+
+
+def test_export_replaces_the_snapshot(tmp_path):
+    root = str(tmp_path)
+    scrape_date = date(2025, 12, 20)
+    # A crashed export leaves a hidden part behind
+    crashed = ParquetSink(root, "New York", scrape_date, row_group_size=1)
+    crashed.write_properties([parsed_property("a", "New York")])
+    assert os.listdir(os.path.dirname(crashed.paths["properties"])) == [
+        "." + os.path.basename(crashed.paths["properties"])
+    ]
+
+    export(root, "New York", scrape_date)
+    sink = export(root, "New York", scrape_date)
+    # Exporting the day again doesn't duplicate its rows
+    assert len(read_snapshots(root, "properties")) == 3
+    assert len(read_snapshots(root)) == 9
+    # The hidden part may still be written by another sink, so it is kept
+    assert sorted(os.listdir(os.path.dirname(sink.paths["properties"]))) == [
+        "." + os.path.basename(crashed.paths["properties"]),
+        os.path.basename(sink.paths["properties"]),
+    ]
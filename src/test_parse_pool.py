@@ -0,0 +1,52 @@
+# %%
+from src.page_parser import PageParser
+from src.parse_pool import ParsePool, parse_one
+
+UNIT = """<li class="unitContainer js-unitContainer" data-unit="{label}" data-beds="1">
+    <div class="pricingColumn column"><span>Price</span><span>${rent}</span></div>
+    <div class="sqftColumn column">700</div>
+    <span class="dateAvailable">Now</span>
+</li>"""
+
+PAGE = """<html><body>
+<h1 class="propertyName">{name}</h1>
+<span class="stateZipContainer">WA 98101</span>
+<section id="descriptionSection"><p>Close to the water.</p></section>
+<div data-tab-content-id="all">{units}</div>
+</body></html>"""
+
+
+def property_page(name: str, rents: list):
+    units = "".join(
+        UNIT.format(label=100 + i, rent=f"{rent:,}") for i, rent in enumerate(rents)
+    )
+    return PAGE.format(name=name, units=units).encode()
+
+
+def test_parse_pool_parity():
+    pages = [
+        (f"https://www.apartments.com/property-{i}/", property_page(f"P{i}", rents))
+        for i, rents in enumerate([[2100], [1800, 2500], [], [3100, 2900, 4000]] * 3)
+    ]
+    # A page without a property name can't be parsed
+    pages.append(("https://www.apartments.com/broken/", b"<html></html>"))
+
+    page_parser = PageParser("Seattle")
+    expected = [parse_one(page_parser, url, content) for url, content in pages]
+    assert expected[-1][3] is not None
+    expected_counters = page_parser.take_counters()
+
+    pool_parser = PageParser("Seattle")
+    pool = ParsePool(pool_parser, workers=2, batch_size=2)
+    try:
+        results = list(pool.parse_pages(pages))
+    finally:
+        pool.close()
+
+    # Batches finish in any order, but every page is parsed the same
+    assert sorted(results) == sorted(expected)
+    # and the workers' counts are added to the pool's parser. Each worker has
+    # its own date cache, so only the parse counts add up the same.
+    counters = pool_parser.take_counters()
+    assert counters["field_sources"] == expected_counters["field_sources"]
+    assert counters["layout_fingerprints"] == expected_counters["layout_fingerprints"]
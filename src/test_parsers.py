@@ -0,0 +1,154 @@
+#%%
+import glob
+import os
+
+import pytest
+
+from src.page_parser import MissingElementError, PageParser
+from src.lxml_parser import LxmlPageParser
+from src.property_parser import AmenityMatcher, check_amenity_columns
+from src.scraper import build_soup
+from src.strainers import PROPERTY_PAGE_STRAINER
+
+TEST_PAGES = sorted(
+    glob.glob(os.path.join(os.path.dirname(__file__), "test_pages", "*.html"))
+)
+STRUCTURED_PAGE = os.path.join(
+    os.path.dirname(__file__), "test_pages", "structured_data_layout.html"
+)
+
+
+def parse_or_error(page_parser, content):
+    """Returns the parsed records, or the exception type if the page failed
+
+    A missing element fails the BeautifulSoup parser with a plain AttributeError
+    and the lxml parser with a MissingElementError, which both count as one.
+    """
+    try:
+        return page_parser.parse_html(content, "https://www.apartments.com/test/")
+    except AttributeError:
+        return AttributeError
+    except Exception as e:
+        return type(e)
+
+
+def test_saved_pages_exist():
+    assert len(TEST_PAGES) != 0
+
+
+def test_lxml_parser_parity():
+    for page in TEST_PAGES:
+        with open(page, "rb") as file:
+            content = file.read()
+
+        expected = parse_or_error(PageParser("Seattle"), content)
+        result = parse_or_error(LxmlPageParser("Seattle"), content)
+        assert result == expected, page
+
+
+def test_lxml_parser_key_order():
+    with open(TEST_PAGES[-1], "rb") as file:
+        content = file.read()
+
+    expected, _ = PageParser("Seattle").parse_html(content, "url")
+    result, _ = LxmlPageParser("Seattle").parse_html(content, "url")
+    assert list(result.keys()) == list(expected.keys())
+
+
+def test_custom_amenity_table():
+    with open(TEST_PAGES[-1], "rb") as file:
+        content = file.read()
+
+    matcher = AmenityMatcher({"Bike Storage": "span", "Lounge": "li", "Pool": "h4"})
+    expected = {"bike_storage": True, "lounge": True, "pool": False}
+    for page_parser in [PageParser, LxmlPageParser]:
+        property_data, _ = page_parser("Seattle", matcher).parse_html(content, "url")
+        assert {column: property_data[column] for column in expected} == expected
+        assert "fitness_center" not in property_data
+
+
+def test_amenity_columns_checked():
+    check_amenity_columns(AmenityMatcher({"Pool": "h4", "Garage": "span"}).columns)
+    with pytest.raises(ValueError, match="bike_storage"):
+        check_amenity_columns(AmenityMatcher({"Bike Storage": "span"}).columns)
+def test_partial_parse_parity():
+    # Pages keeping their amenities and year built inside the parsed regions
+    for page in TEST_PAGES:
+        if "pricing_grid" in page:
+            continue
+        with open(page, "rb") as file:
+            content = file.read()
+
+        expected = parse_or_error(PageParser("Seattle"), content)
+        result = parse_or_error(PageParser("Seattle", partial=True), content)
+        assert result == expected, page
+
+
+def test_partial_parse_skips_other_regions():
+    with open(TEST_PAGES[-1], "rb") as file:
+        content = file.read()
+
+    soup = build_soup(content, 200, PROPERTY_PAGE_STRAINER)
+    assert soup.find("section", {"id": "descriptionSection"}) is not None
+    assert soup.find("div", {"class": "propertyAddressContainer"}) is None
+
+
+def test_structured_data_first():
+    with open(STRUCTURED_PAGE, "rb") as file:
+        content = file.read()
+
+    for page_parser in [PageParser, LxmlPageParser]:
+        parser = page_parser("Seattle")
+        property_data, units = parser.parse_html(content, "url")
+        assert property_data["zipcode"] == "98101"
+        assert property_data["neighborhood"] == "Belltown"
+        assert units["units"][0]["baths"] == "1.5"
+        assert units["units"][0]["date_available"] == "2026-11-01"
+        assert units["units"][1]["rent"] == 1850
+        assert units["units"][1]["sqft"] == 610
+
+        stats = parser.source_stats()
+        assert stats["latitude"] == {"structured": 1, "dom": 0}
+        assert stats["neighborhood"] == {"structured": 0, "dom": 1}
+        assert stats["sqft"] == {"structured": 1, "dom": 1}
+
+
+def test_structured_data_off():
+    with open(STRUCTURED_PAGE, "rb") as file:
+        content = file.read()
+
+    _, units = PageParser("Seattle", structured_data=False).parse_html(content, "url")
+    # The HTML reads the bath count from data-beds
+    assert units["units"][0]["baths"] == "2"
+
+
+def test_missing_units_tab():
+    page = os.path.join(
+        os.path.dirname(__file__), "test_pages", "missing_units_tab.html"
+    )
+    with open(page, "rb") as file:
+        content = file.read()
+
+    for page_parser in [PageParser, LxmlPageParser]:
+        try:
+            page_parser("Seattle").parse_html(content, "url")
+        except MissingElementError as e:
+            assert str(e) == "The page has no units tab"
+        else:
+            assert False, page_parser
+
+
+def test_layout_fingerprints():
+    for page_parser in [PageParser, LxmlPageParser]:
+        parser = page_parser("Seattle")
+        for page in TEST_PAGES:
+            with open(page, "rb") as file:
+                parse_or_error(parser, file.read())
+
+        assert parser.layout_fingerprints == {
+            "no units tab": 1,
+            "priceGridModelWrapper[model_name,rent_label,details,availability]": 1,
+            "pricingGridItem[model_name,rent_label,details,availability]": 1,
+            "unitContainer[@data-unit,@data-beds,@data-baths,"
+            "pricing,sqft,date_available]": 2,
+        }
@@ -0,0 +1,79 @@
+# %%
+import asyncio
+import time
+
+import pytest
+
+from src.rate_limiter import AdaptiveRateLimiter, TokenBucket
+
+URL = "https://www.apartments.com/new-york-ny/"
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, burst=2)
+    # The burst is free, then each token waits 1 / rate more than the last
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+
+    bucket.set_rate(100)
+    assert bucket.rate == 100
+    assert bucket.reserve() == pytest.approx(0.03, abs=0.01)
+
+
+def test_token_bucket_refill():
+    bucket = TokenBucket(rate=100, burst=1)
+    assert bucket.reserve() == 0
+    time.sleep(0.05)
+    # Refilled, but never past the burst
+    assert bucket.reserve() == 0
+    assert bucket.reserve() > 0
+
+
+def test_backoff_and_recovery():
+    limiter = AdaptiveRateLimiter(
+        requests_per_second=4,
+        backoff_factor=0.5,
+        recovery_step=1,
+        min_rate=0.8,
+        backoff_cooldown=60,
+    )
+    limiter.record(URL, 429)
+    assert limiter.stats() == {"www.apartments.com": {"rate": 2, "throttled": 1}}
+
+    # Within the cooldown, more throttling doesn't cut the rate again
+    limiter.record(URL, 503)
+    limiter.record(URL, None)
+    assert limiter.stats()["www.apartments.com"] == {"rate": 2, "throttled": 3}
+
+    # Each success adds recovery_step back, up to requests_per_second
+    limiter.record(URL, 200)
+    assert limiter.stats()["www.apartments.com"]["rate"] == 3
+    limiter.record(URL, 200)
+    limiter.record(URL, 200)
+    assert limiter.stats()["www.apartments.com"]["rate"] == 4
+
+
+def test_backoff_floor():
+    limiter = AdaptiveRateLimiter(
+        requests_per_second=1, min_rate=0.4, backoff_cooldown=0
+    )
+    for _ in range(5):
+        limiter.record(URL, 403)
+    assert limiter.stats()["www.apartments.com"]["rate"] == 0.4
+
+
+def test_acquire_spaces_requests():
+    limiter = AdaptiveRateLimiter(
+        requests_per_second=20, global_requests_per_second=100, jitter=0
+    )
+
+    async def acquire_all():
+        start = time.monotonic()
+        for _ in range(3):
+            await limiter.acquire(URL)
+        return time.monotonic() - start
+
+    # The first request goes at once, the next two wait 1 / 20 s each
+    assert asyncio.run(acquire_all()) == pytest.approx(0.1, abs=0.04)
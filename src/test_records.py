@@ -0,0 +1,87 @@
+#%%
+from datetime import date
+
+import numpy as np
+
+from src.property_parser import DEFAULT_AMENITY_MATCHER
+from src.records import PropertyRecord, UnitRecord, as_row, batched
+from src.unit_store import UnitStore
+
+UNIT = {
+    "unit_label": "101",
+    "rent": 1250,
+    "beds": "1",
+    "baths": "1.5",
+    "sqft": 700,
+    "date_available": "2025-12-20",
+    "date_scraped": "2025-12-20",
+}
+
+
+def test_unit_record():
+    record = UnitRecord.from_dict(UNIT)
+    assert record.date_available == date(2025, 12, 20).toordinal()
+    assert record.as_dict() == {
+        **UNIT,
+        "beds": 1,
+        "baths": 1.5,
+        "date_available": date(2025, 12, 20),
+        "date_scraped": date(2025, 12, 20),
+    }
+    # Unparsed text is stored as missing
+    record = UnitRecord.from_dict({**UNIT, "beds": "", "date_available": "Soon"})
+    assert record.beds is None and record.date_available is None
+
+
+def test_property_record():
+    columns = DEFAULT_AMENITY_MATCHER.columns
+    property_data = {"property_name": "The Lofts"}
+    property_data |= {column: index % 3 == 0 for index, column in enumerate(columns)}
+    property_data |= {
+        "latitude": "40.1",
+        "longitude": "-74.2",
+        "neighborhood": "Midtown",
+        "zipcode": "10001",
+        "description": "",
+        "unique_features": "",
+        "year_built": "1999",
+        "property_url": "https://www.apartments.com/the-lofts/",
+        "city_name": "New York",
+    }
+    record = PropertyRecord.from_dict(property_data, columns)
+    assert record.has_amenity(columns[0]) and not record.has_amenity(columns[1])
+    assert as_row(record) == {
+        **property_data,
+        "latitude": 40.1,
+        "longitude": -74.2,
+        "year_built": 1999,
+    }
+    assert list(as_row(record)) == list(property_data)
+    assert as_row(property_data) is property_data
+
+
+def test_batched():
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_unit_store():
+    store = UnitStore(chunk_size=2)
+    store.add_property("The Lofts", "10001", [UNIT, {**UNIT, "rent": "", "beds": ""}])
+    store.add_property("Empty", "10002", [])
+    store.add_property("The Yard", "10003", [UnitRecord.from_dict(UNIT)] * 3)
+    assert len(store) == 5 and store.capacity % 2 == 0
+
+    frame = store.to_frame()
+    assert np.shares_memory(frame["rent"].to_numpy(), store.columns["rent"])
+    assert frame["property_index"].tolist() == [0, 0, 2, 2, 2]
+    assert frame["rent"].isna().tolist() == [False, True, False, False, False]
+    assert frame["unit_label"].dtype == object
+
+    expected = UnitRecord.from_dict(UNIT).as_dict()
+    loads = list(store.property_units())
+    assert [load[:2] for load in loads] == [
+        ("The Lofts", "10001"),
+        ("The Yard", "10003"),
+    ]
+    assert loads[0][2][0] == expected and loads[1][2] == [expected] * 3
+    assert loads[0][2][1]["rent"] is None and loads[0][2][1]["beds"] is None
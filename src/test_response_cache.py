@@ -0,0 +1,108 @@
+# %%
+import gzip
+import time
+
+from src.fetcher import AsyncFetcher
+from src.rate_limiter import AdaptiveRateLimiter
+from src.response_cache import ResponseCache
+
+URL = "https://www.apartments.com/new-york-ny/"
+
+
+class CountingSession:
+    """Answers every URL with the same page, counting the requests"""
+
+    def __init__(self):
+        self.requests = 0
+
+    async def get(self, url: str, headers: dict = None):
+        self.requests += 1
+        return b"<html>fresh</html>", 200
+
+    def stats(self):
+        return {"requests": self.requests}
+
+    async def close(self):
+        pass
+
+
+def fetcher(cache: ResponseCache, session: CountingSession, replay: bool = False):
+    limiter = AdaptiveRateLimiter(
+        requests_per_second=1000, global_requests_per_second=1000, jitter=0
+    )
+    return AsyncFetcher(
+        session=session, rate_limiter=limiter, cache=cache, replay=replay
+    )
+
+
+def test_ttl_expiry(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=0.05)
+    cache.put(URL, b"<html>cached</html>", 200)
+    content, status, _ = cache.get(URL)
+    assert (content, status) == (b"<html>cached</html>", 200)
+
+    time.sleep(0.1)
+    assert cache.get(URL) is None
+    assert cache.get(URL, ignore_ttl=True)[0] == b"<html>cached</html>"
+
+    # Expired entries are dropped by evict
+    cache.evict()
+    assert cache.get(URL, ignore_ttl=True) is None
+    assert cache.stats()["bytes"] == 0
+    cache.close()
+
+
+def test_lru_eviction(tmp_path):
+    pages = {f"{URL}{i}/": bytes([i]) * 1000 for i in range(3)}
+    size = len(gzip.compress(pages[f"{URL}0/"]))
+    cache = ResponseCache(str(tmp_path), max_bytes=2 * size + size // 2)
+
+    first, second, third = pages
+    cache.put(first, pages[first], 200)
+    time.sleep(0.01)
+    cache.put(second, pages[second], 200)
+    time.sleep(0.01)
+    # Reading the first makes the second the least recently used
+    assert cache.get(first) is not None
+    cache.put(third, pages[third], 200)
+
+    assert cache.get(second) is None
+    assert cache.get(first)[0] == pages[first]
+    assert cache.get(third)[0] == pages[third]
+    assert cache.stats()["bytes"] <= cache.max_bytes
+    cache.close()
+
+    # The index survives reopening the cache
+    reopened = ResponseCache(str(tmp_path))
+    assert reopened.get(third)[0] == pages[third]
+    reopened.close()
+
+
+def test_fetcher_cache(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=0.05)
+    session = CountingSession()
+    with fetcher(cache, session) as cached_fetcher:
+        assert cached_fetcher.fetch(URL)[1] == 200
+        assert cached_fetcher.fetch(URL)[1] == 200
+        assert session.requests == 1
+
+        # Once expired, the page is requested again
+        time.sleep(0.1)
+        cached_fetcher.fetch(URL)
+        assert session.requests == 2
+    cache.close()
+
+
+def test_replay(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=0.01)
+    cache.put(URL, b"<html><title>cached</title></html>", 200)
+    time.sleep(0.05)
+
+    session = CountingSession()
+    with fetcher(cache, session, replay=True) as replay_fetcher:
+        # Replay ignores the TTL, and never goes to the network
+        soup, status = replay_fetcher.fetch(URL)
+        assert status == 200 and soup.title.text == "cached"
+        assert replay_fetcher.fetch(f"{URL}2/") == (None, 404)
+    assert session.requests == 0
+    cache.close()
@@ -0,0 +1,103 @@
+# %%
+from bs4 import BeautifulSoup
+
+from src.search_planner import SearchPlanner
+
+BASE_URL = "https://www.apartments.com/new-york-ny/"
+
+
+def search_page(listings: list, page: int = None, pages: int = None):
+    cards = "".join(
+        f'<li class="mortar-wrapper"><a class="property-link" href="{url}"></a></li>'
+        for url in listings
+    )
+    page_range = (
+        ""
+        if pages is None
+        else f'<span class="pageRange">Page {page} of {pages}</span>'
+    )
+    return f"<html><body><ul>{cards}</ul>{page_range}</body></html>"
+
+
+class FakeFetcher:
+    """Serves search pages from a dict, failing some URLs a number of times first"""
+
+    def __init__(self, pages: dict, failures: dict = None):
+        self.pages = pages
+        self.failures = dict(failures or {})
+        self.requested = []
+
+    def fetch_many(self, urls, raw: bool = False, parse_only=None):
+        for url in urls:
+            self.requested.append(url)
+            if self.failures.get(url, 0) > 0:
+                self.failures[url] -= 1
+                yield url, None, 404
+            elif url in self.pages:
+                yield url, BeautifulSoup(self.pages[url], "lxml"), 200
+            else:
+                yield url, None, 301
+
+
+def planner(fetcher: FakeFetcher, **kwargs):
+    return SearchPlanner(fetcher, BASE_URL, 500, 1000, **kwargs)
+
+
+def test_page_count():
+    pages = {
+        f"{BASE_URL}500-to-1000/{page}/": search_page([f"p{page}"], page, 3)
+        for page in (1, 2, 3)
+    }
+    search = planner(FakeFetcher(pages))
+    assert sorted(search.plan()) == ["p1", "p2", "p3"]
+    assert search.bands[0]["pages"] == 3
+    assert search.search_requests == 3
+
+
+def test_failed_probe_is_retried():
+    probe = f"{BASE_URL}500-to-1000/1/"
+    fetcher = FakeFetcher({probe: search_page(["p1"], 1, 1)}, failures={probe: 2})
+    search = planner(fetcher)
+    assert search.plan() == ["p1"]
+    assert fetcher.requested == [probe] * 3
+    assert search.failed_requests == []
+
+
+def test_failed_probe_after_retries():
+    probe = f"{BASE_URL}500-to-1000/1/"
+    fetcher = FakeFetcher({probe: search_page(["p1"], 1, 1)}, failures={probe: 5})
+    search = planner(fetcher, retries=2)
+    assert search.plan() == []
+    assert search.failed_requests == [probe]
+
+
+def test_walk_pages_without_page_range():
+    # No pageRange on the pages, the old loop walked them until a redirect
+    pages = {
+        f"{BASE_URL}500-to-1000/{page}/": search_page([f"p{page}a", f"p{page}b"])
+        for page in (1, 2, 3)
+    }
+    search = planner(FakeFetcher(pages))
+    assert len(search.plan()) == 6
+    assert search.bands[0]["pages"] == 3
+    # The fourth page redirects
+    assert search.search_requests == 4
+
+
+def test_walk_split_at_page_cap():
+    # A band walked up to the page cap is split, like one with a page count
+    wide = {
+        f"{BASE_URL}500-to-1000/{page}/": search_page([f"wide{page}"])
+        for page in range(1, 29)
+    }
+    halves = {
+        f"{BASE_URL}{band}/1/": search_page([band], 1, 1)
+        for band in ("500-to-750", "750-to-1000")
+    }
+    search = planner(FakeFetcher(wide | halves), price_step=250)
+    assert len(search.plan()) == 30
+    assert [(band["min_price"], band["max_price"]) for band in search.bands] == [
+        (500, 750),
+        (750, 1000),
+    ]
+    assert search.truncated_bands == []
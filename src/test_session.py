@@ -0,0 +1,59 @@
+# %%
+import asyncio
+import gzip
+import zlib
+
+import brotli
+from aiohttp import web
+
+from src.session import ScraperSession, decode_body
+
+BODY = b"<html><body>" + b"<li>Unit 101</li>" * 200 + b"</body></html>"
+
+
+def test_decode_body():
+    assert decode_body(gzip.compress(BODY), "gzip") == BODY
+    assert decode_body(zlib.compress(BODY), "deflate") == BODY
+    assert decode_body(brotli.compress(BODY), " BR ") == BODY
+    assert decode_body(BODY, "") == BODY
+
+
+def test_decode_raw_deflate():
+    # Deflate data sent without the zlib header
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    raw = compressor.compress(BODY) + compressor.flush()
+    assert decode_body(raw, "deflate") == BODY
+
+
+def test_session_get():
+    async def handler(request):
+        return web.Response(
+            body=gzip.compress(BODY), headers={"Content-Encoding": "gzip"}
+        )
+
+    async def fetch_twice():
+        app = web.Application()
+        app.router.add_get("/", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = runner.addresses[0][1]
+
+        session = ScraperSession()
+        try:
+            results = [await session.get(f"http://127.0.0.1:{port}/") for _ in range(2)]
+        finally:
+            await session.close()
+            await runner.cleanup()
+        return results, session.stats()
+
+    results, stats = asyncio.run(fetch_twice())
+    assert results == [(BODY, 200), (BODY, 200)]
+    assert stats["requests"] == 2
+    # The body is counted compressed on the wire and decoded after
+    assert stats["bytes_decoded"] == 2 * len(BODY)
+    assert stats["bytes_wire"] < stats["bytes_decoded"]
+    # The second request reuses the kept-alive connection
+    assert stats["connections_created"] == 1
+    assert stats["connections_reused"] == 1
@@ -0,0 +1,150 @@
+# %%
+from datetime import date
+import json
+import sqlite3
+
+import pytest
+
+from src.parquet_store import ParquetSink, read_snapshots
+from src.property_parser import DEFAULT_AMENITY_MATCHER
+from src.sinks import BackgroundWriter, FanOutSink, FileSink, SQLiteSink, StorageSink
+
+
+def parsed_property(name: str):
+    property_data = {"property_name": name}
+    property_data |= dict.fromkeys(DEFAULT_AMENITY_MATCHER.columns, False)
+    property_data |= {
+        "latitude": "40.1",
+        "longitude": "-74.2",
+        "neighborhood": "Midtown",
+        "zipcode": "10001",
+        "description": "",
+        "unique_features": "",
+        "year_built": "",
+        "property_url": f"https://www.apartments.com/{name}/",
+        "city_name": "New York",
+    }
+    units = {
+        "units": [
+            {
+                "unit_label": "101",
+                "rent": "",
+                "beds": "1",
+                "baths": "1",
+                "sqft": 700,
+                "date_available": "2025-12-20",
+                "date_scraped": "2025-12-20",
+            }
+        ],
+        "zipcode": "10001",
+    }
+    return property_data, units
+
+
+def test_background_writer(tmp_path):
+    stored, failed = [], []
+    sink = SQLiteSink(str(tmp_path / "apartments.db"))
+    with BackgroundWriter(sink, batch_size=2, flush_interval=0.05) as writer:
+        for name in ("a", "b", "c"):
+            writer.write(
+                *parsed_property(name),
+                on_stored=lambda name=name: stored.append(name),
+                on_failed=failed.append,
+            )
+        writer.flush()
+        assert stored == ["a", "b", "c"] and failed == []
+    assert writer.stats()["batches_written"] == 2
+
+    conn = sqlite3.connect(tmp_path / "apartments.db")
+    rows = conn.execute(
+        "SELECT unit_label, rent, beds, date_available FROM units"
+    ).fetchall()
+    assert rows == [("101", None, 1, "2025-12-20")] * 3
+    conn.close()
+
+
+def test_file_sink(tmp_path):
+    with BackgroundWriter(FileSink(str(tmp_path), prefix="nyc_")) as writer:
+        writer.write(*parsed_property("a"))
+    units = (tmp_path / "nyc_units.jsonl").read_text().splitlines()
+    assert json.loads(units[0]) == {
+        "property_name": "a",
+        "zipcode": "10001",
+        "unit_label": "101",
+        "rent": None,
+        "beds": 1,
+        "baths": 1.0,
+        "sqft": 700,
+        "date_available": "2025-12-20",
+        "date_scraped": "2025-12-20",
+    }
+    properties = (tmp_path / "nyc_properties.jsonl").read_text().splitlines()
+    assert json.loads(properties[0])["property_name"] == "a"
+
+
+def test_sink_needs_its_writes():
+    class PropertiesOnly(StorageSink):
+        def write_properties(self, properties: list):
+            pass
+
+    with pytest.raises(TypeError):
+        PropertiesOnly()
+
+
+def test_failed_batch_is_split(tmp_path):
+    stored, failed = [], []
+    broken, units = parsed_property("b")
+    broken["city_name"] = None
+    properties = [parsed_property("a"), (broken, units), parsed_property("c")]
+    with BackgroundWriter(SQLiteSink(str(tmp_path / "apartments.db"))) as writer:
+        for property_data, units in properties:
+            writer.write(
+                property_data,
+                units,
+                on_stored=lambda name=property_data["property_name"]: stored.append(
+                    name
+                ),
+                on_failed=failed.append,
+            )
+        writer.flush()
+    # The NOT NULL city_name fails the batch, which is split until only the
+    # broken property fails
+    assert stored == ["a", "c"]
+    assert [type(e) for e in failed] == [sqlite3.IntegrityError]
+    stats = writer.stats()
+    assert stats["failed_batches"] == 1
+    assert stats["failed_properties"] == 1
+    assert stats["properties_written"] == 2
+
+
+def test_callback_error_stops_the_writer(tmp_path):
+    def on_stored():
+        raise OSError(28, "No space left on device")
+
+    writer = BackgroundWriter(
+        FileSink(str(tmp_path)), batch_size=1, queue_size=1
+    ).open()
+    writer.write(*parsed_property("a"), on_stored=on_stored)
+    # The writer thread has died, so a full queue must raise rather than block
+    with pytest.raises(OSError):
+        for name in "bcdef":
+            writer.write(*parsed_property(name))
+    with pytest.raises(OSError):
+        writer.flush()
+    with pytest.raises(OSError):
+        writer.close()
+    assert writer.stats()["properties_written"] == 1
+
+
+def test_fan_out_sink(tmp_path):
+    database = str(tmp_path / "apartments.db")
+    export = ParquetSink(str(tmp_path / "parquet"), "New York", date(2025, 12, 20))
+    with BackgroundWriter(FanOutSink(SQLiteSink(database), export)) as writer:
+        for name in ("a", "b"):
+            writer.write(*parsed_property(name))
+
+    conn = sqlite3.connect(database)
+    assert conn.execute("SELECT count(*) FROM units").fetchone() == (2,)
+    conn.close()
+    snapshot = read_snapshots(str(tmp_path / "parquet"), "properties")
+    assert list(snapshot["property_name"]) == ["a", "b"]
@@ -0,0 +1,156 @@
+# %%
+import threading
+import time
+
+import pytest
+
+from src.items import ApartmentsPipeline
+from src.sinks import BackgroundWriter, StorageSink
+from src.streaming import StreamingPipeline
+
+URLS = [f"https://www.apartments.com/property-{i}/" for i in range(200)]
+
+
+class PageFetcher:
+    """Returns the same page for every URL, without any network"""
+
+    def fetch_many(self, urls, raw: bool = False):
+        for url in urls:
+            yield url, b"<html></html>", 200
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+def parse_pages(pages):
+    for url, content in pages:
+        property_data = {"property_name": url, "property_url": url}
+        yield url, property_data, {"units": [], "zipcode": "10001"}, None
+
+
+def failing_parser(pages):
+    """Parses the first page, then fails like a broken worker pool"""
+    for parsed in parse_pages(pages):
+        yield parsed
+        raise RuntimeError("A process in the process pool was terminated abruptly")
+
+
+def run_stopped(streaming: StreamingPipeline):
+    """Runs the stream on a thread, returning the errors it raised"""
+    errors = []
+
+    def run():
+        try:
+            streaming.run()
+        except Exception as e:
+            errors.append(e)
+
+    # A stage left blocked on a full queue would never let the run return
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    return errors
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    pipeline = ApartmentsPipeline(
+        "New York",
+        "NY",
+        fetcher=PageFetcher(),
+        checkpoint_dir=str(tmp_path / "checkpoints"),
+        export_dir=str(tmp_path / "parquet"),
+    )
+    pipeline.get_property_urls = lambda: pipeline.checkpoint.save_frontier(URLS)
+    pipeline.property_urls = URLS
+    pipeline.parse_pages = parse_pages
+    return pipeline
+
+
+def test_store_failure_stops_the_run(pipeline):
+    record = pipeline.checkpoint.record
+
+    def full_disk(url, property_data, units):
+        if pipeline.checkpoint.fetched:
+            raise OSError("No space left on device")
+        record(url, property_data, units)
+
+    pipeline.checkpoint.record = full_disk
+    written = []
+    streaming = StreamingPipeline(pipeline, lambda *item: written.append(item), 2)
+
+    assert [str(e) for e in run_stopped(streaming)] == ["No space left on device"]
+    assert len(written) == 2
+    # The checkpoint is kept for a resume
+    assert pipeline.checkpoint.load()
+    assert pipeline.checkpoint.fetched == {URLS[0]}
+
+
+def test_parse_failure_stops_the_run(pipeline):
+    pipeline.parse_pages = failing_parser
+    written = []
+    streaming = StreamingPipeline(pipeline, lambda *item: written.append(item), 2)
+
+    assert [str(e) for e in run_stopped(streaming)] == [
+        "A process in the process pool was terminated abruptly"
+    ]
+    assert len(written) == 1
+    # The checkpoint is kept for a resume
+    assert pipeline.checkpoint.load()
+    assert pipeline.checkpoint.fetched == {URLS[0]}
+
+
+class SlowSink(StorageSink):
+    """Takes a while to store each batch"""
+
+    def __init__(self):
+        self.properties = []
+
+    def write_properties(self, properties: list):
+        time.sleep(0.2)
+        self.properties += properties
+
+    def write_units(self, property_units: list):
+        pass
+
+
+def parse_three(pages):
+    """Parses the first three pages only"""
+    for url, content in list(pages)[:3]:
+        property_data = {"property_name": url, "property_url": url}
+        yield url, property_data, {"units": [], "zipcode": "10001"}, None
+
+
+def test_checkpoint_closed_after_the_writer(tmp_path):
+    pipeline = ApartmentsPipeline(
+        "New York",
+        "NY",
+        fetcher=PageFetcher(),
+        checkpoint_dir=str(tmp_path / "checkpoints"),
+        export_dir=str(tmp_path / "parquet"),
+    )
+    pipeline.get_property_urls = lambda: pipeline.checkpoint.save_frontier(URLS)
+    pipeline.property_urls = URLS
+    pipeline.parse_pages = parse_three
+
+    sink = SlowSink()
+    with BackgroundWriter(sink, batch_size=1) as writer:
+        streaming = StreamingPipeline(pipeline, writer, 2)
+        store_items = streaming.store_items
+
+        def failing_store_items():
+            store_items()
+            raise OSError(28, "No space left on device")
+
+        streaming.store_items = failing_store_items
+        with pytest.raises(OSError):
+            streaming.run()
+        # The queued properties were stored and recorded before the checkpoint closed
+        assert len(sink.properties) == 3
+        assert pipeline.checkpoint._records_file is None
+    assert pipeline.checkpoint.load()
+    assert len(pipeline.checkpoint.records) == 3
@@ -0,0 +1,130 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class UnitLayout:
+    """One of the page layouts units are listed in
+
+    Attributes:
+        name (str): Name used in the layout fingerprints
+        tag (str): Element holding each unit
+        class_name (str): Class attribute of the unit elements
+        in_units_tab (bool): Units are only looked for inside the "all" units tab
+    """
+
+    name: str
+    tag: str
+    class_name: str
+    in_units_tab: bool
+
+
+# Known unit layouts, the first one found on a page is used
+UNIT_LAYOUTS = [
+    UnitLayout("unitContainer", "li", "unitContainer js-unitContainer", True),
+    UnitLayout("pricingGridItem", "div", "pricingGridItem multiFamily", True),
+    UnitLayout(
+        "priceGridModelWrapper",
+        "div",
+        "priceGridModelWrapper js-unitContainer mortar-wrapper",
+        False,
+    ),
+]
+
+# Elements of a unit read by the Unit_Parser lookups
+# Key = the name of the lookup, Value = the element and its class attribute
+UNIT_ELEMENTS = {
+    "model_name": ("span", "modelName"),
+    "pricing": ("div", "pricingColumn column"),
+    "rent_label": ("span", "rentLabel"),
+    "details": ("span", "detailsTextWrapper"),
+    "sqft": ("div", "sqftColumn column"),
+    "date_available": ("span", "dateAvailable"),
+    "availability": ("span", "availabilityInfo"),
+}
+
+# Unit attributes that are part of the layout fingerprint
+UNIT_ATTRIBUTES = ("data-unit", "data-beds", "data-baths")
+
+
+def class_matches(class_attribute: str, class_name: str):
+    """Matches a class attribute the same way as BeautifulSoup's class lookup
+
+    A single class name matches any of the element's classes, while a value
+    with spaces has to match the whole class attribute.
+    """
+    if class_attribute is None:
+        return False
+    classes = class_attribute.split()
+    if " " in class_name:
+        return " ".join(classes) == class_name
+    return class_name in classes
+
+
+def soup_elements(node):
+    """Yields (element, name, class attribute) for each element in a soup node"""
+    for element in node.descendants:
+        if element.name is None:
+            continue
+        classes = element.get("class")
+        if isinstance(classes, list):
+            classes = " ".join(classes)
+        yield element, element.name, classes
+
+
+def match_layouts(elements, layouts: list):
+    """Collects the unit elements of every layout in a single walk
+
+    Returns:
+        dict: The matching elements of each layout, in document order
+    """
+    units = {layout.name: [] for layout in layouts}
+    for element, name, class_attribute in elements:
+        for layout in layouts:
+            if name == layout.tag and class_matches(class_attribute, layout.class_name):
+                units[layout.name].append(element)
+    return units
+
+
+# UNIT_ELEMENTS lookups grouped by tag, so an element is only matched against
+# the lookups of its own tag
+_ELEMENTS_BY_TAG = {}
+for _key, (_tag, _class_name) in UNIT_ELEMENTS.items():
+    _ELEMENTS_BY_TAG.setdefault(_tag, []).append((_key, _class_name))
+
+
+def collect_elements(elements):
+    """Returns the first element of each UNIT_ELEMENTS lookup, walking the unit once"""
+    found = {}
+    for element, name, class_attribute in elements:
+        lookups = _ELEMENTS_BY_TAG.get(name)
+        if lookups is None or class_attribute is None:
+            continue
+        # Split once for all the lookups, matching like class_matches
+        classes = class_attribute.split()
+        for key, class_name in lookups:
+            if key in found:
+                continue
+            if " " in class_name:
+                matches = " ".join(classes) == class_name
+            else:
+                matches = class_name in classes
+            if matches:
+                found[key] = element
+                if len(found) == len(UNIT_ELEMENTS):
+                    return found
+    return found
+
+
+def layout_fingerprint(layout: UnitLayout, attributes, elements: dict):
+    """Summarizes the structure of a page's units, so layout changes can be counted
+
+    Args:
+        layout (UnitLayout): Layout the units were found in, None if there were none
+        attributes (iterable): Attribute names of the first unit
+        elements (dict): The UNIT_ELEMENTS found in the first unit
+    """
+    if layout is None:
+        return "no units"
+    parts = [f"@{name}" for name in UNIT_ATTRIBUTES if name in attributes]
+    parts += [key for key in UNIT_ELEMENTS if key in elements]
+    return f"{layout.name}[{','.join(parts)}]"
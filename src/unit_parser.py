@@ -1,6 +1,7 @@
 #%%
 from dataclasses import dataclass, field
-from .formatting import clean_unit_information
+from .formatting import DateNormalizer, clean_unit_information
+from .unit_layouts import collect_elements, layout_fingerprint, soup_elements
 from datetime import date
 
 
@@ -12,23 +13,52 @@ class Unit_Parser:
     baths: str = field(init=False)
     area: str = field(init=False)
     date_available: str = field(init=False)
+    elements: dict = field(init=False, default=None, repr=False)
+    # Clock and cache of the run, the dates are read from the system clock if not set
+    dates: DateNormalizer = field(default=None, repr=False)
+
+    @staticmethod
+    def iter_elements(unit):
+        return soup_elements(unit)
+
+    @staticmethod
+    def attributes(unit):
+        return unit.attrs
+
+    def element(self, unit, key: str):
+        """Returns the first element of a UNIT_ELEMENTS lookup in the unit
+
+        Every lookup is collected in the same walk over the unit, on first use.
+        """
+        if self.elements is None:
+            self.elements = collect_elements(self.iter_elements(unit))
+        return self.elements.get(key)
+
+    def detail_spans(self, unit):
+        return self.element(unit, "details").find_all("span")
+
+    def fingerprint(self, layout, unit):
+        """Returns the layout fingerprint of a page, given its first unit"""
+        # Collect the elements if the structured data made the lookups unnecessary
+        self.element(unit, "model_name")
+        return layout_fingerprint(layout, self.attributes(unit), self.elements)
 
     def get_unit_label(self, unit):
         try:
             self.unit_label = unit["data-unit"]
         except:
-            self.unit_label = unit.find("span", {"class": "modelName"}).text
+            self.unit_label = self.element(unit, "model_name").text
 
     def get_rent(self, unit):
         try:
             self.rent = (
-                unit.find("div", {"class": "pricingColumn column"})
+                self.element(unit, "pricing")
                 .find_next()
                 .find_next()
                 .get_text(strip=True)
             )
         except:
-            self.rent = unit.find("span", {"class": "rentLabel"}).text
+            self.rent = self.element(unit, "rent_label").text
 
         if self.rent == "":
             self.rent = None
@@ -37,60 +67,57 @@ class Unit_Parser:
         try:
             self.beds = unit["data-beds"]
         except:
-            self.beds = (
-                unit.find("span", {"class": "detailsTextWrapper"})
-                .find_all("span")[0]
-                .get_text()
-            )
+            self.beds = self.detail_spans(unit)[0].get_text()
 
     def get_bathrooms(self, unit):
         try:
             self.baths = unit["data-beds"]
         except:
-            self.baths = (
-                unit.find("span", {"class": "detailsTextWrapper"})
-                .find_all("span")[1]
-                .get_text()
-            )
+            self.baths = self.detail_spans(unit)[1].get_text()
 
     def get_sqft(self, unit):
         try:
             self.area = (
-                unit.find("div", {"class": "sqftColumn column"})
-                .get_text(strip=True)
-                .strip("square feet")
+                self.element(unit, "sqft").get_text(strip=True).strip("square feet")
             )
         except:
-            self.area = (
-                unit.find("span", {"class": "detailsTextWrapper"})
-                .find_all("span")[2]
-                .get_text()
-            )
+            self.area = self.detail_spans(unit)[2].get_text()
         if self.area == "":
             self.area = None
 
     def get_date_available(self, unit):
         try:
             self.date_available = (
-                unit.find("span", {"class": "dateAvailable"})
+                self.element(unit, "date_available")
                 .get_text(strip=True)
                 .strip("availability")
             )
         except AttributeError:
-            self.date_available = unit.find(
-                "span", {"class": "availabilityInfo"}
-            ).get_text()
+            self.date_available = self.element(unit, "availability").get_text()
         except:
             self.date_available = None
 
     @clean_unit_information
-    def parse_unit(self, unit):
+    def parse_unit(self, unit, structured_units: dict = None, sources=None):
         self.get_unit_label(unit)
-        self.get_rent(unit)
-        self.get_bedrooms(unit)
-        self.get_bathrooms(unit)
-        self.get_sqft(unit)
-        self.get_date_available(unit)
+
+        # Fields given by the page's structured data skip the HTML lookups
+        structured = (structured_units or {}).get(self.unit_label, {})
+        for key, attribute, read_html in [
+            ("rent", "rent", self.get_rent),
+            ("beds", "beds", self.get_bedrooms),
+            ("baths", "baths", self.get_bathrooms),
+            ("sqft", "area", self.get_sqft),
+            ("date_available", "date_available", self.get_date_available),
+        ]:
+            if structured.get(key) is not None:
+                setattr(self, attribute, structured[key])
+                source = "structured"
+            else:
+                read_html(unit)
+                source = "dom"
+            if sources is not None:
+                sources[(key, source)] += 1
 
         return {
             "unit_label": self.unit_label,
@@ -99,6 +126,10 @@ class Unit_Parser:
             "baths": self.baths,
             "sqft": self.area,
             "date_available": self.date_available,
-            "date_scraped": date.today().strftime("%Y-%m-%d"),
+            "date_scraped": (
+                self.dates.today_string
+                if self.dates is not None
+                else date.today().strftime("%Y-%m-%d")
+            ),
         }
 
@@ -0,0 +1,184 @@
+from datetime import date
+from functools import lru_cache
+import math
+
+import numpy as np
+import pandas as pd
+
+from .records import UNIT_ROW_COLUMNS, as_row, parse_number
+
+# Columns of the store and their dtypes, missing numbers are NaN and missing dates NaT
+UNIT_COLUMNS = {
+    "property_index": np.int32,
+    "unit_label": object,
+    "rent": np.float64,
+    "beds": np.float32,
+    "baths": np.float32,
+    "sqft": np.float64,
+    "date_available": "datetime64[s]",
+    "date_scraped": "datetime64[s]",
+}
+
+
+@lru_cache(maxsize=4096)
+def datetime_value(value):
+    """Returns a YYYY-MM-DD date or a date object as a datetime64, NaT for other text"""
+    if isinstance(value, date):
+        return np.datetime64(value, "s")
+    try:
+        return np.datetime64(date.fromisoformat(value), "s")
+    except (TypeError, ValueError):
+        return np.datetime64("NaT", "s")
+
+
+def database_number(value):
+    """Returns a stored number as a Python number, int when it is whole, None for NaN"""
+    if math.isnan(value):
+        return None
+    return int(value) if value.is_integer() else value
+
+
+class UnitStore:
+    """Units of a run held column by column, in typed NumPy arrays
+
+    The arrays grow by whole chunks, at least doubling each time, so adding a
+    property's units rarely copies the store. Unit labels are interned, so
+    the labels repeated across properties ("1", "A", ...) are kept once.
+
+    Properties are numbered in the order they were added, and each unit
+    refers to its property through the property_index column.
+
+    Methods:
+        add_property: Add the formatted units of a property
+        to_frame: The units as a DataFrame, without copying the arrays
+        property_frame: The property name and zipcode of each property_index
+        property_units: The units of each property as database rows
+    """
+
+    def __init__(self, chunk_size: int = 4096):
+        """
+        Args:
+            chunk_size (int, optional): The arrays' capacity is a multiple of this many
+                                    units.
+        """
+        self.chunk_size = chunk_size
+        self.size = 0
+        self.columns = {
+            name: np.empty(0, dtype) for name, dtype in UNIT_COLUMNS.items()
+        }
+        self.property_names = []
+        self.zipcodes = []
+        self.labels = {}
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def capacity(self):
+        return len(self.columns["property_index"])
+
+    def reserve(self, count: int):
+        """Grows the arrays so that count more units fit"""
+        needed = self.size + count
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, 2 * self.capacity)
+        capacity = -(-capacity // self.chunk_size) * self.chunk_size
+        for name, column in self.columns.items():
+            grown = np.empty(capacity, column.dtype)
+            grown[: self.size] = column[: self.size]
+            self.columns[name] = grown
+
+    def add_property(self, property_name: str, zipcode: str, units: list):
+        """Adds the units of a property, given as formatted unit dicts or UnitRecords
+
+        Returns:
+            int: The property_index of the property
+        """
+        index = len(self.property_names)
+        self.property_names.append(property_name)
+        self.zipcodes.append(zipcode)
+
+        units = [as_row(unit) for unit in units]
+        self.reserve(len(units))
+        rows = slice(self.size, self.size + len(units))
+        columns = self.columns
+        columns["property_index"][rows] = index
+        columns["unit_label"][rows] = [
+            self.labels.setdefault(unit["unit_label"], unit["unit_label"])
+            for unit in units
+        ]
+        for name, number_type in (
+            ("rent", float),
+            ("beds", float),
+            ("baths", float),
+            ("sqft", float),
+        ):
+            columns[name][rows] = [
+                parse_number(unit[name], number_type) for unit in units
+            ]
+        for name in ("date_available", "date_scraped"):
+            columns[name][rows] = [datetime_value(unit[name]) for unit in units]
+        self.size = rows.stop
+        return index
+
+    def to_frame(self):
+        """Returns the units as a DataFrame of read only views on the store's arrays
+
+        Units added later are not part of the frame. The frame can't be
+        written to, frame.copy() gives one that can.
+        """
+        data = {}
+        for name, column in self.columns.items():
+            view = column[: self.size]
+            view.flags.writeable = False
+            data[name] = pd.Series(view, dtype=view.dtype, copy=False)
+        return pd.DataFrame(data, copy=False)
+
+    def property_frame(self):
+        """Returns the name and zipcode of each property, indexed by property_index"""
+        return pd.DataFrame(
+            {"property_name": self.property_names, "zipcode": self.zipcodes},
+            index=pd.RangeIndex(len(self.property_names), name="property_index"),
+        )
+
+    def property_units(self):
+        """Yields (property_name, zipcode, units) for each property with units
+
+        The units are dicts of the UNIT_ROW_COLUMNS, with database values
+        like those of UnitRecord.as_dict, so loaders can take them directly.
+        """
+        if self.size == 0:
+            return
+        columns = {
+            name: self.columns[name][: self.size].tolist()
+            for name in ("unit_label", "rent", "beds", "baths", "sqft")
+        }
+        for name in ("date_available", "date_scraped"):
+            dates = self.columns[name][: self.size].astype("datetime64[D]")
+            columns[name] = dates.tolist()
+        for name in ("rent", "beds", "sqft"):
+            columns[name] = [database_number(value) for value in columns[name]]
+        columns["baths"] = [
+            None if math.isnan(value) else value for value in columns["baths"]
+        ]
+
+        # Units are stored by property, so each property is one run of rows
+        indexes = self.columns["property_index"][: self.size]
+        starts = np.flatnonzero(np.diff(indexes, prepend=-1))
+        stops = np.append(starts[1:], self.size)
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            index = int(indexes[start])
+            units = [
+                {name: columns[name][row] for name in UNIT_ROW_COLUMNS}
+                for row in range(start, stop)
+            ]
+            yield self.property_names[index], self.zipcodes[index], units
+
+    def __getstate__(self):
+        # Only the filled part of the arrays is pickled
+        state = dict(self.__dict__)
+        state["columns"] = {
+            name: column[: self.size].copy() for name, column in self.columns.items()
+        }
+        return state